@@ -0,0 +1,71 @@
+import logging
+import timeit
+from prettytable import PrettyTable
+
+from src.utils.messages import CODECS
+from src.server.data.loader import QuizDataLoader
+
+
+# one realistic message per type, questions come from the real question bank
+def sample_messages():
+    quiz_data = QuizDataLoader(logging.getLogger("bench")).quiz_data
+    question = next(iter(quiz_data.values()))[0]
+    players = [f"player{i}" for i in range(20)]
+    return {
+        "new_connection_prompt": {
+            "message_type": "new_connection_prompt",
+            "current_games": [f"game{i}" for i in range(10)],
+            "current_players": players,
+            "chapters_available": {ch: len(qs) for ch, qs in quiz_data.items()},
+            "codecs": list(CODECS),
+        },
+        "quiz_question": {"message_type": "quiz_question", **question},
+        # what a client that has the question cached gets instead
+        "quiz_question[by id]": {"message_type": "quiz_question", "question_id": question["question_id"]},
+        "quiz_answer": {
+            "message_type": "quiz_answer",
+            "player_name": "player1",
+            "game_id": "game1",
+            "answer": 2,
+        },
+        "response_update": {
+            "message_type": "game_update",
+            "subtype": "response_update",
+            "message": "13/20",
+        },
+        "results": {
+            "message_type": "results",
+            "scoreboard": [
+                {
+                    "player_name": name, "correct": 10 - i % 7, "answered": 10, "timed_out": 0,
+                    "first_question": 0, "last_question": 9,
+                    "asked_bits": "3ff", "correct_bits": format((1 << (10 - i % 7)) - 1, "x"),
+                }
+                for i, name in enumerate(players)
+            ],
+        },
+    }
+
+
+def bench(codec, message, number):
+    payload = codec.encode(message)
+    encode = timeit.timeit(lambda: codec.encode(message), number=number)
+    decode = timeit.timeit(lambda: codec.decode(payload), number=number)
+    return len(payload), number / encode, number / decode
+
+
+def run(number=2000):
+    rows = []
+    for message_type, message in sample_messages().items():
+        for codec in CODECS.values():
+            size, encodes, decodes = bench(codec, message, number)
+            rows.append((message_type, codec.name, size, encodes, decodes))
+    return rows
+
+
+if __name__ == "__main__":
+    table = PrettyTable()
+    table.field_names = ["message", "codec", "bytes", "encode/s", "decode/s"]
+    for message_type, codec, size, encodes, decodes in run():
+        table.add_row([message_type, codec, size, f"{encodes:,.0f}", f"{decodes:,.0f}"])
+    print(table)
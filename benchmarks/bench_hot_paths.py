@@ -0,0 +1,144 @@
+import logging
+import os
+import tempfile
+import timeit
+from unittest.mock import Mock
+from prettytable import PrettyTable
+
+from src.utils.messages import send_message, receive_message, encode_message, JSON_CODEC
+from src.server.server import Server
+from src.server.game_class import Game
+from src.server.player_class import Player
+from src.server.data.loader import QuizDataLoader
+from src.client.ui import UIHandler
+from benchmarks.bench_codecs import sample_messages
+
+logger = logging.getLogger("bench")
+logger.addHandler(logging.NullHandler())
+logger.propagate = False
+
+
+class NullSocket:
+    """socket stand-in that accepts and drops everything, Mock would keep every call"""
+
+    def __init__(self, fd=0):
+        self.fd = fd
+
+    def sendall(self, data):
+        pass
+
+    def put(self, frame):
+        return True
+
+    def fileno(self):
+        return self.fd
+
+    def close(self):
+        pass
+
+
+def bench_server(players=0):
+    server = Server(logger, "127.0.0.1", 0)
+    server.server_socket.close()
+    for i in range(players):
+        player = Player(NullSocket(i + 1), NullSocket(), ("127.0.0.1", 40000 + i))
+        server.registry.add_player(player)
+        server.registry.rename_player(player, f"player{i}")
+    return server
+
+
+def message_cases():
+    sock = NullSocket()
+    for message_type, message in sample_messages().items():
+        frame = encode_message(message, JSON_CODEC)[4:]
+        yield f"send_message[{message_type}]", lambda m=message: send_message(logger, m, sock)
+        yield f"receive_message[{message_type}]", lambda f=frame: receive_message(logger, f, sock)
+
+
+# one store_response per call, a round of answers from everyone advances the question
+def answer_rounds(game, names):
+    answers = iter(())
+
+    def store_response():
+        nonlocal answers
+        name = next(answers, None)
+        if name is None:
+            if game.curr_qi >= len(game.questions) - 1:
+                game.curr_qi = 0
+                game.tallies = {}
+            answers = iter(names)
+            name = next(answers)
+        game.store_response(name, 0)
+
+    return store_response
+
+
+def game_cases():
+    questions = sample_messages()["quiz_question"]
+
+    for size in (20, 500):
+        names = [f"player{i}" for i in range(size)]
+        game = Game("bench", "owner", names[0], [questions] * 1000)
+        for name in names[1:]:
+            game.add_player(name)
+        yield f"Game.store_response[{size} players]", answer_rounds(game, names)
+        yield f"Game.scoreboard[{size} players]", game.scoreboard
+
+    for size in (20, 200, 500):
+        progress = Game("bench", "owner", "player0", [questions])
+        for i in range(1, size):
+            progress.add_player(f"player{i}")
+        for i in range(0, size, 2):
+            progress.record_response(f"player{i}", 0)
+        yield f"Game.get_response_progress_str[{size} players]", progress.get_response_progress_str
+
+
+def server_cases():
+    update = sample_messages()["response_update"]
+    for size in (10, 100, 1000):
+        server = bench_server(size)
+        yield f"broadcast[{size} players]", lambda s=server: s.broadcast(update)
+
+    server = bench_server(1)
+    owner = server.registry.all_players()[0]
+    chapters = sorted(server.quiz_data)
+
+    def create_game():
+        server.handle_create_game(
+            {"game_id": "bench", "chapters": chapters, "num_questions": 20}, owner
+        )
+        server.registry.remove_game("bench")
+
+    yield "handle_create_game[20 questions]", create_game
+
+
+def loader_cases():
+    yield "QuizDataLoader[no cache]", lambda: QuizDataLoader(logger, cache_file="")
+
+    cache_file = os.path.join(tempfile.mkdtemp(), "quiz-cache.pickle")
+    QuizDataLoader(logger, cache_file=cache_file)
+    yield "QuizDataLoader[warm cache]", lambda: QuizDataLoader(logger, cache_file=cache_file)
+
+
+def ui_cases():
+    client = Mock()
+    client.player_name = "player0"
+    client.scoreboard = sample_messages()["results"]["scoreboard"]
+    ui = UIHandler(client, logger)
+    yield "UIHandler.print_quiz_results[20 players]", ui.print_quiz_results
+
+
+# every benchmark as (name, zero-argument callable), setup runs once up front
+def cases():
+    for group in (message_cases, game_cases, server_cases, loader_cases, ui_cases):
+        yield from group()
+
+
+if __name__ == "__main__":
+    table = PrettyTable()
+    table.field_names = ["benchmark", "us/op"]
+    table.align["benchmark"] = "l"
+    for name, fn in cases():
+        number, seconds = timeit.Timer(fn).autorange()
+        table.add_row([name, f"{seconds / number * 1e6:,.2f}"])
+    print(table)
@@ -0,0 +1,87 @@
+import logging
+import random
+import timeit
+from unittest.mock import Mock
+from prettytable import PrettyTable
+
+from src.server.question_sampler import QuestionSampler
+from src.server.server import Server
+from src.server.player_class import Player
+
+CHAPTER_SIZES = [100, 10_000, 100_000]
+NUM_CHAPTERS = 3
+NUM_QUESTIONS = 20
+
+
+def synthetic_quiz_data(chapter_size):
+    return {
+        str(ch): [
+            {
+                "chapter": str(ch),
+                "topic": "topic",
+                "question": f"question {ch}-{i}",
+                "possible_answers": [{"answer": "A", "is_correct": True}],
+            }
+            for i in range(chapter_size)
+        ]
+        for ch in range(1, NUM_CHAPTERS + 1)
+    }
+
+
+# how handle_create_game picked questions before QuestionSampler, kept as the baseline
+def shuffle_select(quiz_data, selected_chapters, num_questions):
+    total_possible_questions = sum(len(quiz_data[ch]) for ch in selected_chapters)
+    percentage_per_chapter = num_questions / total_possible_questions
+    questions = []
+    for i, ch in enumerate(selected_chapters):
+        full_chapter = quiz_data[ch]
+        random.shuffle(full_chapter)
+        questions.extend(full_chapter[0:int(percentage_per_chapter * len(full_chapter))])
+        if i == len(selected_chapters) - 1 and len(questions) < num_questions:
+            start = int(percentage_per_chapter * len(full_chapter))
+            end = min(start + num_questions - len(questions), len(full_chapter))
+            questions.extend(full_chapter[start:end])
+    return questions
+
+
+# full handle_create_game path, with a server whose bank is swapped for the synthetic one
+def create_game_latency(quiz_data, chapters, number):
+    server = Server(logging.getLogger("bench"), "127.0.0.1", 0)
+    server.apply_quiz_data(quiz_data, [], [])
+    player = Player(Mock(), Mock())
+    player.name = "bench"
+    server.registry.add_player(player)
+    counter = iter(range(number))
+
+    def create():
+        game_id = f"game{next(counter)}"
+        server.handle_create_game(
+            {"game_id": game_id, "chapters": chapters, "num_questions": NUM_QUESTIONS}, player
+        )
+        server.registry.remove_game(game_id)
+
+    seconds = timeit.timeit(create, number=number)
+    server.server_socket.close()
+    return seconds / number
+
+
+def run(number=50):
+    chapters = [str(ch) for ch in range(1, NUM_CHAPTERS + 1)]
+    rows = []
+    for size in CHAPTER_SIZES:
+        quiz_data = synthetic_quiz_data(size)
+        sampler = QuestionSampler(quiz_data)
+        shuffle = timeit.timeit(lambda: shuffle_select(quiz_data, chapters, NUM_QUESTIONS), number=number) / number
+        sample = timeit.timeit(lambda: sampler.sample(chapters, NUM_QUESTIONS), number=number) / number
+        create = create_game_latency(quiz_data, chapters, number)
+        rows.append((size, shuffle, sample, create))
+    return rows
+
+
+if __name__ == "__main__":
+    table = PrettyTable()
+    table.field_names = ["questions per chapter", "shuffle select", "QuestionSampler", "handle_create_game"]
+    for size, shuffle, sample, create in run():
+        table.add_row([f"{size:,}", f"{shuffle * 1e6:,.1f} us", f"{sample * 1e6:,.1f} us", f"{create * 1e6:,.1f} us"])
+    print(f"{NUM_CHAPTERS} chapters, {NUM_QUESTIONS} questions per game")
+    print(table)
@@ -0,0 +1,153 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+from prettytable import PrettyTable
+
+from benchmarks.bench_hot_paths import cases
+
+RESULTS_DIR = "benchmarks/results"
+REPEAT = 5
+# percent slower than the baseline that counts as a regression
+REGRESSION_THRESHOLD = 10.0
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True
+        ).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+    return commit, dirty
+
+
+def measure(fn, repeat):
+    timer = timeit.Timer(fn)
+    # calibrate so one repeat takes at least 0.2 seconds
+    number, _ = timer.autorange()
+    times = [seconds / number * 1e6 for seconds in timer.repeat(repeat, number)]
+    return {
+        "number": number,
+        "repeat": repeat,
+        "best_us": min(times),
+        "median_us": statistics.median(times),
+    }
+
+
+def run(name_filter="", repeat=REPEAT):
+    commit, dirty = git_commit()
+    results = {}
+    for name, fn in cases():
+        if name_filter in name:
+            results[name] = measure(fn, repeat)
+            print(f"{name}: {results[name]['best_us']:,.2f} us", file=sys.stderr)
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+
+def save(report, path=None):
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        suffix = "-dirty" if report["dirty"] else ""
+        path = os.path.join(RESULTS_DIR, f"{report['commit']}{suffix}.json")
+    with open(path, "w") as file:
+        json.dump(report, file, indent=2)
+    return path
+
+
+def load(path):
+    with open(path, "r") as file:
+        return json.load(file)
+
+
+# rows of (name, baseline us, current us, percent change), best times are compared since they're the least noisy
+def compare(baseline, current):
+    rows = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            rows.append((name, None, result["best_us"], None))
+        else:
+            change = (result["best_us"] - base["best_us"]) / base["best_us"] * 100
+            rows.append((name, base["best_us"], result["best_us"], change))
+    return rows
+
+
+def print_report(report):
+    table = PrettyTable()
+    table.field_names = ["benchmark", "best us/op", "median us/op"]
+    table.align["benchmark"] = "l"
+    for name, result in report["results"].items():
+        table.add_row([name, f"{result['best_us']:,.2f}", f"{result['median_us']:,.2f}"])
+    print(f"commit {report['commit']}{' (dirty)' if report['dirty'] else ''}, python {report['python']}")
+    print(table)
+
+
+def print_comparison(baseline, current, threshold):
+    table = PrettyTable()
+    table.field_names = [
+        "benchmark", f"baseline {baseline['commit']}", f"current {current['commit']}", "change"
+    ]
+    table.align["benchmark"] = "l"
+    regressions = []
+    for name, base, now, change in compare(baseline, current):
+        if change is None:
+            table.add_row([name, "-", f"{now:,.2f}", "new"])
+            continue
+        flag = ""
+        if change > threshold:
+            flag = " REGRESSION"
+            regressions.append(name)
+        table.add_row([name, f"{base:,.2f}", f"{now:,.2f}", f"{change:+.1f}%{flag}"])
+    print(table)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="run the hot path benchmarks and store or compare JSON results")
+    parser.add_argument("-k", "--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("-r", "--repeat", type=int, default=REPEAT, help="timing repeats per benchmark")
+    parser.add_argument("-o", "--output", help=f"where to write results (default {RESULTS_DIR}/<commit>.json)")
+    parser.add_argument("--compare", nargs="+", metavar="RESULTS",
+                        help="baseline results to compare a new run against, or two result files to compare")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="percent slowdown reported as a regression (default %(default)s)")
+    args = parser.parse_args(argv)
+
+    if args.compare and len(args.compare) > 2:
+        parser.error("--compare takes a baseline and at most one more results file")
+
+    if args.compare and len(args.compare) == 2:
+        current = load(args.compare[1])
+    else:
+        current = run(args.filter, args.repeat)
+        print(f"results written to {save(current, args.output)}")
+
+    if not args.compare:
+        print_report(current)
+        return 0
+
+    regressions = print_comparison(load(args.compare[0]), current, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) more than {args.threshold}% slower: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
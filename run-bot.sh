@@ -0,0 +1,5 @@
+##!/bin/bash
+
+set -a
+source .env
+python3 src/client/bot.py "$@"
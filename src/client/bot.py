@@ -0,0 +1,339 @@
+import argparse
+import asyncio
+import math
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import time
+from prettytable import PrettyTable
+
+from src.utils.messages import (
+    send_message,
+    set_validation_mode,
+    StreamSocket,
+)
+from src.utils.logger import setup_logger
+from src.client.client import Client
+
+# seconds to wait for a phase of the run (connecting, creating, joining, playing) before giving up
+PHASE_TIMEOUT = 60.0
+
+
+def latency_distribution(spec: str, rng: random.Random):
+    """
+    Parses an answer latency spec into a function returning seconds.
+
+    const:S          always S
+    uniform:LO:HI    uniformly between LO and HI
+    exp:MEAN         exponential with the given mean
+    normal:MU:SIGMA  normal, clipped at 0
+    """
+    kind, *args = spec.split(":")
+    values = [float(arg) for arg in args]
+    if kind == "const" and len(values) == 1:
+        return lambda: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda: rng.uniform(values[0], values[1])
+    if kind == "exp" and len(values) == 1:
+        return lambda: rng.expovariate(1 / values[0]) if values[0] > 0 else 0.0
+    if kind == "normal" and len(values) == 2:
+        return lambda: max(0.0, rng.gauss(values[0], values[1]))
+    raise ValueError(f"bad latency spec {spec!r}, expected const:S, uniform:LO:HI, exp:MEAN or normal:MU:SIGMA")
+
+
+def percentile(values, p):
+    # nearest rank on an already sorted list
+    if not values:
+        return 0.0
+    rank = max(0, min(len(values) - 1, math.ceil(p / 100 * len(values)) - 1))
+    return values[rank]
+
+
+class LoadStats:
+    def __init__(self):
+        self.connect_seconds = 0.0
+        self.connections = 0
+        self.play_seconds = 0.0
+        self.messages_sent = 0
+        self.messages_received = 0
+        self.games_completed = 0
+        # connections the server closed before the bot's game ended, like slow consumers
+        self.dropped = 0
+        # seconds from sending a quiz_answer to the next progress update or question
+        self.round_trips = []
+
+    def rows(self):
+        round_trips = sorted(self.round_trips)
+        seconds = self.connect_seconds + self.play_seconds
+        messages = self.messages_sent + self.messages_received
+        return [
+            ["connections", self.connections],
+            ["connect rate", f"{self.connections / self.connect_seconds:,.1f}/s" if self.connect_seconds else "-"],
+            ["dropped connections", self.dropped],
+            ["games completed", self.games_completed],
+            ["answers", len(round_trips)],
+            ["round trip p50", f"{percentile(round_trips, 50) * 1e3:.2f} ms"],
+            ["round trip p90", f"{percentile(round_trips, 90) * 1e3:.2f} ms"],
+            ["round trip p99", f"{percentile(round_trips, 99) * 1e3:.2f} ms"],
+            ["round trip max", f"{(round_trips[-1] if round_trips else 0) * 1e3:.2f} ms"],
+            ["messages sent/received", f"{self.messages_sent}/{self.messages_received}"],
+            ["messages/sec", f"{messages / seconds:,.1f}" if seconds else "-"],
+        ]
+
+
+class Bot(Client):
+    """
+    Headless quiz player driven from an asyncio loop. protocol state is
+    kept by Client.handle_message exactly as for a person at the terminal,
+    the bot only adds the decisions: answering each new question after a
+    think time drawn from its latency distribution, once it's been told
+    to start playing.
+    """
+
+    def __init__(self, logger, reader, writer, name, think_time, rng, stats: LoadStats):
+        host, port = writer.get_extra_info("peername")[:2]
+        super().__init__(logger, host, port, sock=StreamSocket(writer), headless=True)
+        self.reader = reader
+        self.player_name = name
+        self.think_time = think_time
+        self.rng = rng
+        self.stats = stats
+        self.running = True
+        self.is_connected = True
+
+        self.prompted = asyncio.Event()
+        self.seated = asyncio.Event()  # got a question for its game
+        self.finished = asyncio.Event()
+        self.playing = False
+        self.is_owner = False
+        self.answered = None  # question we last answered, joins re-broadcast the current one
+        self.answer_sent_at = None
+        self.pending_answer = None
+
+    def send(self, message):
+        self.stats.messages_sent += 1
+        send_message(self.logger, message, self.sock, self.codec)
+
+    async def receive_messages(self):
+        try:
+            await super().receive_messages()
+        finally:
+            if not self.finished.is_set():
+                self.stats.dropped += 1
+            self.running = False
+            # a dropped bot must not hold up the phase the others are waiting on
+            self.prompted.set()
+            self.seated.set()
+            self.finished.set()
+
+    def handle_message(self, msg_obj):
+        self.stats.messages_received += 1
+        super().handle_message(msg_obj)
+        msg_type = msg_obj.get("message_type")
+        subtype = msg_obj.get("subtype")
+
+        if self.answer_sent_at is not None and (
+            msg_type in ("quiz_question", "results") or subtype == "response_update"
+        ):
+            self.stats.round_trips.append(time.perf_counter() - self.answer_sent_at)
+            self.answer_sent_at = None
+
+        if msg_type == "new_connection_prompt":
+            self.prompted.set()
+        elif msg_type == "quiz_question":
+            self.seated.set()
+            self.schedule_answer()
+        elif msg_type == "game_update" and subtype == "game_end" and msg_obj.get("game_id") == self.game_id:
+            self.stats.games_completed += self.is_owner
+            self.playing = False
+            self.finished.set()
+
+    def create_game(self, game_id, chapters, num_questions):
+        self.game_id = game_id
+        self.is_owner = True
+        self.send({
+            "message_type": "create_game",
+            "player_name": self.player_name,
+            "game_id": game_id,
+            "chapters": chapters,
+            "num_questions": num_questions,
+            "is_private": False,
+        })
+
+    def join_game(self, game_id):
+        self.game_id = game_id
+        self.is_owner = False
+        self.send({
+            "message_type": "join_game",
+            "player_name": self.player_name,
+            "game_id": game_id,
+        })
+
+    def start_playing(self):
+        self.playing = True
+        self.schedule_answer()
+
+    def schedule_answer(self):
+        question = self.curr_question
+        if not self.playing or not question or question.get("question") == self.answered:
+            return
+        self.answered = question.get("question")
+        if self.pending_answer is not None:
+            self.pending_answer.cancel()
+        self.pending_answer = asyncio.get_running_loop().call_later(
+            self.think_time(), self.answer, question
+        )
+
+    def answer(self, question):
+        self.pending_answer = None
+        if not self.running or not self.playing:
+            return
+        self.answer_sent_at = time.perf_counter()
+        self.send({
+            "message_type": "quiz_answer",
+            "player_name": self.player_name,
+            "game_id": self.game_id,
+            "answer": self.rng.randrange(len(question.get("possible_answers", [])) or 1),
+        })
+
+    def close(self):
+        self.running = False
+        self.finished.set()
+        if self.pending_answer is not None:
+            self.pending_answer.cancel()
+        self.sock.close()
+
+
+async def wait_all(events, what):
+    try:
+        await asyncio.wait_for(asyncio.gather(*(event.wait() for event in events)), PHASE_TIMEOUT)
+    except asyncio.TimeoutError:
+        done = sum(event.is_set() for event in events)
+        raise RuntimeError(f"timed out waiting for {what} ({done}/{len(events)})")
+
+
+async def run_load(logger, host, port, players=10, games=2, num_questions=5, latency="uniform:0.05:0.2", seed=None):
+    """
+    Connects `players` bots, splits them into `games` games, plays every
+    game to completion and returns the LoadStats for the run.
+    """
+    if not 1 <= games <= players:
+        raise ValueError("need at least one game and at most one game per player")
+    rng = random.Random(seed)
+    think_time = latency_distribution(latency, rng)
+    stats = LoadStats()
+    bots = []
+    tasks = []
+
+    async def connect(i):
+        reader, writer = await asyncio.open_connection(host, port)
+        bot = Bot(logger, reader, writer, f"bot{i}", think_time, rng, stats)
+        bots.append(bot)
+        tasks.append(asyncio.create_task(bot.receive_messages()))
+        await bot.prompted.wait()
+
+    try:
+        started = time.perf_counter()
+        await asyncio.wait_for(asyncio.gather(*(connect(i) for i in range(players))), PHASE_TIMEOUT)
+        stats.connect_seconds = time.perf_counter() - started
+        stats.connections = len(bots)
+
+        started = time.perf_counter()
+        tables = [bots[i::games] for i in range(games)]
+        chapters = sorted(bots[0].available_chapters)
+        for i, table in enumerate(tables):
+            table[0].create_game(f"bot-game-{i}", chapters, num_questions)
+        await wait_all([table[0].seated for table in tables], "games to be created")
+        for i, table in enumerate(tables):
+            for bot in table[1:]:
+                bot.join_game(f"bot-game-{i}")
+        await wait_all([bot.seated for bot in bots], "players to join")
+
+        for bot in bots:
+            bot.start_playing()
+        await wait_all([bot.finished for bot in bots], "games to finish")
+        stats.play_seconds = time.perf_counter() - started
+    finally:
+        for bot in bots:
+            bot.close()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return stats
+
+
+def free_port(host):
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+# run src/server/server.py in a child process so the bots don't share its CPU or GIL
+def start_local_server(host, engine):
+    port = free_port(host)
+    server = subprocess.Popen(
+        [sys.executable, os.path.join("src", "server", "server.py"), host, str(port), engine],
+        stdout=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return server, port
+        except OSError:
+            time.sleep(0.05)
+    server.terminate()
+    raise RuntimeError("local server did not start listening")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="headless quiz players for load testing a server")
+    parser.add_argument("host", nargs="?", default="127.0.0.1")
+    parser.add_argument("port", nargs="?", type=int)
+    parser.add_argument("-n", "--players", type=int, default=10, help="concurrent connections")
+    parser.add_argument("-g", "--games", type=int, default=2, help="games the players are split into")
+    parser.add_argument("-q", "--questions", type=int, default=5, help="questions per game")
+    parser.add_argument("-l", "--latency", default="uniform:0.05:0.2",
+                        help="answer think time: const:S, uniform:LO:HI, exp:MEAN or normal:MU:SIGMA")
+    parser.add_argument("--seed", type=int, help="seed for think times and answers")
+    parser.add_argument("--local", choices=["threaded", "async", "workers"],
+                        help="start a server with this engine instead of using host and port")
+    # checking every server message against its schema would make the bots the bottleneck
+    parser.add_argument("--validation", choices=["full", "inbound-only", "sampled"], default="sampled",
+                        help="schema checks the bots run on server messages (default sampled)")
+    args = parser.parse_args(argv)
+    set_validation_mode(args.validation)
+
+    logger = setup_logger("bot.log")
+    server = None
+    port = args.port
+    if args.local:
+        server, port = start_local_server(args.host, args.local)
+    elif port is None:
+        parser.error("port is required unless --local is given")
+
+    try:
+        stats = asyncio.run(run_load(
+            logger, args.host, port, args.players, args.games, args.questions, args.latency, args.seed
+        ))
+    finally:
+        if server is not None:
+            server.send_signal(signal.SIGINT)
+            try:
+                server.wait(10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    table = PrettyTable()
+    table.field_names = ["metric", "value"]
+    table.align = "l"
+    for row in stats.rows():
+        table.add_row(row)
+    print(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,36 @@
 import sys
 import socket
+import asyncio
 import ipaddress
-import json
-import threading
 import urwid
 
-from src.utils.messages import send_message, receive_message
+from src.utils.messages import (
+    send_message,
+    receive_message,
+    choose_codec,
+    MessageBuffer,
+    StreamSocket,
+    JSON_CODEC,
+    RECV_SIZE,
+)
+from src.utils.question_cache import QuestionCache, QUESTION_CACHE_SIZE
 from src.utils.logger import setup_logger
 from src.client.ui import UIHandler
 
 # configure logging
 logger = setup_logger("client.log")
 
+# seconds the last messages get to reach the server once the UI has exited
+CLOSE_FLUSH_TIMEOUT = 1.0
+
 
 class Client:
-    def __init__(self, logger, host="localhost", port=5000):
+    def __init__(self, logger, host="localhost", port=5000, sock=None, headless=False):
         self.host: str = host
         self.port: int = port
-        self.sock: socket.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock: socket.socket = sock if sock is not None else socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.running: bool = False
-        self.receive_thread = None
+        self.reader = None  # asyncio.StreamReader once connected
         self.is_connected = False
 
         self.curr_games = []
@@ -30,113 +41,181 @@ class Client:
         self.player_name = ""
         self.curr_question = {}
         self.response_progress = ""
-        self.results = []
+        self.scoreboard = []
+        # questions from earlier games, the server sends these again by id alone
+        self.question_cache = QuestionCache(QUESTION_CACHE_SIZE)
+        # wire codec for messages we send, negotiated from new_connection_prompt
+        self.codec = JSON_CODEC
 
         self.logger = logger
         self.current_window = "main_menu"
-        self.ui_handler = UIHandler(self, logger)
+        # headless clients (like the load generator bots) drive the protocol without a terminal
+        self.ui_handler = None if headless else UIHandler(self, logger)
 
-    # connect to server
+    # connect to server and run the UI, network reads share the UI's asyncio loop
     def connect(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
         try:
             self.logger.info(f"Attempting to connect to {self.host}:{self.port}")
-            self.sock.connect((self.host, self.port))
+            loop.run_until_complete(self.open_connection())
             self.logger.info(f"Connected to server at {self.host}:{self.port}")
             self.is_connected = True
             self.running = True
 
-            # new thread for receiving messages
-            self.receive_thread = threading.Thread(target=self.receive_messages)
-            self.receive_thread.start()
-
-            self.ui_handler.start()
+            self.ui_handler.start(self.receive_messages)
 
         except ConnectionRefusedError:
             self.logger.error("Connection failed. Server might be offline.")
         except Exception as e:
             self.logger.error(f"An error occurred: {e}")
+        finally:
+            self.close_loop(loop)
         return
 
-    # loop for receiving messages
-    def receive_messages(self):
-        while self.running:
+    async def open_connection(self):
+        self.reader, writer = await asyncio.open_connection(self.host, self.port)
+        # the socket made in __init__ was only a placeholder until now
+        self.sock.close()
+        self.sock = StreamSocket(writer)
+
+    # say goodbye if the UI exited without disconnecting, then let queued messages flush before closing
+    def close_loop(self, loop):
+        if self.running:
+            try:
+                self.disconnect()
+            except urwid.ExitMainLoop:
+                pass
+        tasks = asyncio.all_tasks(loop)
+        for task in tasks:
+            task.cancel()
+        loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        self.sock.close()
+        if isinstance(self.sock, StreamSocket):
             try:
-                self.sock.settimeout(1.0)
-                # blocking call awaits message from server
-                message = self.sock.recv(2048).decode("utf-8")
-                if not message:
+                loop.run_until_complete(asyncio.wait_for(self.sock.writer.wait_closed(), CLOSE_FLUSH_TIMEOUT))
+            except (OSError, asyncio.TimeoutError):
+                pass
+        loop.close()
+
+    # read messages from the server until it closes the connection or we disconnect
+    async def receive_messages(self):
+        buffer = MessageBuffer()
+        try:
+            while self.running:
+                # may hold several messages or part of one
+                data = await self.reader.read(RECV_SIZE)
+                if not data:
                     self.logger.error("\nServer connection closed. Press Ctl+C to exit")
                     self.disconnect()
                     break
-                receive_message(self.logger, message, self.sock)
-                msg_obj = json.loads(message)
-                msg_type = msg_obj.get("message_type")
+                for message in buffer.feed(data):
+                    msg_obj = receive_message(self.logger, message, self.sock)
+                    if msg_obj is None:
+                        continue
+                    self.handle_message(msg_obj)
+                    # shutdown and error messages stop the client
+                    if not self.running:
+                        break
 
-                # server has shut down
-                if msg_type == "server_shutdown":
-                    self.logger.info("\nServer is shutting down. Press Ctl+C to exit")
-                    self.disconnect()
-                    break
+        except (ConnectionError, OSError) as e:
+            if self.running:
+                self.logger.debug("Error receiving message: %s", e)
+                self.running = False
+        return
 
-                if msg_type == "error":
-                    self.logger.error(f"\nServer error: {msg_obj.get('message', '')}")
-                    self.disconnect()
-                    break
+    # update client state from a single parsed message
+    def handle_message(self, msg_obj):
+        msg_type = msg_obj.get("message_type")
 
-                if msg_type == "game_update":
-                    msg_subtype = msg_obj.get("subtype")
-                    if msg_subtype == "game_created":
-                        self.curr_games.append(msg_obj.get("game_id"))
-                        self.logger.debug(f"New game: {msg_obj.get('game_id')}")
-                        self.logger.debug(f"Current games: {self.curr_games}")
-                    elif msg_subtype == "game_end":
-                        if msg_obj.get("game_id") in self.curr_games:
-                            self.curr_games.remove(msg_obj.get("game_id"))
-                        if self.game_id == msg_obj.get("game_id"):
-                            response = {
-                                "message_type": "game_update",
-                                "subtype": "player_leave",
-                                "player_name": self.player_name,
-                            }
-                            send_message(self.logger, response, self.sock)
-                            # self.player_name = ""
-                            # self.game_id = ""
-                        self.logger.debug(f"Game ended: {msg_obj.get('game_id')}")
-                        self.logger.debug(f"Current games: {self.curr_games}")
-
-                    elif msg_subtype == "player_connect":
-                        self.logger.debug(
-                            f"Player {msg_obj.get('player_id')} joined game {msg_obj.get('game_id')}"
-                        )
-                        self.curr_players.append(msg_obj.get("player_id"))
-                    elif msg_subtype == "player_disconnect":
-                        if msg_obj.get("player_id") in self.curr_players:
-                            self.curr_players.remove(msg_obj.get("player_id"))
-                    elif msg_subtype == "response_update":
-                        self.response_progress = msg_obj.get("message")
-
-                if msg_type == "new_connection_prompt":
-                    self.curr_players = msg_obj.get("current_players")
-                    self.curr_games = msg_obj.get("current_games")
-                    self.max_questions = msg_obj.get("max_questions")
-                    self.available_chapters = msg_obj.get("chapters_available")
-
-                elif msg_type == "quiz_question":
-                    self.curr_question = msg_obj
-
-                elif msg_type == "results":
-                    self.results = msg_obj.get("results")
-
-                self.ui_handler.message_queue.put(msg_obj)
-
-            except socket.timeout:
-                continue
-            except Exception as e:
-                if self.running:
-                    self.logger.debug(f"Error receiving message: {e}")
-                    self.running = False
-                break
-        return
+        # server has shut down
+        if msg_type == "server_shutdown":
+            self.logger.info("\nServer is shutting down. Press Ctl+C to exit")
+            self.disconnect()
+            return
+
+        if msg_type == "error":
+            self.logger.error(f"\nServer error: {msg_obj.get('message', '')}")
+            self.disconnect()
+            return
+
+        if msg_type == "game_update":
+            msg_subtype = msg_obj.get("subtype")
+            if msg_subtype == "game_created":
+                self.curr_games.append(msg_obj.get("game_id"))
+                self.logger.debug("New game: %s", msg_obj.get("game_id"))
+                self.logger.debug("Current games: %s", self.curr_games)
+            elif msg_subtype == "game_end":
+                if msg_obj.get("game_id") in self.curr_games:
+                    self.curr_games.remove(msg_obj.get("game_id"))
+                if self.game_id == msg_obj.get("game_id"):
+                    response = {
+                        "message_type": "game_update",
+                        "subtype": "player_leave",
+                        "player_name": self.player_name,
+                    }
+                    send_message(self.logger, response, self.sock, self.codec)
+                    # self.player_name = ""
+                    # self.game_id = ""
+                self.logger.debug("Game ended: %s", msg_obj.get("game_id"))
+                self.logger.debug("Current games: %s", self.curr_games)
+
+            elif msg_subtype == "player_connect":
+                self.logger.debug(
+                    "Player %s joined game %s", msg_obj.get("player_id"), msg_obj.get("game_id")
+                )
+                self.curr_players.append(msg_obj.get("player_id"))
+            elif msg_subtype == "player_disconnect":
+                if msg_obj.get("player_id") in self.curr_players:
+                    self.curr_players.remove(msg_obj.get("player_id"))
+            elif msg_subtype == "lobby_snapshot":
+                # back in the lobby after a game, lobby updates stopped while we played
+                self.curr_games = msg_obj.get("current_games")
+                self.curr_players = msg_obj.get("current_players")
+            elif msg_subtype == "response_update":
+                self.response_progress = msg_obj.get("message")
+            elif msg_subtype == "chapters_update":
+                # server reloaded its question bank
+                available_chapters = dict(self.available_chapters)
+                available_chapters.update(msg_obj.get("chapters_available", {}))
+                for chapter in msg_obj.get("chapters_removed", []):
+                    available_chapters.pop(chapter, None)
+                self.available_chapters = available_chapters
+
+        if msg_type == "new_connection_prompt":
+            self.curr_players = msg_obj.get("current_players")
+            self.curr_games = msg_obj.get("current_games")
+            self.max_questions = msg_obj.get("max_questions")
+            self.available_chapters = msg_obj.get("chapters_available")
+            # servers that offer codecs accept a client_hello picking one
+            if msg_obj.get("codecs"):
+                self.codec = choose_codec(msg_obj.get("codecs"))
+                hello = {
+                    "message_type": "client_hello",
+                    "codec": self.codec.name,
+                    "question_cache": self.question_cache.capacity,
+                }
+                send_message(self.logger, hello, self.sock)
+
+        elif msg_type == "quiz_question":
+            question_id = msg_obj.get("question_id")
+            if "question" not in msg_obj:
+                # sent by id, we've had this question before
+                cached = self.question_cache.get(question_id)
+                if cached is None:
+                    request = {"message_type": "question_request", "question_id": question_id}
+                    send_message(self.logger, request, self.sock, self.codec)
+                    return
+                msg_obj = cached
+            elif question_id:
+                self.question_cache.add(question_id, msg_obj)
+            self.curr_question = msg_obj
+
+        elif msg_type == "results":
+            self.scoreboard = msg_obj.get("scoreboard")
+
+        if self.ui_handler is not None:
+            self.ui_handler.notify(msg_obj)
 
     def disconnect(self):
         self.logger.info("Disconnecting from server...")
@@ -145,10 +224,12 @@ class Client:
             "subtype": "player_disconnect",
             "player_name": self.player_name,
         }
-        send_message(self.logger, disconnect_message, self.sock)
+        send_message(self.logger, disconnect_message, self.sock, self.codec)
         self.running = False
-        self.ui_handler.stop()
+        # closed before stopping the UI, which raises ExitMainLoop
         self.sock.close()
+        if self.ui_handler is not None:
+            self.ui_handler.stop()
 
 
 if __name__ == "__main__":
@@ -184,13 +265,8 @@ if __name__ == "__main__":
         )
         exit(1)
 
-    # connect to server, disconnect on exception
+    # connect to server, connect disconnects on the way out
     try:
         client.connect()
     except KeyboardInterrupt:
         pass
-    finally:
-        try:
-            client.disconnect()
-        except urwid.ExitMainLoop:
-            pass
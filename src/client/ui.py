@@ -1,6 +1,5 @@
 import urwid
 import asyncio
-from queue import Queue
 from src.utils.messages import send_message
 from prettytable import PrettyTable
 
@@ -9,9 +8,11 @@ class UIHandler:
     def __init__(self, client, logger):
         self.client = client
         self.logger = logger
-        self.message_queue = Queue()
         self.curr_screen = "connecting"
         self.running = False
+        self.redraw_pending = False
+        self.results_key = None
+        self.results_cache = ""
 
         # Create UI elements
         self.txt_title = urwid.Text("Connecting...")
@@ -29,7 +30,8 @@ class UIHandler:
             ])),
         )
 
-    def start(self):
+    # reader is a coroutine function run on the UI's loop, like Client.receive_messages
+    def start(self, reader=None):
         self.running = True
         # Instead of creating a thread, we'll create the loop
         self.loop = urwid.MainLoop(
@@ -37,96 +39,106 @@ class UIHandler:
             unhandled_input=self.handle_input,
             event_loop=urwid.AsyncioEventLoop(loop=asyncio.get_event_loop())
         )
-        self.loop.set_alarm_in(0.1, self.update_display)
+        if reader is not None:
+            # started through urwid so an ExitMainLoop or error raised while reading stops the UI
+            self.loop.event_loop.alarm(0, reader)
+        self.update_display()
         self.loop.run()
 
     def stop(self):
         self.running = False
         raise urwid.ExitMainLoop()
 
-    def update_display(self, loop, user_data):
-        # Process message queue
-        while not self.message_queue.empty():
-            msg = self.message_queue.get()
-            if msg["message_type"] == "new_connection_prompt":
-                self.curr_screen = "main_menu"
-            elif msg["message_type"] == "results":
-                self.curr_screen = "results"
-            elif msg["message_type"] == "quiz_question":
-                self.curr_screen = "quiz_question"
-
-        # Update display based on current screen
+    # called by the client for each message it reads, messages read together share one redraw
+    def notify(self, msg):
+        if msg["message_type"] == "new_connection_prompt":
+            self.curr_screen = "main_menu"
+        elif msg["message_type"] == "results":
+            self.curr_screen = "results"
+        elif msg["message_type"] == "quiz_question":
+            self.curr_screen = "quiz_question"
+        if self.running and not self.redraw_pending:
+            # an alarm rather than a direct call so urwid draws the screen afterwards
+            self.redraw_pending = True
+            self.loop.set_alarm_in(0, self.handle_redraw)
+
+    def handle_redraw(self, loop, user_data):
+        self.redraw_pending = False
+        self.update_display()
+
+    # set the screen's text, widgets whose text didn't change aren't touched so urwid has nothing to redraw
+    def show(self, title=None, instructions=None, caption=None):
+        if title is not None and title != self.txt_title.text:
+            self.txt_title.set_text(title)
+        if instructions is not None and instructions != self.txt_instructions.text:
+            self.txt_instructions.set_text(instructions)
+        if caption is not None and caption != self.input_box.caption:
+            self.input_box.set_caption(caption)
+
+    # the results table only changes with the scoreboard or the player it's ranked for
+    def results_text(self):
+        key = (id(self.client.scoreboard), self.client.player_name)
+        if key != self.results_key:
+            self.results_key = key
+            self.results_cache = self.print_quiz_results()
+        return self.results_cache
+
+    # redraw the current screen, run after a message arrives or a line is entered
+    def update_display(self):
         if self.curr_screen == "connecting":
-            self.txt_title.set_text("connecting...")
+            self.show(title="connecting...")
             if self.client.is_connected:
                 self.curr_screen = "main_menu"
 
-        elif self.curr_screen == "main_menu":
+        if self.curr_screen == "main_menu":
             menu_text = "1. start a new game"
             if self.client.curr_games:
                 menu_text += "\n2. join a current game"
             menu_text += "\n3. exit"
 
-            self.txt_title.set_text("=== main menu ===")
-            self.txt_instructions.set_text(menu_text)
-            self.input_box.set_caption("choose option: ")
+            self.show("=== main menu ===", menu_text, "choose option: ")
 
         elif self.curr_screen == "create_game_1":
-            self.txt_title.set_text("=== create game ===")
-            self.txt_instructions.set_text("enter your player name. cant be a current player")
-            self.input_box.set_caption("")
+            self.show("=== create game ===", "enter your player name. cant be a current player", "")
         elif self.curr_screen == "create_game_2":
-            self.txt_title.set_text("=== create game ===")
-            self.txt_instructions.set_text("enter game name")
-            self.input_box.set_caption("")
+            self.show("=== create game ===", "enter game name", "")
         elif self.curr_screen == "create_game_3":
-            self.txt_title.set_text("=== create game ===")
             chapters_sorted = sorted([int(c) for c in self.client.available_chapters.keys()])
-            self.txt_instructions.set_text(
-                f"choose chapters from this list: {' '.join([str(c) for c in chapters_sorted])}\nenter as chapter numbers separated by spaces: "
+            self.show(
+                "=== create game ===",
+                f"choose chapters from this list: {' '.join([str(c) for c in chapters_sorted])}\nenter as chapter numbers separated by spaces: ",
+                "",
             )
-            self.input_box.set_caption("")
         elif self.curr_screen == "create_game_4":
-            self.txt_title.set_text("=== create game ===")
-            self.txt_instructions.set_text(f"enter number of questions. max: {sum([self.client.available_chapters[c] for c in self.client.chosen_chapters])}\nenter as a plain normal number")
-            self.input_box.set_caption("")
+            self.show(
+                "=== create game ===",
+                f"enter number of questions. max: {sum([self.client.available_chapters.get(c, 0) for c in self.client.chosen_chapters])}\nenter as a plain normal number",
+                "",
+            )
 
         elif self.curr_screen == "join_game_1":
             if len(self.client.curr_games) == 0:
                 self.curr_screen = "main_menu"
-            self.txt_title.set_text("=== join game ===")
-            self.txt_instructions.set_text("enter your player name. cant be a current player")
-            self.input_box.set_caption("")
+            self.show("=== join game ===", "enter your player name. cant be a current player", "")
         elif self.curr_screen == "join_game_2":
             if len(self.client.curr_games) == 0:
                 self.curr_screen = "main_menu"
-            self.txt_title.set_text("=== join game ===")
-            self.txt_instructions.set_text(f"enter game name from this list: {' '.join(self.client.curr_games)}")
-            self.input_box.set_caption("")
+            self.show("=== join game ===", f"enter game name from this list: {' '.join(self.client.curr_games)}", "")
 
         elif self.curr_screen == "quiz_question":
             if len(self.client.curr_games) == 0:
                 self.curr_screen = "main_menu"
-            self.txt_title.set_text(f"=== {self.client.curr_question['topic']} ===")
             content = f"player answers: {self.client.response_progress}\n"
             content += f"\n{self.client.curr_question['question']}\n\n"
             for i, option in enumerate(self.client.curr_question['possible_answers']):
                 content += f"{chr(65+i)}. {option['answer']}\n"
-            self.txt_instructions.set_text(
-                content
-            )
-            self.input_box.set_caption("choose option: ")
+            self.show(f"=== {self.client.curr_question['topic']} ===", content, "choose option: ")
 
         elif self.curr_screen == "quiz_question_waiting":
-            self.txt_instructions.set_text(f"player answers: {self.client.response_progress}\nwaiting for all responses")
+            self.show(instructions=f"player answers: {self.client.response_progress}\nwaiting for all responses")
 
         elif self.curr_screen == "results":
-            self.txt_title.set_text("=== quiz results ===")
-            self.txt_instructions.set_text(self.print_quiz_results())
-            self.input_box.set_caption("press enter to return to main menu")
-
-        if self.running:
-            self.loop.set_alarm_in(0.1, self.update_display)
+            self.show("=== quiz results ===", self.results_text(), "press enter to return to main menu")
 
     def handle_input(self, key):
         if key == 'enter':
@@ -147,7 +159,7 @@ class UIHandler:
                         "game_id": self.client.game_id
                     }
                     self.client.game_id = "no_game"
-                    send_message(self.logger, message, self.client.sock)
+                    send_message(self.logger, message, self.client.sock, self.client.codec)
 
             elif self.curr_screen == "main_menu":
                 if user_input == "1":
@@ -173,7 +185,7 @@ class UIHandler:
             elif self.curr_screen == "create_game_4":
                 try:
                     num_questions = int(user_input)
-                    if 0 < num_questions <= sum([self.client.available_chapters[c] for c in self.client.chosen_chapters]):
+                    if 0 < num_questions <= sum([self.client.available_chapters.get(c, 0) for c in self.client.chosen_chapters]):
                         self.client.num_questions = num_questions
                         self.curr_screen = "main_menu"
                         message = {
@@ -184,7 +196,7 @@ class UIHandler:
                             "num_questions": self.client.num_questions,
                             "is_private": False
                         }
-                        send_message(self.logger, message, self.client.sock)
+                        send_message(self.logger, message, self.client.sock, self.client.codec)
                 except Exception:
                     pass
 
@@ -200,7 +212,7 @@ class UIHandler:
                         "player_name": self.client.player_name,
                         "game_id": self.client.game_id
                     }
-                    send_message(self.logger, message, self.client.sock)
+                    send_message(self.logger, message, self.client.sock, self.client.codec)
                     self.client.game_id = user_input
 
             elif self.curr_screen == "quiz_question":
@@ -211,51 +223,45 @@ class UIHandler:
                         "game_id": self.client.game_id,
                         "answer": ord(user_input.upper()) - 65
                     }
-                    send_message(self.logger, message, self.client.sock)
+                    send_message(self.logger, message, self.client.sock, self.client.codec)
                     self.curr_screen = "quiz_question_waiting"
 
             elif self.curr_screen == "results":
                 self.curr_screen = "results"
 
             self.input_box.set_edit_text("")
+            if self.running:
+                self.update_display()
 
     def print_quiz_results(self):
         name = self.client.player_name
-        results = self.client.results
+        scoreboard = self.client.scoreboard
 
-        if not results:
+        if not scoreboard:
             return "no results to show."
 
-        # find the first and last question indices where the player participated
-        start_idx = -1
-        end_idx = -1
-
-        for i, question_results in enumerate(results):
-            if isinstance(question_results, dict) and name in question_results:
-                if start_idx == -1:
-                    start_idx = i
-                end_idx = i
-
-        if start_idx == -1:
+        mine = next((entry for entry in scoreboard if entry["player_name"] == name), None)
+        if mine is None:
             return "looks like you didn't answer any questions.\nno results to show."
 
-        # get all players who participated in all questions in this range
-        players = set(results[start_idx].keys())
-        for i in range(start_idx + 1, end_idx + 1):
-            players = players.intersection(set(results[i].keys()))
-
-        if len(players) == 0:
-            return "no consistent players found throughout your session."
+        # your session runs from the first to the last question you were asked
+        start_idx = mine["first_question"]
+        end_idx = mine["last_question"]
+        session = (1 << (end_idx + 1)) - (1 << start_idx)
+        num_questions = end_idx - start_idx + 1
 
-        # calculate scores for each consistent player
+        # get all players who were asked every question in this range, scored on those questions only
         scores = {}
-        num_questions = end_idx - start_idx + 1
-        for player in players:
-            correct_answers = sum(1 for i in range(start_idx, end_idx + 1)  if results[i][player])
-            scores[player] = (correct_answers, num_questions)
+        for entry in scoreboard:
+            if int(entry["asked_bits"], 16) & session == session:
+                correct_answers = (int(entry["correct_bits"], 16) & session).bit_count()
+                scores[entry["player_name"]] = (correct_answers, num_questions)
+
+        if len(scores) == 0:
+            return "no consistent players found throughout your session."
 
         # sort players by score (descending)
-        sorted_players = sorted(scores.items(),  key=lambda x: (x[1][0]/x[1][1], x[0]),  reverse=True)
+        sorted_players = sorted(scores.items(), key=lambda x: (x[1][0]/x[1][1], x[0]), reverse=True)
 
         # create and populate the table
         results_table = PrettyTable()
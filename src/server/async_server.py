@@ -0,0 +1,181 @@
+import asyncio
+import signal
+
+from src.utils.messages import (
+    receive_message,
+    MessageBuffer,
+    StreamSocket,
+    RECV_SIZE,
+)
+from src.server.player_class import Player
+from src.server.send_queue import AsyncSendQueue
+from src.server.server import Server, SHUTDOWN_FLUSH_TIMEOUT, DISCONNECT_FLUSH_TIMEOUT
+
+# pending connections the kernel queues for us, sized for connection bursts
+ASYNC_BACKLOG = 1024
+
+
+class AsyncServer(Server):
+    """
+    Server engine that serves every connection from one asyncio event loop
+    instead of a thread per socket. an idle connection costs a coroutine
+    rather than a thread stack, so a single process can hold tens of
+    thousands of lobby players. message handling reuses Server.handle_message
+    and the handlers behind it; players get a StreamSocket and an
+    AsyncSendQueue drained by a writer task on the loop.
+    """
+
+    def __init__(self, logger, host="127.0.0.1", port_num=5000):
+        super().__init__(logger, host, port_num)
+        self.loop = None
+        self.stopped = None
+        # let several worker processes listen on the same port
+        self.reuse_port = False
+        self.closing = set()  # tasks closing sockets once their last messages are sent
+        self.connections = set()  # tasks reading from each connection, awaited on shutdown
+
+    def start(self):
+        self.running = True
+        try:
+            self.logger.info(f"Attempting to connect to {self.host}:{self.port_num}")
+            asyncio.run(self.serve())
+        except Exception as e:
+            self.logger.error(f"Server error: {e}")
+        finally:
+            self.cleanup()
+
+    async def serve(self):
+        self.running = True
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        server = await asyncio.start_server(
+            self.handle_client_async,
+            self.host,
+            self.port_num,
+            backlog=ASYNC_BACKLOG,
+            reuse_address=True,
+            reuse_port=self.reuse_port or None,
+        )
+        # pick up the real port when bound to port 0
+        self.port_num = server.sockets[0].getsockname()[1]
+        self.logger.debug(
+            f"Async server started on {self.host}:{self.port_num}\nListening for connections..."
+        )
+
+        # call shutdown if keyboard interruption, only possible from the main thread
+        try:
+            self.loop.add_signal_handler(signal.SIGINT, self.shutdown, signal.SIGINT, None)
+            self.loop.add_signal_handler(signal.SIGUSR1, self.status.request)
+        except (NotImplementedError, RuntimeError, AttributeError):
+            pass
+        self.status.start()
+        self.status.request()
+        self.scheduler.start()
+        self.start_metrics()
+        self.watch_quiz_data()
+
+        try:
+            async with server:
+                await self.stopped.wait()
+        finally:
+            self.scheduler.stop()
+            self.status.stop()
+            self.metrics.stop_http()
+            await self.close_connections()
+            # let each connection run its finally before asyncio.run cancels what's left
+            await asyncio.gather(*self.connections, *self.closing, return_exceptions=True)
+
+    # gets called on the event loop for each incoming connection
+    async def handle_client_async(self, reader, writer):
+        addr = writer.get_extra_info("peername")
+        player = Player(StreamSocket(writer), AsyncSendQueue(writer, self.logger), addr)
+        self.registry.add_player(player)
+        self.status.incr("connections_opened")
+        self.logger.debug("New connection from %s", addr)
+        self.send_to(player, self.new_connection_prompt())
+        await self.serve_player(player, reader, writer)
+
+    # read and dispatch a player's messages until it disconnects, data is anything already read for it
+    async def serve_player(self, player: Player, reader, writer, data: bytes = b""):
+        client_socket = player.sock
+        addr = player.addr
+        buffer = MessageBuffer()
+        task = asyncio.current_task()
+        self.connections.add(task)
+        task.add_done_callback(self.connections.discard)
+        try:
+            while self.running:
+                if not data:
+                    data = await reader.read(RECV_SIZE)
+                    if not data:
+                        break
+                    self.metrics.bytes_received.inc(len(data))
+                try:
+                    messages = buffer.feed(data)
+                    data = b""
+                    for i, message in enumerate(messages):
+                        msg_obj = receive_message(self.logger, message, player.outbox)
+                        if msg_obj is None:
+                            raise Exception("invalid JSON message")
+                        self.handle_message(msg_obj, client_socket, addr)
+                        if await self.hand_off(player, reader, writer, messages[i:], buffer):
+                            return
+                except Exception as e:
+                    self.logger.error("error handling client %s: %s", addr, e)
+                    error_message = {"message_type": "error", "message": str(e)}
+                    self.send_to(player, error_message)
+                    break
+
+        except (ConnectionError, OSError) as e:
+            self.logger.debug("Connection from %s failed: %s", addr, e)
+        finally:
+            if player in self.registry:
+                self.handle_player_disconnect(player)
+            await self.drain_and_close(player)
+            self.status.incr("connections_closed")
+            self.logger.debug("Connection from %s closed", addr)
+
+    # a writer task drains the outbox, so the socket is closed from a task instead of waiting here
+    def close_player(self, player: Player):
+        player.outbox.close()
+        task = asyncio.ensure_future(self.drain_and_close(player))
+        self.closing.add(task)
+        task.add_done_callback(self.closing.discard)
+
+    async def drain_and_close(self, player: Player):
+        player.outbox.close()
+        await player.outbox.join(DISCONNECT_FLUSH_TIMEOUT)
+        player.sock.close()
+
+    # engines running several processes move a connection to the one that owns its game once
+    # a message is handled, frames is that message and the ones after it, True once it has moved
+    async def hand_off(self, player: Player, reader, writer, frames, buffer: MessageBuffer) -> bool:
+        return False
+
+    # callbacks from other threads (like the quiz data watcher) run on the loop
+    def call_soon(self, callback, *args):
+        self.loop.call_soon_threadsafe(callback, *args)
+
+    # handle self shutdown
+    def shutdown(self, signum, frame):
+        super().shutdown(signum, frame)
+        if self.stopped is not None:
+            self.stopped.set()
+
+    # flush queued messages and close every stream while the loop is still running
+    async def close_connections(self):
+        players = self.registry.all_players()
+        for player in players:
+            player.outbox.close()
+        if players:
+            await asyncio.wait(
+                [asyncio.ensure_future(p.outbox.join()) for p in players],
+                timeout=SHUTDOWN_FLUSH_TIMEOUT,
+            )
+        for player in players:
+            player.sock.close()
+
+    def cleanup(self):
+        self.logger.info("Cleaning up server resources...")
+        self.quiz_loader.stop_watching()
+        self.server_socket.close()
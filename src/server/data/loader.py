@@ -1,50 +1,204 @@
+import hashlib
 import json
-from jsonschema import validate, ValidationError
 import os
+import pickle
+import threading
+from jsonschema import validators, ValidationError
+
+from src.utils.question_cache import question_id
 
 QUIZ_DATA_DIR = "src/server/data/chapters/"
 QUIZ_SCHEMA = "src/server/data/chapter-schema.json"
+QUIZ_CACHE_FILE = os.environ.get("QUIZ_CACHE_FILE", "src/server/data/quiz-cache.pickle")
+# bump when the layout of cache entries changes
+CACHE_VERSION = 2
+# seconds between checks of the chapter directory for edits, 0 turns hot reload off
+QUIZ_RELOAD_INTERVAL = float(os.environ.get("QUIZ_RELOAD_INTERVAL", "2"))
 
 
 class QuizDataLoader:
-    def __init__(self, logger, directory: str = QUIZ_DATA_DIR):
+    """
+    Loads and validates every chapter file. validated chapters are kept in
+    an on-disk cache keyed by file name, so a later start only re-parses and
+    re-validates files whose mtime and size changed and whose content hash
+    no longer matches. editing the chapter schema throws the cache away.
+
+    the same check runs periodically while the server is up, so edited
+    chapters are swapped in without a restart. quiz_data is always replaced
+    with a new dict, never mutated, so anyone holding the old one (like a
+    running game) keeps a consistent snapshot.
+    """
+
+    def __init__(self, logger, directory: str = QUIZ_DATA_DIR, cache_file: str = QUIZ_CACHE_FILE):
         self.logger = logger
         self.directory = directory
-        self.quiz_schema = self.load_quiz_schema()
+        self.cache_file = cache_file
+        self.schema_bytes = self.read_quiz_schema()
+        self.schema_hash = hashlib.sha256(self.schema_bytes).hexdigest()
+        self.quiz_validator = None
+        self.cache = self.load_cache()
+        self.cache_dirty = False
         self.quiz_data = {}
+        self.watch_thread = None
+        self.watch_stop = threading.Event()
         self.load_quiz_files()
+        self.save_cache()
+
+    def read_quiz_schema(self) -> bytes:
+        with open(QUIZ_SCHEMA, "rb") as file:
+            return file.read()
 
     def load_quiz_schema(self):
-        with open(QUIZ_SCHEMA, "r") as file:
-            return json.load(file)
+        return json.loads(self.schema_bytes)
 
+    # validator is only built when a file actually needs validating
+    def get_quiz_validator(self):
+        if self.quiz_validator is None:
+            schema = self.load_quiz_schema()
+            self.quiz_validator = validators.validator_for(schema)(schema)
+        return self.quiz_validator
+
+    # (re)load the directory, returns the chapters whose questions changed and the chapters that are gone
     def load_quiz_files(self):
         self.logger.debug(f"loading quiz data from directory: {self.directory}")
         # check if directory exists
         if not os.path.exists(self.directory):
             self.logger.error(f"directory {self.directory} does not exist.")
-            return
+            return [], []
         # iterate over all JSON files
-        for filename in os.listdir(self.directory):
-            if filename.endswith(".json"):
-                filepath = os.path.join(self.directory, filename)
+        entries = {}
+        quiz_data = {}
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json") and entry.is_file():
+                cached = self.load_chapter_file(entry)
+                if cached is not None:
+                    entries[entry.name] = cached
+                    quiz_data[cached["chapter"]] = cached["questions"]
+        # forget files that were removed
+        if entries.keys() != self.cache["files"].keys():
+            self.cache_dirty = True
+        self.cache["files"] = entries
+
+        # unchanged chapters come back as the very same list from the cache
+        changed = [ch for ch, qs in quiz_data.items() if self.quiz_data.get(ch) is not qs]
+        removed = [ch for ch in self.quiz_data if ch not in quiz_data]
+        # swap in one assignment so readers see either the old or the new data
+        self.quiz_data = quiz_data
+        return changed, removed
+
+    def refresh(self):
+        changed, removed = self.load_quiz_files()
+        self.save_cache()
+        if changed or removed:
+            self.logger.info(f"quiz data reloaded. changed chapters: {changed} removed chapters: {removed}")
+        return changed, removed
+
+    # poll the directory and call on_change(quiz_data, changed, removed) from the watcher thread
+    def start_watching(self, on_change, interval: float = QUIZ_RELOAD_INTERVAL):
+        if interval <= 0 or self.watch_thread is not None:
+            return
+
+        def watch():
+            while not self.watch_stop.wait(interval):
                 try:
-                    with open(filepath, "r") as file:
-                        data = json.load(file)
-                        if self.validate_quiz_format(data):
-                            chapter = data["chapter"]
-                            questions = data["questions"]
-                            self.quiz_data[chapter] = questions
-                            self.logger.debug(f"loaded and validated {filename}")
-                        else:
-                            self.logger.warning(f"invalid format in file: {filename}")
-                except (json.JSONDecodeError, FileNotFoundError) as e:
-                    self.logger.error(f"error loading file {filename}: {e}")
+                    changed, removed = self.refresh()
+                except Exception as e:
+                    self.logger.error(f"error reloading quiz data: {e}")
+                    continue
+                if changed or removed:
+                    on_change(self.quiz_data, changed, removed)
+
+        self.watch_thread = threading.Thread(target=watch, daemon=True)
+        self.watch_thread.start()
+
+    def stop_watching(self):
+        self.watch_stop.set()
+
+    # returns the cache entry for a chapter file, parsing and validating only if it changed
+    def load_chapter_file(self, entry: os.DirEntry):
+        filename = entry.name
+        stat = entry.stat()
+        cached = self.cache["files"].get(filename)
+        if cached and cached["mtime_ns"] == stat.st_mtime_ns and cached["size"] == stat.st_size:
+            self.logger.debug(f"loaded {filename} from cache")
+            return cached
+
+        try:
+            with open(entry.path, "rb") as file:
+                raw = file.read()
+        except FileNotFoundError as e:
+            self.logger.error(f"error loading file {filename}: {e}")
+            return None
+        digest = hashlib.sha256(raw).hexdigest()
+        self.cache_dirty = True
+
+        # touched but unchanged, keep the validated questions
+        if cached and cached["sha256"] == digest:
+            self.logger.debug(f"loaded {filename} from cache, content unchanged")
+            return {**cached, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+        # a broken edit (or one caught half written) keeps serving the last good version
+        try:
+            data = json.loads(raw)
+        except json.JSONDecodeError as e:
+            self.logger.error(f"error loading file {filename}: {e}")
+            return cached
+        if not self.validate_quiz_format(data):
+            self.logger.warning(f"invalid format in file: {filename}")
+            return cached
+        self.logger.debug(f"loaded and validated {filename}")
+        # ids are worked out once here and kept in the cache with the questions
+        for question in data["questions"]:
+            question["question_id"] = question_id(question)
+        return {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "sha256": digest,
+            "chapter": data["chapter"],
+            "questions": data["questions"],
+        }
 
     def validate_quiz_format(self, data):
         try:
-            validate(instance=data, schema=self.quiz_schema)
+            self.get_quiz_validator().validate(data)
         except ValidationError as e:
             self.logger.error(f"Invalid quiz format: {e}")
             return False
         return True
+
+    def empty_cache(self):
+        return {"version": CACHE_VERSION, "schema_hash": self.schema_hash, "files": {}}
+
+    def load_cache(self):
+        if not self.cache_file:
+            return self.empty_cache()
+        try:
+            with open(self.cache_file, "rb") as file:
+                cache = pickle.load(file)
+        except FileNotFoundError:
+            return self.empty_cache()
+        except Exception as e:
+            self.logger.warning(f"ignoring unreadable quiz cache {self.cache_file}: {e}")
+            return self.empty_cache()
+        if (
+            not isinstance(cache, dict)
+            or cache.get("version") != CACHE_VERSION
+            or cache.get("schema_hash") != self.schema_hash
+        ):
+            self.logger.debug("quiz cache is stale, rebuilding")
+            return self.empty_cache()
+        return cache
+
+    # write to a temp file and rename so a crash never leaves a half written cache
+    def save_cache(self):
+        if not self.cache_file or not self.cache_dirty:
+            return
+        # per-process name, worker processes may save the cache at the same time
+        tmp_file = f"{self.cache_file}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_file, "wb") as file:
+                pickle.dump(self.cache, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, self.cache_file)
+            self.cache_dirty = False
+        except OSError as e:
+            self.logger.warning(f"could not write quiz cache {self.cache_file}: {e}")
@@ -1,23 +1,120 @@
+from array import array
 from typing import List, Any, Dict, Optional, Tuple
 import random
+import threading
+
+NO_RESPONSE = -1  # slot value while a player hasn't answered the current question
+
+
+class Tally:
+    """
+    one player's results in a game as bitsets over question indexes: the
+    questions they answered, the ones they got right and the ones whose
+    time ran out before they answered. updated in place as each answer
+    comes in and kept after the player leaves
+    """
+
+    __slots__ = ("answered_bits", "correct_bits", "timeout_bits")
+
+    def __init__(self):
+        self.answered_bits = 0
+        self.correct_bits = 0
+        self.timeout_bits = 0
+
+    @property
+    def correct(self) -> int:
+        return self.correct_bits.bit_count()
+
+    @property
+    def answered(self) -> int:
+        return self.answered_bits.bit_count()
+
+    @property
+    def timed_out(self) -> int:
+        return self.timeout_bits.bit_count()
+
+    # questions the player was asked, answered or not
+    @property
+    def questions(self) -> int:
+        return self.answered + self.timed_out
+
+    # first and last question index the player answered or ran out of time on
+    @property
+    def first_question(self) -> int:
+        asked = self.answered_bits | self.timeout_bits
+        return (asked & -asked).bit_length() - 1
+
+    @property
+    def last_question(self) -> int:
+        return (self.answered_bits | self.timeout_bits).bit_length() - 1
+
+    def to_dict(self, player_name: str) -> Dict[str, Any]:
+        return {
+            "player_name": player_name,
+            "correct": self.correct,
+            "answered": self.answered,
+            "timed_out": self.timed_out,
+            "first_question": self.first_question,
+            "last_question": self.last_question,
+            # hex bitsets, so the client can score everyone over just the questions it was asked
+            "asked_bits": format(self.answered_bits | self.timeout_bits, "x"),
+            "correct_bits": format(self.correct_bits, "x"),
+        }
+
 
 class Game:
+    """
+    players are numbered with small integer slots, freed slots are reused
+    by later joiners. the current question's answers live in one signed
+    byte per slot and the number answered is counted as they come in, so
+    progress checks don't look at every player. the threaded engine changes
+    a game from handler threads and the scheduler thread, both hold its lock
+    """
+
+    __slots__ = (
+        "game_id",
+        "owner_id",
+        "owner_name",
+        "questions",
+        "time_limit",
+        "curr_qi",
+        "slots",
+        "free_slots",
+        "responses",
+        "answered_count",
+        "tallies",
+        "lock",
+    )
+
     def __init__(
         self,
         game_id: str,
         owner_id: str,
         owner_name: str,
         questions: List[Any],
+        time_limit: float = 0,
     ):
         self.game_id = game_id
         self.owner_id = owner_id
         self.owner_name = owner_name
-        self.player_responses: Dict[str, Optional[int]] = {
-            self.owner_name: None
-        }  # responses from players
         self.questions = questions
+        self.time_limit = time_limit  # seconds to answer each question, 0 waits for everyone
         self.curr_qi = 0  # index of current question
-        self.results: List[Dict[str, bool]] = []  # [{name: correct?}]
+        self.slots: Dict[str, int] = {}  # name -> slot, in the order players joined
+        self.free_slots: List[int] = []
+        self.responses = array("b")  # slot -> answer to the current question or NO_RESPONSE
+        self.answered_count = 0  # members who answered the current question
+        self.tallies: Dict[str, Tally] = {}  # name -> results so far
+        self.lock = threading.RLock()
+        self.add_player(owner_name)
+
+    @property
+    def player_responses(self) -> Dict[str, Optional[int]]:
+        # {name: answer or None} for the current question, built on each access
+        return {
+            name: (None if self.responses[slot] == NO_RESPONSE else self.responses[slot])
+            for name, slot in self.slots.items()
+        }
 
     def generate_game_id(self):
         self.game_id: str = "".join(
@@ -25,46 +122,83 @@ class Game:
         )  # a-z
 
     def get_response_progress(self) -> Tuple[int, int]:
-        return (
-            sum([1 if val is not None else 0 for val in self.player_responses.values()]),
-            len(self.player_responses.keys())
-        )
+        return self.answered_count, len(self.slots)
 
     def get_response_progress_str(self) -> str:
-        return f"{self.get_response_progress()[0]}/{self.get_response_progress()[1]}"
+        answered, members = self.get_response_progress()
+        return f"{answered}/{members}"
 
     def get_total_status(self) -> Tuple[int, int]:
         return self.curr_qi, len(self.questions)
 
     def add_player(self, player_name: str):
-        if player_name not in self.player_responses:
-            self.player_responses[player_name] = None
+        if player_name in self.slots:
+            return
+        if self.free_slots:
+            slot = self.free_slots.pop()
+            self.responses[slot] = NO_RESPONSE
+        else:
+            slot = len(self.responses)
+            self.responses.append(NO_RESPONSE)
+        self.slots[player_name] = slot
 
     def remove_player(self, player_name: str):
-        if player_name in self.player_responses:
-            self.player_responses.pop(player_name)
+        slot = self.slots.pop(player_name, None)
+        if slot is None:
+            return
+        if self.responses[slot] != NO_RESPONSE:
+            self.answered_count -= 1
+        self.responses[slot] = NO_RESPONSE
+        self.free_slots.append(slot)
 
     def store_response(self, player_name: str, response: int) -> bool:
-        if player_name in self.player_responses:
-            self.player_responses[player_name] = response
-            is_correct = self.get_current_question().get("possible_answers")[response].get("is_correct")
-            if len(self.results) == self.curr_qi + 1:
-                self.results[self.curr_qi][player_name] = is_correct
+        if player_name in self.slots:
+            possible_answers = self.get_current_question().get("possible_answers")
+            if not 0 <= response < len(possible_answers):
+                raise ValueError(f"answer {response} is not one of the {len(possible_answers)} choices")
+            self.record_response(player_name, response)
+
+            tally = self.tally(player_name)
+            bit = 1 << self.curr_qi
+            tally.answered_bits |= bit
+            if possible_answers[response].get("is_correct"):
+                tally.correct_bits |= bit
             else:
-                self.results.append({player_name: is_correct})
-        print(self.results)
+                tally.correct_bits &= ~bit
         if self.all_players_responded():
             self.advance_question()
             return True
         return False
 
+    def tally(self, player_name: str) -> Tally:
+        tally = self.tallies.get(player_name)
+        if tally is None:
+            tally = self.tallies[player_name] = Tally()
+        return tally
+
+    # the current question's time ran out, mark everyone still thinking and return their names
+    def time_out_stragglers(self) -> List[str]:
+        bit = 1 << self.curr_qi
+        stragglers = [name for name, slot in self.slots.items() if self.responses[slot] == NO_RESPONSE]
+        for name in stragglers:
+            self.tally(name).timeout_bits |= bit
+        return stragglers
+
+    def scoreboard(self) -> List[Dict[str, Any]]:
+        # best percentage first, ties broken by name like the client used to rank them
+        ranked = sorted(
+            self.tallies.items(),
+            key=lambda item: (item[1].correct / item[1].questions, item[0]),
+            reverse=True,
+        )
+        return [tally.to_dict(name) for name, tally in ranked]
+
     def advance_question(self) -> bool:
         # go to next q if available
         if self.curr_qi < len(self.questions) - 1:
             self.curr_qi += 1
-            self.player_responses.update(
-                {player_name: None for player_name in self.player_responses.keys()}
-            )
+            self.responses = array("b", [NO_RESPONSE]) * len(self.responses)
+            self.answered_count = 0
             return True
         return False
 
@@ -76,22 +210,25 @@ class Game:
 
     def record_response(self, player_name: str, response: int):
         # record player response
-        if player_name in self.player_responses:
-            self.player_responses[player_name] = response
+        slot = self.slots.get(player_name)
+        if slot is not None:
+            if self.responses[slot] == NO_RESPONSE:
+                self.answered_count += 1
+            self.responses[slot] = response
 
     def all_players_responded(self) -> bool:
         # check for response from all players for current q
-        return all(response is not None for response in self.player_responses.values())
+        return self.answered_count == len(self.slots)
 
     def info(self):
         string = f"Game ID: {self.game_id}, "
         string += f"Owner: {self.owner_name}, "
-        string += f"Players: {' '.join(self.player_responses.keys())}, "
+        string += f"Players: {' '.join(self.slots)}, "
         string += f"Current Question: {self.curr_qi + 1}/{len(self.questions)}"
         return string
 
     def __str__(self):
-        return f"id: {self.game_id} owner: {self.owner_name} curr q: {self.get_reponse_progress_str()} all qs: {self.get_total_status()[0]}/{self.get_total_status()[1]}"
+        return f"id: {self.game_id} owner: {self.owner_name} curr q: {self.get_response_progress_str()} all qs: {self.curr_qi}/{len(self.questions)}"
 
     def __eq__(self, other: Any):
         if isinstance(other, str):
@@ -0,0 +1,205 @@
+import bisect
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence
+
+# where the Prometheus endpoint listens, port 0 leaves it off
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# upper bounds in seconds, a question round lasts as long as the slowest player takes to answer
+ROUND_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300)
+BROADCAST_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05)
+FANOUT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+LAG_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+
+
+def format_value(value) -> str:
+    if isinstance(value, float):
+        return repr(value) if value != float("inf") else "+Inf"
+    return str(value)
+
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in labels.items()) + "}"
+
+
+class Counter:
+    """monotonic count, optionally split by the value of one label"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, label: Optional[str] = None):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.lock = threading.Lock()
+        self.values: Dict[Optional[str], float] = {} if label else {None: 0}
+
+    def inc(self, amount: float = 1, label_value: Optional[str] = None):
+        with self.lock:
+            self.values[label_value] = self.values.get(label_value, 0) + amount
+
+    def value(self, label_value: Optional[str] = None) -> float:
+        return self.values.get(label_value, 0)
+
+    def samples(self):
+        with self.lock:
+            values = list(self.values.items())
+        for label_value, value in values:
+            labels = {self.label: label_value} if self.label else {}
+            yield self.name, labels, value
+
+
+class Gauge:
+    """current value read from a callback at scrape time, so updating it costs nothing"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, read: Callable[[], float]):
+        self.name = name
+        self.help = help
+        self.read = read
+
+    def samples(self):
+        yield self.name, {}, self.read()
+
+
+class Histogram:
+    """observations counted into fixed buckets, plus their count and sum"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.bounds: List[float] = sorted(buckets)
+        self.lock = threading.Lock()
+        # one slot per bound plus +Inf, kept non-cumulative so observe() touches one slot
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.bounds, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def samples(self):
+        with self.lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative = 0
+        for bound, bucket in zip(self.bounds + [float("inf")], counts):
+            cumulative += bucket
+            yield f"{self.name}_bucket", {"le": format_value(float(bound))}, cumulative
+        yield f"{self.name}_sum", {}, total
+        yield f"{self.name}_count", {}, count
+
+
+class ServerMetrics:
+    """
+    Instruments a Server: messages and bytes in and out by message type,
+    question round durations, broadcast fan-out time and size, scheduler
+    lag, and active players and games. handlers only bump counters or drop a value into
+    a histogram bucket, the Prometheus text is built when scraped.
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.messages_received = Counter(
+            "quiz_messages_received_total", "messages received from clients", "message_type"
+        )
+        self.messages_sent = Counter(
+            "quiz_messages_sent_total", "messages sent to clients, once per recipient", "message_type"
+        )
+        self.bytes_received = Counter("quiz_bytes_received_total", "bytes read from client sockets")
+        self.bytes_sent = Counter("quiz_bytes_sent_total", "framed bytes queued for clients")
+        self.question_rounds = Histogram(
+            "quiz_question_round_seconds",
+            "time from a question being sent to every player in the game having answered",
+            ROUND_BUCKETS,
+        )
+        self.broadcast_seconds = Histogram(
+            "quiz_broadcast_seconds", "time to validate, encode and queue one broadcast", BROADCAST_BUCKETS
+        )
+        self.broadcast_recipients = Histogram(
+            "quiz_broadcast_recipients", "players a broadcast was queued for", FANOUT_BUCKETS
+        )
+        self.scheduler_lag = Histogram(
+            "quiz_scheduler_lag_seconds",
+            "time from a timer's deadline, like a question's time limit, to its callback running",
+            LAG_BUCKETS,
+        )
+        self.active_players = Gauge(
+            "quiz_active_players", "connected players", lambda: len(server.registry.players_by_id)
+        )
+        self.active_games = Gauge(
+            "quiz_active_games", "running games", lambda: len(server.registry.games_by_id)
+        )
+        self.metrics = [
+            self.messages_received,
+            self.messages_sent,
+            self.bytes_received,
+            self.bytes_sent,
+            self.question_rounds,
+            self.broadcast_seconds,
+            self.broadcast_recipients,
+            self.scheduler_lag,
+            self.active_players,
+            self.active_games,
+        ]
+        self.http_server = None
+
+    def record_sent(self, message_type: str, frame_size: int, recipients: int = 1):
+        self.messages_sent.inc(recipients, message_type)
+        self.bytes_sent.inc(frame_size * recipients)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    # serve GET /metrics from a daemon thread, returns the bound port
+    def start_http(self, host: str = METRICS_HOST, port: int = METRICS_PORT) -> int:
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                metrics.server.logger.debug("metrics request: " + format, *args)
+
+        self.http_server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.http_server.daemon_threads = True
+        threading.Thread(target=self.http_server.serve_forever, daemon=True).start()
+        return self.http_server.server_address[1]
+
+    def stop_http(self):
+        if self.http_server is not None:
+            self.http_server.shutdown()
+            self.http_server.server_close()
+            self.http_server = None
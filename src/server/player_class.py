@@ -1,13 +1,29 @@
 import socket
 import uuid
 
+from src.server.send_queue import SendQueue
+from src.utils.messages import JSON_CODEC
+
 
 class Player:
-    def __init__(self, sock: socket.socket):
+    # no per-instance __dict__, servers hold one of these per connection
+    __slots__ = ("sock", "addr", "outbox", "codec", "question_cache", "id", "name", "curr_game", "handoff")
+
+    def __init__(self, sock: socket.socket, outbox=None, addr=None):
         self.sock = sock
+        # peer address from accept, kept so status views don't call getpeername
+        self.addr = addr
+        # everything sent to the player goes through its outbound queue
+        self.outbox = outbox if outbox is not None else SendQueue(sock)
+        # wire codec the client asked for in client_hello
+        self.codec = JSON_CODEC
+        # ids of the questions the client has cached, when it said in client_hello that it keeps one
+        self.question_cache = None
         self.id = str(uuid.uuid1())
         self.name = "no_name"
         self.curr_game = "no_game"
+        # worker process the connection is being handed to, only set in multi-process mode
+        self.handoff = None
         # self.socket_thread = socket_thread
 
     def __str__(self):
@@ -0,0 +1,44 @@
+import random
+from typing import Any, Dict, List, Optional
+
+
+class QuestionSampler:
+    """
+    Draws the questions for a new game from a snapshot of the question bank.
+    each chapter gets an index range built once, and a game draws exactly
+    num_questions indices with random.sample, split across the chosen
+    chapters in proportion to their size. drawing is O(num_questions) no
+    matter how big the chapters are, and the bank itself is never shuffled
+    or copied, so games and handler threads can share it safely. pass a
+    seed to get the same questions again.
+    """
+
+    def __init__(self, quiz_data: Dict[str, List[Any]], seed: Optional[int] = None):
+        self.quiz_data = quiz_data
+        self.indices = {chapter: range(len(questions)) for chapter, questions in quiz_data.items()}
+        self.random = random.Random(seed)
+
+    # how many questions to take from each chapter, largest remainder so the counts add up exactly
+    def allocate(self, chapters: List[str], num_questions: int) -> List[int]:
+        sizes = [len(self.indices[chapter]) for chapter in chapters]
+        total = sum(sizes)
+        if total == 0:
+            return [0 for _ in chapters]
+        num_questions = max(0, min(num_questions, total))
+        exact = [num_questions * size / total for size in sizes]
+        counts = [int(share) for share in exact]
+        leftover = num_questions - sum(counts)
+        by_remainder = sorted(range(len(chapters)), key=lambda i: exact[i] - counts[i], reverse=True)
+        for i in by_remainder[:leftover]:
+            counts[i] += 1
+        return counts
+
+    def sample(self, chapters: List[str], num_questions: int, seed: Optional[int] = None) -> List[Any]:
+        rng = random.Random(seed) if seed is not None else self.random
+        # a chapter picked twice is still only drawn from once
+        chapters = list(dict.fromkeys(chapters))
+        questions = []
+        for chapter, count in zip(chapters, self.allocate(chapters, num_questions)):
+            bank = self.quiz_data[chapter]
+            questions.extend(bank[i] for i in rng.sample(self.indices[chapter], count))
+        return questions
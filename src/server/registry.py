@@ -0,0 +1,157 @@
+import threading
+from typing import Dict, List, Optional
+
+from src.server.player_class import Player
+from src.server.game_class import Game
+
+# placeholder name lobby players carry, never indexed
+NO_NAME = "no_name"
+# topic of players that aren't in a game, each game's players are subscribed to game_topic(game id)
+LOBBY = "lobby"
+GAME_TOPIC_PREFIX = "game:"
+
+
+def game_topic(game_id: str) -> str:
+    return GAME_TOPIC_PREFIX + game_id
+
+
+class Registry:
+    """
+    Indexed store of connected players and running games. players are
+    indexed by socket fd, id and name, games by id, and each game keeps
+    its member players so per-game fan-out only touches that game. every
+    update goes through a method here so the indexes stay consistent on
+    join, leave and disconnect.
+
+    the same indexes are the server's publish/subscribe topics: a player
+    is subscribed to LOBBY while in no game and to game_topic(game id)
+    while playing it, moving between them as it joins and leaves.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.players_by_fd: Dict[int, Player] = {}
+        self.players_by_id: Dict[str, Player] = {}
+        self.players_by_name: Dict[str, Player] = {}
+        self.player_fds: Dict[str, int] = {}  # player id -> fd it was registered under
+        self.games_by_id: Dict[str, Game] = {}
+        self.game_members: Dict[str, Dict[str, Player]] = {}  # game id -> {player id: player}
+        self.player_games: Dict[str, str] = {}  # player id -> game id
+        self.lobby: Dict[str, Player] = {}  # player id -> player, for players in no game
+
+    # players
+    def add_player(self, player: Player):
+        with self.lock:
+            fd = player.sock.fileno()
+            self.players_by_fd[fd] = player
+            self.player_fds[player.id] = fd
+            self.players_by_id[player.id] = player
+            self.lobby[player.id] = player
+            if player.name != NO_NAME:
+                self.players_by_name[player.name] = player
+
+    def remove_player(self, player: Player):
+        with self.lock:
+            self.leave_game(player)
+            self.lobby.pop(player.id, None)
+            fd = self.player_fds.pop(player.id, None)
+            if self.players_by_fd.get(fd) is player:
+                del self.players_by_fd[fd]
+            self.players_by_id.pop(player.id, None)
+            if self.players_by_name.get(player.name) is player:
+                del self.players_by_name[player.name]
+
+    def rename_player(self, player: Player, name: str):
+        with self.lock:
+            if self.players_by_name.get(player.name) is player:
+                del self.players_by_name[player.name]
+            player.name = name
+            if name != NO_NAME and player.id in self.players_by_id:
+                self.players_by_name[name] = player
+
+    def get_player_by_sock(self, sock) -> Optional[Player]:
+        return self.players_by_fd.get(sock.fileno())
+
+    def get_player_by_id(self, player_id: str) -> Optional[Player]:
+        return self.players_by_id.get(player_id)
+
+    def get_player_by_name(self, name: str) -> Optional[Player]:
+        return self.players_by_name.get(name)
+
+    def all_players(self) -> List[Player]:
+        with self.lock:
+            return list(self.players_by_id.values())
+
+    def __contains__(self, player: Player) -> bool:
+        return self.players_by_id.get(player.id) is player
+
+    # games
+    def add_game(self, game: Game):
+        with self.lock:
+            self.games_by_id[game.game_id] = game
+            self.game_members.setdefault(game.game_id, {})
+
+    def remove_game(self, game_id: str) -> Optional[Game]:
+        with self.lock:
+            game = self.games_by_id.pop(game_id, None)
+            for player_id, player in self.game_members.pop(game_id, {}).items():
+                self.player_games.pop(player_id, None)
+                if player_id in self.players_by_id:
+                    self.lobby[player_id] = player
+            return game
+
+    def get_game(self, game_id: str) -> Optional[Game]:
+        return self.games_by_id.get(game_id)
+
+    def all_games(self) -> List[Game]:
+        with self.lock:
+            return list(self.games_by_id.values())
+
+    # membership
+    def join_game(self, player: Player, game_id: str):
+        with self.lock:
+            if game_id not in self.games_by_id:
+                return
+            self.leave_game(player)
+            self.lobby.pop(player.id, None)
+            self.game_members[game_id][player.id] = player
+            self.player_games[player.id] = game_id
+
+    def leave_game(self, player: Player):
+        with self.lock:
+            game_id = self.player_games.pop(player.id, None)
+            if game_id is not None:
+                self.game_members.get(game_id, {}).pop(player.id, None)
+                if player.id in self.players_by_id:
+                    self.lobby[player.id] = player
+
+    def game_of(self, player: Player) -> Optional[Game]:
+        game_id = self.player_games.get(player.id)
+        return self.games_by_id.get(game_id) if game_id is not None else None
+
+    # players that aren't in any game
+    def lobby_players(self) -> List[Player]:
+        with self.lock:
+            return list(self.lobby.values())
+
+    def members(self, game_id: str) -> List[Player]:
+        with self.lock:
+            return list(self.game_members.get(game_id, {}).values())
+
+    # topics
+    def topic_members(self, topic: str) -> Dict[str, Player]:
+        if topic == LOBBY:
+            return self.lobby
+        if topic.startswith(GAME_TOPIC_PREFIX):
+            return self.game_members.get(topic[len(GAME_TOPIC_PREFIX):], {})
+        return {}
+
+    # everyone subscribed to any of the topics, each player once
+    def subscribers(self, *topics: str) -> List[Player]:
+        with self.lock:
+            if len(topics) == 1:
+                return list(self.topic_members(topics[0]).values())
+            recipients: Dict[str, Player] = {}
+            for topic in topics:
+                recipients.update(self.topic_members(topic))
+            return list(recipients.values())
@@ -0,0 +1,126 @@
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable, List, Optional
+
+# rebuild the heap once this many cancelled timers are waiting in it, and they're at least half of it
+COMPACT_MIN_CANCELLED = 64
+
+
+class Timer:
+    __slots__ = ("deadline", "callback", "args", "cancelled", "queued")
+
+    def __init__(self, deadline: float, callback: Callable, args: tuple):
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+        self.queued = False  # still in the scheduler's heap
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Scheduler:
+    """
+    Every timer the server sets, kept in one heap by deadline and run from
+    one thread, so a thousand games with a question running cost a
+    thousand heap entries rather than a thousand threads. due callbacks
+    are handed to dispatch (Server.call_soon) so they run wherever message
+    handlers run. cancelled timers stay in the heap until they're popped
+    or the heap is compacted.
+
+    on_lag gets the seconds between each timer's deadline and its
+    callback starting, which grows when the handlers fall behind.
+    """
+
+    def __init__(self, dispatch: Callable, on_lag: Optional[Callable[[float], None]] = None, clock=time.monotonic):
+        self.dispatch = dispatch
+        self.on_lag = on_lag
+        self.clock = clock
+        self.condition = threading.Condition()
+        self.heap = []
+        self.sequence = itertools.count()  # keeps timers with equal deadlines in the order they were set
+        self.cancelled = 0
+        self.running = False
+        self.thread = None
+
+    def call_later(self, delay: float, callback: Callable, *args) -> Timer:
+        timer = Timer(self.clock() + delay, callback, args)
+        with self.condition:
+            first = not self.heap or timer.deadline < self.heap[0][0]
+            heapq.heappush(self.heap, (timer.deadline, next(self.sequence), timer))
+            timer.queued = True
+            if first:
+                self.condition.notify()
+        return timer
+
+    def cancel(self, timer: Optional[Timer]):
+        if timer is None or timer.cancelled:
+            return
+        with self.condition:
+            timer.cancel()
+            if not timer.queued:
+                return
+            self.cancelled += 1
+            if self.cancelled >= COMPACT_MIN_CANCELLED and self.cancelled * 2 >= len(self.heap):
+                self.heap = [entry for entry in self.heap if not entry[2].cancelled]
+                heapq.heapify(self.heap)
+                self.cancelled = 0
+
+    def __len__(self):
+        return len(self.heap) - self.cancelled
+
+    # pop every timer due by now, skipping cancelled ones
+    def pop_due(self, now: float) -> List[Timer]:
+        due = []
+        with self.condition:
+            while self.heap and self.heap[0][0] <= now:
+                timer = heapq.heappop(self.heap)[2]
+                timer.queued = False
+                if timer.cancelled:
+                    self.cancelled -= 1
+                else:
+                    due.append(timer)
+        return due
+
+    def fire(self, timer: Timer):
+        if self.on_lag is not None:
+            self.on_lag(self.clock() - timer.deadline)
+        # cancelled while waiting to be dispatched
+        if not timer.cancelled:
+            timer.cancelled = True
+            timer.callback(*timer.args)
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.running:
+                    if not self.heap:
+                        self.condition.wait()
+                    else:
+                        delay = self.heap[0][0] - self.clock()
+                        if delay <= 0:
+                            break
+                        self.condition.wait(delay)
+                if not self.running:
+                    return
+            for timer in self.pop_due(self.clock()):
+                self.dispatch(self.fire, timer)
+
+    def start(self):
+        with self.condition:
+            if self.running:
+                return
+            self.running = True
+        self.thread = threading.Thread(target=self.run, name="scheduler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
@@ -0,0 +1,217 @@
+import asyncio
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+
+# frames a player may have waiting before they're treated as a slow consumer
+SEND_QUEUE_HIGH_WATER = int(os.environ.get("SEND_QUEUE_HIGH_WATER", "256"))
+# seconds the writer waits for a client to take any bytes before giving up on it
+SEND_TIMEOUT = float(os.environ.get("SEND_TIMEOUT", "10"))
+# most frames the writer hands to one sendmsg call
+MAX_WRITE_BATCH = 64
+# sockets that support scatter-gather sendmsg, resolved once at import
+SENDMSG_SOCKET_TYPES = (socket.socket,) if hasattr(socket.socket, "sendmsg") else ()
+
+
+# write frames with one scatter-gather call, broadcast frames are shared so they're never copied or joined
+def send_frames(sock, frames, timeout: float = SEND_TIMEOUT):
+    if not isinstance(sock, SENDMSG_SOCKET_TYPES):
+        for frame in frames:
+            sock.sendall(frame)
+        return
+    views = [memoryview(frame) for frame in frames]
+    progress = time.monotonic()
+    while views:
+        try:
+            sent = sock.sendmsg(views)
+        except socket.timeout:
+            # the socket's timeout is the reader's, only give up once nothing went out for our own
+            if time.monotonic() - progress >= timeout:
+                raise
+            continue
+        progress = time.monotonic()
+        # drop the buffers that went out whole and slice into a partially sent one
+        while views and sent >= len(views[0]):
+            sent -= len(views[0])
+            views.pop(0)
+        if views and sent:
+            views[0] = views[0][sent:]
+
+
+class SendQueue:
+    """
+    Bounded outbound queue for one player, drained by its own writer thread.
+    sendall only enqueues, so a broadcast never waits on a slow socket. if a
+    client stops reading and the queue passes the high-water mark the player
+    is marked slow and its socket is shut down, which the reader thread sees
+    as a disconnect and cleans up as usual. a send that fails, or takes
+    nothing for SEND_TIMEOUT seconds, shuts the socket down the same way.
+    """
+
+    def __init__(self, sock, logger=None, high_water: int = SEND_QUEUE_HIGH_WATER, send_timeout: float = SEND_TIMEOUT):
+        self.sock = sock
+        self.logger = logger or logging.getLogger(__name__)
+        self.queue = queue.Queue(maxsize=high_water)
+        self.high_water = high_water
+        self.send_timeout = send_timeout
+        self.slow = False
+        self.closed = False
+        self.thread = None
+        self.lock = threading.Lock()
+
+    # socket-like, so the queue can be handed to send_message in place of a socket
+    def sendall(self, data: bytes):
+        self.put(data)
+
+    def put(self, frame: bytes) -> bool:
+        if self.closed:
+            return False
+        self.start()
+        try:
+            self.queue.put_nowait(frame)
+        except queue.Full:
+            self.mark_slow()
+            return False
+        return True
+
+    # writer thread is started on first use so idle players cost nothing extra
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+
+    def run(self):
+        stopping = False
+        while not stopping:
+            try:
+                # close can't queue its sentinel into a full queue, so once closed stop when it runs dry
+                frames = [self.queue.get_nowait() if self.closed else self.queue.get()]
+            except queue.Empty:
+                break
+            # pick up whatever else is already waiting so a burst goes out in one syscall
+            while len(frames) < MAX_WRITE_BATCH:
+                try:
+                    frames.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in frames:
+                stopping = True
+                frames = frames[:frames.index(None)]
+            if self.closed and self.slow:
+                break
+            if not frames:
+                continue
+            try:
+                send_frames(self.sock, frames, self.send_timeout)
+            except (BrokenPipeError, ConnectionResetError, OSError) as e:
+                self.logger.debug("Error sending message : %s", e)
+                # nothing queued after this can be delivered, have the reader disconnect the player
+                self.shut_down()
+                break
+
+    def mark_slow(self):
+        if self.slow:
+            return
+        self.slow = True
+        self.logger.warning(
+            f"send queue over high-water mark ({self.high_water}), disconnecting slow consumer"
+        )
+        self.shut_down()
+
+    def shut_down(self):
+        self.closed = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    # stop accepting frames, the writer exits after flushing what is already queued
+    # a full queue has no room for the sentinel, the writer sees closed once it empties it
+    def close(self):
+        self.closed = True
+        if self.thread is not None:
+            try:
+                self.queue.put_nowait(None)
+            except queue.Full:
+                pass
+
+    def join(self, timeout: float = None):
+        # the lock keeps us from seeing a thread start() hasn't started yet
+        with self.lock:
+            thread = self.thread
+        if thread is not None:
+            thread.join(timeout)
+
+
+class AsyncSendQueue:
+    """
+    SendQueue counterpart for the asyncio engine, drained by a writer task
+    that waits on the stream's drain() so kernel backpressure is respected.
+    """
+
+    def __init__(self, writer, logger=None, high_water: int = SEND_QUEUE_HIGH_WATER):
+        self.writer = writer
+        self.logger = logger or logging.getLogger(__name__)
+        self.queue = asyncio.Queue(maxsize=high_water)
+        self.high_water = high_water
+        self.slow = False
+        self.closed = False
+        self.task = None
+
+    def sendall(self, data: bytes):
+        self.put(data)
+
+    def put(self, frame: bytes) -> bool:
+        if self.closed:
+            return False
+        if self.task is None:
+            self.task = asyncio.get_running_loop().create_task(self.run())
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            self.mark_slow()
+            return False
+        return True
+
+    async def run(self):
+        while True:
+            try:
+                frame = self.queue.get_nowait() if self.closed else await self.queue.get()
+            except asyncio.QueueEmpty:
+                break
+            if frame is None or self.slow:
+                break
+            try:
+                self.writer.write(frame)
+                await self.writer.drain()
+            except (ConnectionError, OSError) as e:
+                self.logger.debug("Error sending message : %s", e)
+                self.closed = True
+                self.writer.transport.abort()
+                break
+
+    def mark_slow(self):
+        if self.slow:
+            return
+        self.slow = True
+        self.closed = True
+        self.logger.warning(
+            f"send queue over high-water mark ({self.high_water}), disconnecting slow consumer"
+        )
+        self.writer.transport.abort()
+
+    def close(self):
+        self.closed = True
+        if self.task is not None:
+            try:
+                self.queue.put_nowait(None)
+            except asyncio.QueueFull:
+                pass
+
+    async def join(self, timeout: float = None):
+        if self.task is not None:
+            await asyncio.wait([self.task], timeout=timeout)
@@ -1,21 +1,49 @@
+import os
 import sys
 import socket
 import threading
 import signal
-import json
-import random
-from typing import List
 import ipaddress
-from prettytable import PrettyTable
-
-from src.utils.messages import send_message, receive_message
+import time
+import contextlib
+
+from src.utils.messages import (
+    receive_message,
+    validate_outbound,
+    prepare_message,
+    encode_message,
+    MessageBuffer,
+    CODECS,
+    RECV_SIZE,
+)
 from src.server.player_class import Player
+from src.server.send_queue import SendQueue
+from src.server.registry import Registry, LOBBY, game_topic
 from src.server.game_class import Game
 from src.server.data.loader import QuizDataLoader
+from src.server.question_sampler import QuestionSampler
+from src.server.status import ServerStatus
+from src.server.scheduler import Scheduler
+from src.server.metrics import ServerMetrics, METRICS_HOST, METRICS_PORT
 
-from src.utils.logger import setup_logger
+from src.utils.question_cache import QuestionCache, QUESTION_CACHE_MAX_SIZE
+from src.utils.logger import setup_logger, log_payload
 logger = setup_logger("server.log")
 
+# how long shutdown waits for queued messages to reach clients
+SHUTDOWN_FLUSH_TIMEOUT = 2.0
+# how long a disconnecting player's last messages (an error, its results) get to go out
+DISCONNECT_FLUSH_TIMEOUT = 1.0
+# pending connections the kernel queues for us, a handful stalls bursts of clients in the handshake
+LISTEN_BACKLOG = 128
+# seconds players get to answer each question before the game moves on without them, 0 waits forever
+# off by default, the client has no countdown to tell players a question will move on
+QUESTION_TIME_LIMIT = float(os.environ.get("QUESTION_TIME_LIMIT", "0"))
+# longest time limit create_game can ask for, longer ones are cut to this
+MAX_QUESTION_TIME_LIMIT = 3600.0
+# answers arriving within this many milliseconds of each other share one response_update, 0 sends one per answer
+RESPONSE_UPDATE_INTERVAL = float(os.environ.get("RESPONSE_UPDATE_INTERVAL_MS", "50")) / 1000
+
 
 class Server:
     def __init__(self, logger, host="127.0.0.1", port_num=5000):
@@ -25,49 +53,66 @@ class Server:
             socket.AF_INET, socket.SOCK_STREAM
         )
         self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.players: List[Player] = []
+        # indexes every connected player and running game
+        self.registry = Registry()
         self.running = False
-        self.curr_games: List[Game] = []
+        # bytes not re-encoded thanks to broadcasts sharing one frame
+        self.broadcast_bytes_saved = 0
         self.logger = logger
-        self.quiz_data = QuizDataLoader(self.logger).quiz_data
+        self.quiz_loader = QuizDataLoader(self.logger)
+        self.quiz_data = self.quiz_loader.quiz_data
+        self.question_sampler = QuestionSampler(self.quiz_data)
         self.chapters_available = {}
         self.populate_chapters_available()
+        # counters and the rate-limited console view of players and games
+        self.status = ServerStatus(self)
+        # Prometheus counters and histograms, served over HTTP when METRICS_PORT is set
+        self.metrics = ServerMetrics(self)
+        self.question_rounds = {}  # game id -> (question index, when it was first sent)
+        # one thread and heap for every question's time limit
+        self.scheduler = Scheduler(self.call_soon, self.metrics.scheduler_lag.observe)
+        self.round_timers = {}  # game id -> Timer for the current question
+        self.progress_timers = {}  # game id -> Timer for its next coalesced response_update
 
     def populate_chapters_available(self):
         for chapter, questions in self.quiz_data.items():
             self.chapters_available[chapter] = len(questions)
 
-    def print_info(self):
-        player_table = PrettyTable()
-        player_table.field_names = ["name", "curr_game", "ip", "port"]
-        for player in self.players:
-            player_table.add_row(
-                [
-                    player.name,
-                    player.curr_game,
-                    player.sock.getpeername()[0],
-                    player.sock.getpeername()[1],
-                ]
-            )
-        print("\n=== server info ===")
-        print(f"listening on {self.host}:{self.port_num}")
-        print("\ncurrent players:")
-        print(player_table)
-
-        game_table = PrettyTable()
-        game_table.field_names = ["id", "owner", "question responses", "quiz progress"]
-        for game in self.curr_games:
-            game_table.add_row(
-                [
-                    game.game_id,
-                    game.owner_name,
-                    game.get_response_progress_str(),
-                    f"{game.curr_qi + 1}/{len(game.questions)}",
-                ]
+    # run a callback in the context handlers run in, engines with an event loop hand it over to the loop
+    def call_soon(self, callback, *args):
+        callback(*args)
+
+    # held while a game changes, so a handler thread and a scheduler callback don't both advance it
+    def game_lock(self, game_id):
+        game = self.registry.get_game(game_id)
+        return game.lock if game is not None else contextlib.nullcontext()
+
+    def start_metrics(self):
+        if METRICS_PORT:
+            port = self.metrics.start_http(METRICS_HOST, METRICS_PORT)
+            self.logger.info(f"serving metrics on http://{METRICS_HOST}:{port}/metrics")
+
+    def watch_quiz_data(self):
+        self.quiz_loader.start_watching(
+            lambda quiz_data, changed, removed: self.call_soon(
+                self.apply_quiz_data, quiz_data, changed, removed
             )
-        print("\ncurrent games:")
-        print(game_table)
-        print()
+        )
+
+    # swap in reloaded chapters, games already running keep the questions they were created with
+    def apply_quiz_data(self, quiz_data, changed, removed):
+        self.quiz_data = quiz_data
+        self.question_sampler = QuestionSampler(quiz_data)
+        self.chapters_available = {chapter: len(questions) for chapter, questions in quiz_data.items()}
+
+        # only players in the lobby are picking chapters
+        update = {
+            "message_type": "game_update",
+            "subtype": "chapters_update",
+            "chapters_available": {chapter: self.chapters_available[chapter] for chapter in changed},
+            "chapters_removed": removed,
+        }
+        self.publish(update, LOBBY)
 
     def start(self):
         # attempt to connect
@@ -75,14 +120,21 @@ class Server:
         try:
             self.logger.info(f"Attempting to connect to {self.host}:{self.port_num}")
             self.server_socket.bind((self.host, self.port_num))
-            self.server_socket.listen(5)
-            self.print_info()
+            self.server_socket.listen(LISTEN_BACKLOG)
             self.logger.debug(
                 f"Server started on {self.host}:{self.port_num}\nListening for connections..."
             )
 
             # call shutdown if keyboard interruption
             signal.signal(signal.SIGINT, self.shutdown)
+            # print the status view on demand with kill -USR1
+            if hasattr(signal, "SIGUSR1"):
+                signal.signal(signal.SIGUSR1, self.status.request)
+            self.status.start()
+            self.status.request()
+            self.scheduler.start()
+            self.start_metrics()
+            self.watch_quiz_data()
 
             # accept connections continually until not running
             while self.running:
@@ -91,12 +143,13 @@ class Server:
                     # blocking call awaits new connections
                     client_socket, addr = self.server_socket.accept()
                     # new thread for each new connection
-                    self.players.append(Player(client_socket))
+                    player = Player(client_socket, SendQueue(client_socket, self.logger), addr)
+                    self.registry.add_player(player)
+                    self.status.incr("connections_opened")
                     client_thread = threading.Thread(
-                        target=self.handle_client, args=(client_socket, addr)
+                        target=self.handle_client, args=(player, addr)
                     )
                     client_thread.start()
-                    self.print_info()
 
                 except socket.timeout:
                     continue
@@ -111,106 +164,164 @@ class Server:
             self.cleanup()
 
     # gets called for each incoming connection
-    def handle_client(self, client_socket, addr):
+    def handle_client(self, player: Player, addr):
+        client_socket = player.sock
+        buffer = MessageBuffer()
         try:
-            self.logger.debug(f"New connection from {addr}")
+            self.logger.debug("New connection from %s", addr)
 
-            new_connection_prompt = {
-                "message_type": "new_connection_prompt",
-                "current_games": [game.game_id for game in self.curr_games],
-                "current_players": [player.name for player in self.players],
-                "chapters_available": self.chapters_available,
-            }
-            send_message(self.logger, new_connection_prompt, client_socket)
+            self.send_to(player, self.new_connection_prompt())
 
             while self.running:
                 try:
                     client_socket.settimeout(1.0)
-                    # blocking call awaits message from client
-                    message = client_socket.recv(2048).decode("utf-8")
-                    if not message:
+                    # blocking call awaits data from client, may hold several messages or part of one
+                    data = client_socket.recv(RECV_SIZE)
+                    if not data:
                         break
-                    receive_message(self.logger, message, client_socket)
-                    msg_obj = json.loads(message)
-                    msg_type = msg_obj["message_type"]
-
-                    if msg_type == "create_game":
-                        player_name = msg_obj["player_name"]
-                        game_id = msg_obj["game_id"]
-                        player = next((p for p in self.players if p.sock == client_socket), None)
-                        if player is None:
-                            self.logger.error(f"Player not found for socket {client_socket}")
-                            return
-                        player.curr_game = game_id
-                        player.name = player_name
-                        self.logger.debug(
-                            f"Player {player_name} wants to start a game named {game_id}"
-                        )
-                        self.print_info()
-                        self.handle_create_game(msg_obj, player)
-
-                    elif msg_type == "join_game":
-                        player_name = msg_obj["player_name"]
-                        game_id = msg_obj["game_id"]
-                        player = next((p for p in self.players if p.sock == client_socket), None)
-                        if player is None:
-                            self.logger.error(f"Player not found for socket {client_socket}")
-                            return
-                        player.curr_game = game_id
-                        player.name = player_name
-                        self.handle_join_game(msg_obj, player)
-                        self.print_info()
-
-                    elif msg_type == "game_update":
-                        subtype = msg_obj["subtype"]
-                        player_name = msg_obj["player_name"]
-                        if subtype == "player_disconnect":
-                            player = next((p for p in self.players if p == player_name), None)
-                            if player:
-                                self.handle_player_disconnect(player)
-                        elif subtype == "player_leave":
-                            player = next((p for p in self.players if p.name == player_name), None)
-                            if player:
-                                self.handle_player_leave(player)
-                            else:
-                                self.logger.info(f"player_leave: player {player_name} not found. players: {[str(player) for player in self.players]}")
-                        self.print_info()
-
-                    elif msg_type == "quiz_answer":
-                        player_name = msg_obj["player_name"]
-                        game_id = msg_obj["game_id"]
-                        game = next((g for g in self.curr_games if g == game_id), None)
-                        if game:
-                            reponses_done = game.store_response(player_name, msg_obj["answer"])
-                            if self.check_game_end(game_id):
-                                self.delete_game(game_id)
-                                continue
-                            if reponses_done:
-                                # get and broadcast next question
-                                self.send_current_question(game)
-
-                            # broadcast response progress regardless
-                            self.send_response_progress(game)
-                        self.print_info()
-
-                    else:
-                        self.logger.error(f"unknown message type from {addr}")
-                        raise Exception(f"unknown message type {msg_obj}")
+                    self.metrics.bytes_received.inc(len(data))
+                    for message in buffer.feed(data):
+                        msg_obj = receive_message(self.logger, message, player.outbox)
+                        if msg_obj is None:
+                            raise Exception("invalid JSON message")
+                        with self.game_lock(msg_obj.get("game_id") or player.curr_game):
+                            self.handle_message(msg_obj, client_socket, addr)
 
                 except socket.timeout:
                     continue
                 except Exception as e:
-                    self.logger.error(f"error handling client {addr}: {e}")
+                    self.logger.error("error handling client %s: %s", addr, e)
                     error_message = {"message_type": "error", "message": str(e)}
-                    send_message(self.logger, error_message, client_socket)
+                    self.send_to(player, error_message)
                     break
         finally:
-            player = next((p for p in self.players if p.sock == client_socket), None)
-            if player:
-                self.handle_player_disconnect(player)
+            if player in self.registry:
+                with self.game_lock(player.curr_game):
+                    self.handle_player_disconnect(player)
             client_socket.close()
-            self.logger.debug(f"Connection from {addr} closed")
-            self.print_info()
+            self.status.incr("connections_closed")
+            self.logger.debug("Connection from %s closed", addr)
+
+    # names of running games and connected players, what a client needs to pick a game
+    def lobby_view(self):
+        games = [game.game_id for game in self.registry.all_games()]
+        players = [player.name for player in self.registry.all_players()]
+        return games, players
+
+    def new_connection_prompt(self):
+        games, players = self.lobby_view()
+        return {
+            "message_type": "new_connection_prompt",
+            "current_games": games,
+            "current_players": players,
+            "chapters_available": self.chapters_available,
+            "codecs": list(CODECS),
+        }
+
+    # players in a game don't get lobby updates, this catches them up when they're back in the lobby
+    def lobby_snapshot(self):
+        games, players = self.lobby_view()
+        return {
+            "message_type": "game_update",
+            "subtype": "lobby_snapshot",
+            "current_games": games,
+            "current_players": players,
+        }
+
+    # dispatch a single parsed message from a client
+    def handle_message(self, msg_obj, client_socket, addr):
+        msg_type = msg_obj["message_type"]
+        self.status.incr("messages_handled")
+        self.metrics.messages_received.inc(1, msg_type)
+
+        if msg_type == "client_hello":
+            # client picked a wire codec from the ones offered in new_connection_prompt
+            player = self.registry.get_player_by_sock(client_socket)
+            if player is None:
+                raise Exception(f"Player not found for socket {client_socket}")
+            codec = CODECS.get(msg_obj["codec"])
+            if codec is None:
+                raise Exception(f"unsupported codec {msg_obj['codec']}")
+            player.codec = codec
+            # the client keeps questions between games, track which ones so they're only sent once
+            cache_size = min(msg_obj.get("question_cache", 0), QUESTION_CACHE_MAX_SIZE)
+            if cache_size > 0:
+                player.question_cache = QuestionCache(cache_size)
+
+        elif msg_type == "question_request":
+            # the client was sent a question by id that it didn't have after all
+            player = self.registry.get_player_by_sock(client_socket)
+            if player is None:
+                raise Exception(f"Player not found for socket {client_socket}")
+            game = self.registry.game_of(player)
+            question = game.get_current_question() if game else None
+            if question is not None and question.get("question_id") == msg_obj["question_id"]:
+                self.status.incr("question_cache_misses")
+                self.send_to(player, {"message_type": "quiz_question", **question})
+            else:
+                self.logger.debug("question_request for %s, not the current question", msg_obj["question_id"])
+
+        elif msg_type == "create_game":
+            player_name = msg_obj["player_name"]
+            game_id = msg_obj["game_id"]
+            player = self.registry.get_player_by_sock(client_socket)
+            if player is None:
+                raise Exception(f"Player not found for socket {client_socket}")
+            player.curr_game = game_id
+            self.registry.rename_player(player, player_name)
+            self.logger.debug(
+                f"Player {player_name} wants to start a game named {game_id}"
+            )
+            self.handle_create_game(msg_obj, player)
+
+        elif msg_type == "join_game":
+            player_name = msg_obj["player_name"]
+            game_id = msg_obj["game_id"]
+            player = self.registry.get_player_by_sock(client_socket)
+            if player is None:
+                raise Exception(f"Player not found for socket {client_socket}")
+            player.curr_game = game_id
+            self.registry.rename_player(player, player_name)
+            self.handle_join_game(msg_obj, player)
+
+        elif msg_type == "game_update":
+            subtype = msg_obj["subtype"]
+            player_name = msg_obj["player_name"]
+            if subtype == "player_disconnect":
+                player = self.registry.get_player_by_id(player_name)
+                if player:
+                    self.handle_player_disconnect(player)
+            elif subtype == "player_leave":
+                player = self.registry.get_player_by_name(player_name)
+                if player:
+                    self.handle_player_leave(player)
+                    self.send_to(player, self.lobby_snapshot())
+                else:
+                    self.logger.info(f"player_leave: player {player_name} not found. players: {[str(player) for player in self.registry.all_players()]}")
+
+        elif msg_type == "quiz_answer":
+            player_name = msg_obj["player_name"]
+            game_id = msg_obj["game_id"]
+            game = self.registry.get_game(game_id)
+            if game:
+                question_index = game.curr_qi
+                reponses_done = game.store_response(player_name, msg_obj["answer"])
+                if reponses_done:
+                    self.finish_question_round(game, question_index)
+                if self.check_game_end(game_id):
+                    self.delete_game(game_id)
+                    return
+                if reponses_done:
+                    # get and broadcast next question, with its progress straight away
+                    self.send_current_question(game)
+                    self.send_response_progress(game)
+                else:
+                    # answers trickling in share one progress update per interval
+                    self.schedule_response_progress(game)
+
+        else:
+            self.logger.error(f"unknown message type from {addr}")
+            raise Exception(f"unknown message type {msg_obj}")
 
     def send_player_update(self, old_name: str, old_game: str, new_name: str, new_game: str):
         remove_msg = {
@@ -219,7 +330,7 @@ class Server:
             "player_name": old_name,
             "game_id": old_game
         }
-        self.broadcast(remove_msg)
+        self.publish(remove_msg, *self.player_update_topics(old_game))
 
         update_msg = {
             "message_type": "game_update",
@@ -227,36 +338,30 @@ class Server:
             "player_name": new_name,
             "game_id": new_game
         }
-        self.broadcast(update_msg)
+        self.publish(update_msg, *self.player_update_topics(new_game))
+
+    # the lobby keeps its player list, and a game its players, up to date
+    def player_update_topics(self, game_id: str):
+        if game_id == "no_game":
+            return (LOBBY,)
+        return LOBBY, game_topic(game_id)
 
     # start game
     def handle_create_game(self, msg_obj, player: Player):
         game_id = msg_obj.get("game_id", "unknown_game_id")
         player_id = player.id
 
-        # populate quiz data
+        # populate quiz data, the sampler is swapped whole on reload so this reads one snapshot
         selected_chapters = msg_obj.get("chapters", [])
         num_questions = msg_obj.get("num_questions", 0)
-        total_possible_questions = sum(
-            [len(self.quiz_data[chapter]) for chapter in selected_chapters]
+        questions = self.question_sampler.sample(
+            selected_chapters, num_questions, msg_obj.get("seed")
         )
-        percentage_per_chapter = num_questions / total_possible_questions
-        questions = []
-        for i, ch in enumerate(selected_chapters):
-            full_chapter = self.quiz_data[ch]
-            random.shuffle(full_chapter)
-            questions.extend(full_chapter[0:int(percentage_per_chapter * len(full_chapter))])
-
-            # if last chapter and not enough questions, add more
-            if i == len(selected_chapters) - 1 and len(questions) < num_questions:
-                start = int(percentage_per_chapter * len(full_chapter))
-                remainder = num_questions - len(questions)
-                end = start + remainder if start + remainder < len(full_chapter) else len(full_chapter)
-                questions.extend(full_chapter[start : end])
 
         try:
+            time_limit = self.requested_time_limit(msg_obj)
             # Check if game already exists
-            if any(g.game_id == game_id for g in self.curr_games):
+            if self.registry.get_game(game_id) is not None:
                 raise Exception(f"Game {game_id} already exists")
 
             # new game
@@ -265,8 +370,11 @@ class Server:
                 owner_id=player_id,
                 owner_name=player.name,
                 questions=questions,
+                time_limit=time_limit,
             )
-            self.curr_games.append(new_game)  # add new game to curr_games
+            self.registry.add_game(new_game)  # add new game to the registry
+            self.registry.join_game(player, game_id)
+            self.status.incr("games_created")
 
             # broadcast game created
             response = {
@@ -276,8 +384,9 @@ class Server:
                 "player_id": player_id,
                 "message": f"game {game_id} created successfully by {player.name}",
             }
-            self.logger.debug(f"game {game_id} created successfully by {player_id}")
-            self.broadcast(response)
+            self.logger.debug("game %s created successfully by %s", game_id, player_id)
+            # the creator already joined the game's topic, and needs the game in its list to play it
+            self.publish(response, LOBBY, game_topic(game_id))
 
             self.send_player_update("no_name", "no_game", player.name, new_game.game_id)
 
@@ -285,30 +394,37 @@ class Server:
             self.send_current_question(new_game)
             self.send_response_progress(new_game)
 
-            self.print_info()
-
         except Exception as e:
             error_message = {
                 "message_type": "error",
                 "message": f"error creating game: {e}",
             }
-            send_message(self.logger, error_message, player.sock)
+            self.send_to(player, error_message)
+
+    # create_game's time_limit, checked here too since sampled validation lets most messages through unchecked
+    def requested_time_limit(self, msg_obj) -> float:
+        time_limit = msg_obj.get("time_limit", QUESTION_TIME_LIMIT)
+        if isinstance(time_limit, bool) or not isinstance(time_limit, (int, float)):
+            raise Exception(f"time_limit must be a number of seconds, got {time_limit!r}")
+        # max last, so NaN ends up as no limit rather than a limit that's never reached
+        return max(0.0, min(float(time_limit), MAX_QUESTION_TIME_LIMIT))
 
     # join game
     def handle_join_game(self, msg_obj, player: Player):
         game_id = msg_obj.get("game_id")
-        game = next((g for g in self.curr_games if g.game_id == game_id), None)
+        game = self.registry.get_game(game_id)
 
         try:
-            # find game by game_id in curr_games
+            # find game by game_id in the registry
             if not game:
                 raise Exception(f"game id {game_id} not found")
 
             game.add_player(player.name)
+            self.registry.join_game(player, game_id)
             self.send_player_update("no_name", "no_game", player.name, game.game_id)
 
             # broadcast game reponse progress
-            self.send_response_progress(game)
+            self.schedule_response_progress(game)
             # send current question to player
             self.send_current_question(game)
 
@@ -317,11 +433,11 @@ class Server:
                 "message_type": "error",
                 "message": f"error joining game: {e}",
             }
-            send_message(self.logger, error_message, player.sock)
+            self.send_to(player, error_message)
 
     def handle_player_leave(self, player: Player):
         # Remove player from current game
-        game = next((g for g in self.curr_games if player.name in g.player_responses), None)
+        game = self.registry.game_of(player)
         if game:
             # attempt to send player results
             self.send_results(game, player)
@@ -334,7 +450,7 @@ class Server:
                 "player_name": player.name,
                 "message": f"Player {player.name} has left game {game.game_id}"
             }
-            self.broadcast(response)
+            self.publish(response, LOBBY, game_topic(game.game_id))
 
             # Check if the player is the owner of the game
             if game.owner_name == player.name:
@@ -344,6 +460,7 @@ class Server:
             else:
                 # Proceed to next question if all other responses are collected
                 if game.all_players_responded():
+                    self.finish_question_round(game, game.curr_qi)
                     game.advance_question()
                     # send response update / current question
                     self.send_response_progress(game)
@@ -352,22 +469,23 @@ class Server:
 
             # remove player from the game
             game.remove_player(player.name)
+            self.registry.leave_game(player)
             if self.check_game_end(game.game_id):
                 self.logger.info("game should be ending !!!")
                 self.delete_game(game.game_id)
-            self.logger.info(f"Player {player.name} removed from game {game.game_id}")
+            self.logger.info("Player %s removed from game %s", player.name, game.game_id)
 
         else:
-            self.logger.info(f"Player {player.name} was not in any game.")
+            self.logger.info("Player %s was not in any game.", player.name)
 
-        self.send_response_progress(game)
+        self.schedule_response_progress(game)
 
         self.send_player_update(player.name, player.curr_game, "no_name", "no_game")
-        player.name = "no_name"
+        self.registry.rename_player(player, "no_name")
         player.curr_game = "no_game"
 
     def check_game_end(self, game_id):
-        game = next((g for g in self.curr_games if g.game_id == game_id), None)
+        game = self.registry.get_game(game_id)
         if game:
             # if on last question
             if game.curr_qi == len(game.questions) - 1:
@@ -381,57 +499,90 @@ class Server:
     def handle_player_disconnect(self, player: Player):
         self.handle_player_leave(player)
 
-        # Remove the player from the server's player list
-        if player in self.players:
-            self.players.remove(player)
-        # Close the player's socket
+        # Remove the player from the server's registry
+        self.registry.remove_player(player)
+        self.close_player(player)
+
+    # stop the player's writer once what's queued has gone out, then close its socket
+    def close_player(self, player: Player):
+        player.outbox.close()
+        player.outbox.join(DISCONNECT_FLUSH_TIMEOUT)
         try:
             player.sock.close()
         except Exception as e:
             self.logger.error(f"Error closing socket for {player.name}: {e}")
-        # delete game
 
     def delete_game(self, game_id):
         try:
-            # Find game by game_id in curr_games
-            game = next((g for g in self.curr_games if g.game_id == game_id), None)
+            # Find game by game_id in the registry
+            game = self.registry.get_game(game_id)
             if not game:
                 raise Exception(f"Game id {game_id} not found")
 
             self.send_results(game)
-            self.curr_games.remove(game)
             response = {
                 "message_type": "game_update",
                 "subtype": "game_end",
                 "game_id": game_id,
                 "message": f"Game {game_id} has ended",
             }
-            self.broadcast(response)
-            self.logger.info(f"Game {game_id} deleted successfully.")
-            self.logger.info(self.curr_games)
-
-            self.print_info()
+            # its players hear it too, that's their cue to leave the game
+            self.publish(response, LOBBY, game_topic(game_id))
+            self.registry.remove_game(game_id)
+            self.question_rounds.pop(game_id, None)
+            self.scheduler.cancel(self.round_timers.pop(game_id, None))
+            self.scheduler.cancel(self.progress_timers.pop(game_id, None))
+            self.status.incr("games_ended")
+            self.logger.info("Game %s deleted successfully.", game_id)
+            self.logger.info(self.registry.all_games())
 
         except Exception as e:
-            self.logger.error(f"Error deleting game {game_id}: {e}")
+            self.logger.error("Error deleting game %s: %s", game_id, e)
 
-    # send a message to subset of clients
-    def broadcast(self, message, game=None):
-        recipients = self.players
+    # send a message to every player subscribed to any of the topics
+    def publish(self, message, *topics):
+        self.deliver(message, self.registry.subscribers(*topics))
 
-        # If given a game, broadcast to players in that game
+    # send a message to a game's players, the lobby, or with neither everyone connected
+    def broadcast(self, message, game=None, lobby=False):
         if game:
-            recipients = []
-            for player_name in game.player_responses.keys():
-                player = next((p for p in self.players if p.name == player_name), None)
-                if player:
-                    recipients.append(player)
-
+            self.publish(message, game_topic(game.game_id))
+        elif lobby:
+            self.publish(message, LOBBY)
+        else:
+            self.deliver(message, self.registry.all_players())
+
+    def deliver(self, message, recipients):
+        if not recipients:
+            return
+
+        # validate and encode once per codec, every recipient's writer sends the same bytes
+        started = time.perf_counter()
+        if not validate_outbound(self.logger, message):
+            return
+        log_payload(self.logger, "Broadcasting message of type", message["message_type"], message)
+        frames = {}
+        sent_bytes = 0
         for player in recipients:
-            try:
-                send_message(self.logger, message, player.sock)
-            except (BrokenPipeError, ConnectionResetError, OSError) as e:
-                self.logger.error(f"Error broadcasting to {player.name}: {e}")
+            frame = frames.get(player.codec.name)
+            if frame is None:
+                frame = frames[player.codec.name] = encode_message(message, player.codec)
+            else:
+                self.broadcast_bytes_saved += len(frame)
+            player.outbox.put(frame)
+            sent_bytes += len(frame)
+        self.metrics.broadcast_seconds.observe(time.perf_counter() - started)
+        self.metrics.broadcast_recipients.observe(len(recipients))
+        self.metrics.messages_sent.inc(len(recipients), message["message_type"])
+        self.metrics.bytes_sent.inc(sent_bytes)
+
+    # send a message to one player in the codec it negotiated
+    def send_to(self, player: Player, message):
+        frame = prepare_message(self.logger, message, player.codec)
+        if frame is None:
+            return
+        player.outbox.put(frame)
+        self.metrics.record_sent(message["message_type"], len(frame))
 
     def send_current_question(self, game, player=None):
         question = game.get_current_question()
@@ -440,12 +591,84 @@ class Server:
             **question,
         }
         if player:
-            send_message(self.logger, message, player.sock)
+            self.send_to(player, self.cached_question(question) if self.question_cached(player, question) else message)
         else:
-            self.broadcast(message, game)
+            # a question round starts the first time its question goes out to the game
+            if self.question_rounds.get(game.game_id, (None,))[0] != game.curr_qi:
+                self.question_rounds[game.game_id] = (game.curr_qi, time.perf_counter())
+                self.start_question_timer(game)
+            # players who still have the question cached get its id, the rest the whole question
+            full, cached = [], []
+            for member in self.registry.subscribers(game_topic(game.game_id)):
+                (cached if self.question_cached(member, question) else full).append(member)
+            self.deliver(message, full)
+            if cached:
+                self.deliver(self.cached_question(question), cached)
+                self.status.incr("questions_sent_by_id", len(cached))
+
+    # whether the player's client holds the question, counting this send as its latest use either way
+    def question_cached(self, player: Player, question) -> bool:
+        if player.question_cache is None or "question_id" not in question:
+            return False
+        return player.question_cache.record(question["question_id"])
+
+    def cached_question(self, question):
+        return {"message_type": "quiz_question", "question_id": question["question_id"]}
+
+    def start_question_timer(self, game):
+        self.scheduler.cancel(self.round_timers.pop(game.game_id, None))
+        if game.time_limit > 0:
+            self.round_timers[game.game_id] = self.scheduler.call_later(
+                game.time_limit, self.expire_question, game.game_id, game.curr_qi
+            )
+
+    # a question's time limit ran out, move the game on without the players who haven't answered
+    def expire_question(self, game_id, question_index):
+        with self.game_lock(game_id):
+            game = self.registry.get_game(game_id)
+            if game is None or game.curr_qi != question_index or game.all_players_responded():
+                return
+            self.round_timers.pop(game_id, None)
+            stragglers = game.time_out_stragglers()
+            self.status.incr("questions_timed_out")
+            self.logger.info("question %s of game %s timed out waiting for %s", question_index + 1, game_id, stragglers)
+
+            if not game.advance_question():
+                # last question, end the game like check_game_end would once everyone answered
+                self.delete_game(game_id)
+                return
+            self.send_current_question(game)
+            self.send_response_progress(game)
 
+    # every player answered the question at question_index, record how long the round took
+    def finish_question_round(self, game, question_index):
+        round_ = self.question_rounds.get(game.game_id)
+        if round_ is not None and round_[0] == question_index:
+            self.metrics.question_rounds.observe(time.perf_counter() - round_[1])
+
+    # send the game's progress once the coalescing interval is up, unless an update is already on its way
+    def schedule_response_progress(self, game):
+        if not game:
+            return
+        if RESPONSE_UPDATE_INTERVAL <= 0:
+            self.send_response_progress(game)
+        elif game.game_id not in self.progress_timers:
+            self.progress_timers[game.game_id] = self.scheduler.call_later(
+                RESPONSE_UPDATE_INTERVAL, self.flush_response_progress, game.game_id
+            )
+
+    def flush_response_progress(self, game_id):
+        # popped before reading the progress, so answers stored after this schedule their own update
+        self.progress_timers.pop(game_id, None)
+        with self.game_lock(game_id):
+            game = self.registry.get_game(game_id)
+            if game:
+                self.send_response_progress(game)
+
+    # send the game's progress now, a pending coalesced update would only repeat it
     def send_response_progress(self, game):
         if game:
+            self.scheduler.cancel(self.progress_timers.pop(game.game_id, None))
             response = {
                 "message_type": "game_update",
                 "subtype": "response_update",
@@ -456,10 +679,10 @@ class Server:
     def send_results(self, game, player=None):
         results_message = {
             "message_type": "results",
-            "results": game.results
+            "scoreboard": game.scoreboard(),
         }
         if player:
-            send_message(self.logger, results_message, player.sock)
+            self.send_to(player, results_message)
         else:
             self.broadcast(results_message, game)
 
@@ -472,7 +695,18 @@ class Server:
 
     def cleanup(self):
         self.logger.info("Cleaning up server resources...")
-        for player in self.players:
+        self.quiz_loader.stop_watching()
+        self.scheduler.stop()
+        self.status.stop()
+        self.metrics.stop_http()
+        # let the writers flush what is queued (like server_shutdown) before closing sockets
+        players = self.registry.all_players()
+        for player in players:
+            player.outbox.close()
+        deadline = time.monotonic() + SHUTDOWN_FLUSH_TIMEOUT
+        for player in players:
+            player.outbox.join(max(0.0, deadline - time.monotonic()))
+        for player in players:
             try:
                 player.sock.close()
             except Exception:
@@ -482,6 +716,24 @@ class Server:
 
 if __name__ == "__main__":
     server = None
+    usage = "Usage: server.py [IP address] [port number] [threaded|async|workers]"
+
+    # optional trailing argument picks the server engine
+    engine = "threaded"
+    if len(sys.argv) in (2, 4):
+        engine = sys.argv.pop()
+    if engine == "threaded":
+        server_class = Server
+    elif engine == "async":
+        from src.server.async_server import AsyncServer
+        server_class = AsyncServer
+    elif engine == "workers":
+        from src.server.shard import ShardSupervisor
+        server_class = ShardSupervisor
+    else:
+        logger.error(f"Unknown server engine: {engine}.\n{usage}")
+        sys.exit(1)
+
     # correct number of args if specifying IP and port
     if len(sys.argv) == 3:
         ip = None
@@ -494,21 +746,21 @@ if __name__ == "__main__":
             port = int(sys.argv[2])
         except Exception as e:
             logger.error(
-                f"Bad arguments: {' '.join(sys.argv)} resulted in error: {e}\nUsage: server.py [IP address] [port number]"
+                f"Bad arguments: {' '.join(sys.argv)} resulted in error: {e}\n{usage}"
             )
             sys.exit(1)
         # instantiate server based on args
-        server = Server(logger, ip, port)
+        server = server_class(logger, ip, port)
 
     # no args -- use defaults
     elif len(sys.argv) == 1:
         logger.debug("No arguments passed. Using default IP address and port number")
-        server = Server(logger)
+        server = server_class(logger)
 
     # wrong number of args
     else:
         logger.error(
-            f"Bad arguments: {' '.join(sys.argv)}.\nUsage: server.py [IP address] [port number]"
+            f"Bad arguments: {' '.join(sys.argv)}.\n{usage}"
         )
         exit(1)
 
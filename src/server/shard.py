@@ -0,0 +1,347 @@
+import asyncio
+import base64
+import bisect
+import collections
+import hashlib
+import json
+import multiprocessing
+import os
+import signal
+import socket
+from typing import Dict, List
+
+from src.utils.messages import encode_frame, prepare_message, MessageBuffer, StreamSocket, CODECS
+from src.utils.question_cache import QuestionCache
+from src.utils.logger import setup_logger, stop_logger
+from src.server.player_class import Player
+from src.server.send_queue import AsyncSendQueue
+from src.server.server import SHUTDOWN_FLUSH_TIMEOUT
+from src.server.async_server import AsyncServer
+from src.server.registry import LOBBY
+from src.server.metrics import METRICS_HOST, METRICS_PORT
+
+# worker processes in multi-process mode, one per core by default
+SERVER_WORKERS = int(os.environ.get("SERVER_WORKERS", "0")) or os.cpu_count() or 1
+# points each worker gets on the hash ring, more points spread games more evenly
+RING_REPLICAS = 64
+# largest message between workers, a handed off connection carries its unread bytes along
+PEER_MESSAGE_SIZE = 256 * 1024
+PEER_SOCKET_BUFFER = 4 * PEER_MESSAGE_SIZE
+# lobby updates every worker's players need, each worker sends its own chapter updates
+RELAYED_SUBTYPES = {"game_created", "game_end", "player_connect", "player_disconnect", "player_leave"}
+
+
+def ring_hash(key: str) -> int:
+    # hash() is salted per process, every worker has to agree on where a game lives
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Consistent hash ring mapping game ids to worker indexes. each worker
+    owns RING_REPLICAS points, a game belongs to the first point at or after
+    its own hash, so adding a worker only moves the games that land on it.
+    """
+
+    def __init__(self, nodes: List[int], replicas: int = RING_REPLICAS):
+        points = sorted((ring_hash(f"worker-{node}-{i}"), node) for node in nodes for i in range(replicas))
+        self.hashes = [point for point, _ in points]
+        self.nodes = [node for _, node in points]
+
+    def owner(self, key: str) -> int:
+        index = bisect.bisect(self.hashes, ring_hash(key)) % len(self.hashes)
+        return self.nodes[index]
+
+
+class PeerChannel:
+    """
+    One end of a SOCK_SEQPACKET socketpair to another worker. every send is
+    one JSON message, optionally carrying file descriptors, and is queued
+    until the socket takes it so a busy peer never blocks the event loop.
+    """
+
+    def __init__(self, sock: socket.socket, on_message, logger):
+        self.sock = sock
+        self.on_message = on_message
+        self.logger = logger
+        self.loop = None
+        self.outgoing = collections.deque()
+        self.writing = False
+        self.sock.setblocking(False)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, PEER_SOCKET_BUFFER)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, PEER_SOCKET_BUFFER)
+
+    def start(self, loop):
+        self.loop = loop
+        loop.add_reader(self.sock, self.read)
+
+    def read(self):
+        try:
+            data, fds, _, _ = socket.recv_fds(self.sock, PEER_MESSAGE_SIZE, 1)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self.logger.error("peer channel failed: %s", e)
+            data, fds = b"", []
+        if not data:
+            self.loop.remove_reader(self.sock)
+            return
+        self.on_message(json.loads(data), fds)
+
+    # fds are owned by the channel from here on and closed once sent
+    def send(self, message, fds=()):
+        data = json.dumps(message).encode("utf-8")
+        if len(data) > PEER_MESSAGE_SIZE:
+            for fd in fds:
+                os.close(fd)
+            raise ValueError(f"peer message of {len(data)} bytes exceeds {PEER_MESSAGE_SIZE}")
+        self.outgoing.append((data, list(fds)))
+        self.flush()
+
+    def flush(self):
+        while self.outgoing:
+            data, fds = self.outgoing[0]
+            try:
+                socket.send_fds(self.sock, [data], fds)
+            except BlockingIOError:
+                if not self.writing:
+                    self.loop.add_writer(self.sock, self.flush)
+                    self.writing = True
+                return
+            except OSError as e:
+                self.logger.error("dropping message to peer: %s", e)
+            self.outgoing.popleft()
+            for fd in fds:
+                os.close(fd)
+        if self.writing:
+            self.loop.remove_writer(self.sock)
+            self.writing = False
+
+
+class ShardWorker(AsyncServer):
+    """
+    One of several processes sharing the listening port through
+    SO_REUSEPORT. each game lives on the worker the hash ring picks for its
+    id. a player that creates or joins a game owned by another worker has
+    its connection handed over: the socket's file descriptor, the player's
+    identity and any bytes not handled yet are sent to the owner over a Unix
+    socket, and the owner carries on reading from the same TCP connection.
+
+    lobby updates (new games, players coming and going, games ending) are
+    relayed to every other worker, which publishes them to its own lobby
+    and keeps a copy of the lobby for new_connection_prompt.
+    """
+
+    def __init__(self, logger, host, port_num, index: int, peers: Dict[int, socket.socket]):
+        super().__init__(logger, host, port_num)
+        self.reuse_port = True
+        self.index = index
+        self.ring = HashRing([index, *peers])
+        self.peers = {
+            worker: PeerChannel(sock, lambda message, fds, worker=worker: self.on_peer_message(worker, message, fds), logger)
+            for worker, sock in peers.items()
+        }
+        self.remote_games: Dict[str, int] = {}  # game id -> worker running it
+        self.remote_players = collections.Counter()  # named players connected to other workers
+        self.adopted = set()
+
+    async def serve(self):
+        loop = asyncio.get_running_loop()
+        for channel in self.peers.values():
+            channel.start(loop)
+        await super().serve()
+
+    # each worker serves metrics on its own port, counting up from METRICS_PORT
+    def start_metrics(self):
+        if METRICS_PORT:
+            port = self.metrics.start_http(METRICS_HOST, METRICS_PORT + self.index)
+            self.logger.info(f"worker {self.index} serving metrics on http://{METRICS_HOST}:{port}/metrics")
+
+    def lobby_view(self):
+        games, players = super().lobby_view()
+        return games + list(self.remote_games), players + list(self.remote_players.elements())
+
+    def handle_message(self, msg_obj, client_socket, addr):
+        if msg_obj["message_type"] in ("create_game", "join_game"):
+            owner = self.ring.owner(msg_obj["game_id"])
+            if owner != self.index:
+                player = self.registry.get_player_by_sock(client_socket)
+                if player is None:
+                    raise Exception(f"Player not found for socket {client_socket}")
+                # serve_player moves the connection, this message included, once we return
+                player.handoff = owner
+                return
+        super().handle_message(msg_obj, client_socket, addr)
+
+    def publish(self, message, *topics):
+        super().publish(message, *topics)
+        # game topics only have subscribers on the worker running the game, the lobby is on every worker
+        if LOBBY in topics and message.get("subtype") in RELAYED_SUBTYPES:
+            for channel in self.peers.values():
+                channel.send({"type": "broadcast", "message": message})
+
+    # handle_message marked the player for the worker owning its game, the message and everything
+    # the player sent after it go with the connection. either way it's done being read here
+    async def hand_off(self, player: Player, reader, writer, frames, buffer: MessageBuffer) -> bool:
+        worker = player.handoff
+        if worker is None:
+            return False
+        transport = writer.transport
+        transport.pause_reading()
+        # with reading paused the reader only holds what the transport read ahead, hand it all out
+        reader.feed_eof()
+        buffer.buffer.extend(await reader.read())
+        data = b"".join(encode_frame(frame) for frame in frames) + bytes(buffer.buffer)
+        self.registry.remove_player(player)
+
+        # everything already queued for the player must reach it before the new worker writes
+        player.outbox.close()
+        await player.outbox.join(SHUTDOWN_FLUSH_TIMEOUT)
+        for _ in range(int(SHUTDOWN_FLUSH_TIMEOUT * 1000)):
+            if not transport.get_write_buffer_size() or transport.is_closing():
+                break
+            await asyncio.sleep(0.001)
+
+        state = {
+            "id": player.id,
+            "name": player.name,
+            "curr_game": player.curr_game,
+            "codec": player.codec.name,
+            # the new worker keeps sending cached questions by id, oldest id first to keep the order
+            "question_cache": [cache.capacity, cache.ids()] if (cache := player.question_cache) else None,
+            "addr": list(player.addr) if player.addr else None,
+        }
+        fd = os.dup(transport.get_extra_info("socket").fileno())
+        try:
+            self.peers[worker].send(
+                {"type": "adopt", "player": state, "data": base64.b64encode(data).decode("ascii")}, [fd]
+            )
+        except ValueError as e:
+            self.logger.error("could not hand %s to worker %s: %s", player.name, worker, e)
+            # the outbox is already closed, so the error is written straight to the stream
+            error_message = {"message_type": "error", "message": f"could not move to the worker running game: {e}"}
+            frame = prepare_message(self.logger, error_message, player.codec)
+            if frame is not None:
+                player.sock.sendall(frame)
+            # back in the registry, serve_player's finally disconnects the player and tells the lobby
+            player.handoff = None
+            self.registry.add_player(player)
+            return True
+        self.logger.debug("handed %s to worker %s", player.addr, worker)
+        return True
+
+    def on_peer_message(self, worker: int, message, fds):
+        if message["type"] == "adopt":
+            task = asyncio.ensure_future(self.adopt(message["player"], base64.b64decode(message["data"]), fds[0]))
+            self.adopted.add(task)
+            task.add_done_callback(self.adopted.discard)
+        elif message["type"] == "broadcast":
+            self.track_lobby(worker, message["message"])
+            super().publish(message["message"], LOBBY)
+        for fd in fds[1:]:
+            os.close(fd)
+
+    # keep the lobby seen by other workers' players in step for new_connection_prompt
+    def track_lobby(self, worker: int, message):
+        subtype = message.get("subtype")
+        name = message.get("player_name")
+        if subtype == "game_created":
+            self.remote_games[message["game_id"]] = worker
+        elif subtype == "game_end":
+            self.remote_games.pop(message["game_id"], None)
+        elif subtype == "player_connect" and name and name != "no_name":
+            self.remote_players[name] += 1
+        elif subtype == "player_disconnect" and self.remote_players.get(name):
+            self.remote_players[name] -= 1
+            if not self.remote_players[name]:
+                del self.remote_players[name]
+
+    # take over a connection another worker handed us and carry on with its unread bytes
+    async def adopt(self, state, data: bytes, fd: int):
+        sock = socket.socket(fileno=fd)
+        sock.setblocking(False)
+        reader, writer = await asyncio.open_connection(sock=sock)
+        addr = tuple(state["addr"]) if state["addr"] else None
+        player = Player(StreamSocket(writer), AsyncSendQueue(writer, self.logger), addr)
+        player.id = state["id"]
+        player.codec = CODECS.get(state["codec"], player.codec)
+        if state["question_cache"]:
+            player.question_cache = QuestionCache(*state["question_cache"])
+        player.curr_game = state["curr_game"]
+        self.registry.add_player(player)
+        self.registry.rename_player(player, state["name"])
+        self.status.incr("connections_opened")
+        self.logger.debug("adopted %s from another worker", addr)
+        await self.serve_player(player, reader, writer, data)
+
+
+def run_worker(index: int, host: str, port: int, peers: Dict[int, socket.socket], unused: List[socket.socket]):
+    for sock in unused:
+        sock.close()
+    # loggers don't survive fork (their writer thread stays behind), each worker logs to its own file
+    log_file = f"server-worker{index}.log"
+    logger = setup_logger(log_file)
+    try:
+        ShardWorker(logger, host, port, index, peers).start()
+    finally:
+        # forked processes exit without running atexit, so write out the queued lines here
+        stop_logger(log_file)
+
+
+class ShardSupervisor:
+    """
+    Starts SERVER_WORKERS ShardWorker processes on one port, connected to
+    each other by a mesh of Unix socketpairs, and waits for them to exit.
+    SIGINT is passed on to every worker.
+    """
+
+    def __init__(self, logger, host="127.0.0.1", port_num=5000, workers: int = SERVER_WORKERS):
+        self.logger = logger
+        self.host = host
+        self.port_num = port_num
+        self.workers = workers
+        self.processes = []
+
+    def start(self):
+        # hold the port, so port 0 resolves to one real port all the workers share
+        reserved = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        reserved.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        reserved.bind((self.host, self.port_num))
+        self.port_num = reserved.getsockname()[1]
+
+        pairs = {
+            (i, j): socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+            for i in range(self.workers)
+            for j in range(i + 1, self.workers)
+        }
+        everything = [sock for pair in pairs.values() for sock in pair]
+        context = multiprocessing.get_context("fork")
+        self.logger.info(f"Starting {self.workers} workers on {self.host}:{self.port_num}")
+        for index in range(self.workers):
+            peers = {}
+            for (i, j), (a, b) in pairs.items():
+                if i == index:
+                    peers[j] = a
+                elif j == index:
+                    peers[i] = b
+            unused = [sock for sock in everything if sock not in peers.values()]
+            process = context.Process(
+                target=run_worker,
+                args=(index, self.host, self.port_num, peers, unused),
+                name=f"quiz-worker-{index}",
+            )
+            process.start()
+            self.processes.append(process)
+        for sock in everything:
+            sock.close()
+
+        signal.signal(signal.SIGINT, self.shutdown)
+        for process in self.processes:
+            process.join()
+        reserved.close()
+
+    def shutdown(self, signum, frame):
+        self.logger.info("Shutting down workers...")
+        for process in self.processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGINT)
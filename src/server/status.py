@@ -0,0 +1,117 @@
+import os
+import sys
+import threading
+from prettytable import PrettyTable
+
+# seconds between status snapshots on the console, 0 only renders on SIGUSR1
+STATUS_INTERVAL = float(os.environ.get("STATUS_INTERVAL", "5"))
+
+COUNTERS = (
+    "connections_opened",
+    "connections_closed",
+    "messages_handled",
+    "games_created",
+    "games_ended",
+    "questions_timed_out",
+    "questions_sent_by_id",
+    "question_cache_misses",
+)
+
+
+class ServerStatus:
+    """
+    Admin view of a running server. handlers only bump counters here, the
+    player and game tables are rendered by a reporter thread at most once
+    every interval seconds, and only if something was counted since the
+    last snapshot. request() renders one right away, the server wires it
+    to SIGUSR1.
+    """
+
+    def __init__(self, server, interval: float = STATUS_INTERVAL, out=None):
+        self.server = server
+        self.interval = interval
+        self.out = out if out is not None else sys.stdout
+        self.lock = threading.Lock()
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        # bumped with every counter change, compared against what was last rendered
+        self.version = 0
+        self.rendered_version = -1
+        self.render_requested = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def incr(self, name: str, amount: int = 1):
+        with self.lock:
+            self.counters[name] += amount
+            self.version += 1
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.counters), self.version
+
+    def render(self) -> str:
+        counters, version = self.snapshot()
+        server = self.server
+
+        player_table = PrettyTable()
+        player_table.field_names = ["name", "curr_game", "ip", "port"]
+        for player in server.registry.all_players():
+            ip, port = player.addr[:2] if player.addr else ("?", "?")
+            player_table.add_row([player.name, player.curr_game, ip, port])
+
+        game_table = PrettyTable()
+        game_table.field_names = ["id", "owner", "question responses", "quiz progress"]
+        for game in server.registry.all_games():
+            game_table.add_row(
+                [
+                    game.game_id,
+                    game.owner_name,
+                    game.get_response_progress_str(),
+                    f"{game.curr_qi + 1}/{len(game.questions)}",
+                ]
+            )
+
+        self.rendered_version = version
+        lines = [
+            "\n=== server info ===",
+            f"listening on {server.host}:{server.port_num}",
+            " ".join(f"{name}: {count}" for name, count in counters.items()),
+            f"broadcast bytes saved by encoding once: {server.broadcast_bytes_saved}",
+            f"question timers pending: {len(server.scheduler)}",
+            "\ncurrent players:",
+            player_table.get_string(),
+            "\ncurrent games:",
+            game_table.get_string(),
+            "",
+        ]
+        return "\n".join(lines)
+
+    def print(self):
+        try:
+            print(self.render(), file=self.out, flush=True)
+        except Exception as e:
+            self.server.logger.error(f"error rendering server status: {e}")
+
+    # safe to call from a signal handler, the reporter thread does the rendering
+    def request(self, *args):
+        self.render_requested.set()
+
+    def start(self):
+        if self.thread is not None:
+            return
+
+        def report():
+            while not self.stop_event.is_set():
+                requested = self.render_requested.wait(self.interval if self.interval > 0 else None)
+                self.render_requested.clear()
+                if self.stop_event.is_set():
+                    break
+                if requested or self.snapshot()[1] != self.rendered_version:
+                    self.print()
+
+        self.thread = threading.Thread(target=report, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.render_requested.set()
@@ -1,12 +1,60 @@
+import atexit
 import logging
+import os
+import queue
 import sys
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
 
+# level the loggers record at, DEBUG adds a line per message (and sampled bodies) to the log file
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+# size a log file may reach before it is rotated, and how many rotated files are kept
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", str(5 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.environ.get("LOG_BACKUP_COUNT", "3"))
+# log the full body of 1 in every N messages of each type, 1 logs all of them, 0 none
+LOG_PAYLOAD_SAMPLE_EVERY = int(os.environ.get("LOG_PAYLOAD_SAMPLE_EVERY", "100"))
+
+# listeners writing records to the real handlers, one per log file
+LISTENERS = {}
+
+
+class PayloadSampler:
+    """
+    Decides which message bodies get dumped at DEBUG. counts are kept per
+    message type, so the first message of every type is always logged and
+    after that one in every `every`, a flood of quiz answers can't crowd
+    out the rare message types.
+    """
+
+    def __init__(self, every: int = LOG_PAYLOAD_SAMPLE_EVERY):
+        self.every = every
+        self.counts = {}
+
+    def sample(self, message_type: str) -> bool:
+        if self.every <= 0:
+            return False
+        count = self.counts.get(message_type, 0)
+        self.counts[message_type] = count + 1
+        return count % self.every == 0
+
+
+PAYLOAD_SAMPLER = PayloadSampler()
+
+
+# debug line with a message body, only built for sampled messages when DEBUG is on
+def log_payload(logger, prefix: str, message_type: str, message):
+    if logger.isEnabledFor(logging.DEBUG) and PAYLOAD_SAMPLER.sample(message_type):
+        logger.debug("%s: %s %s", prefix, message_type, message)
+
 
 def setup_logger(log_file: str) -> logging.Logger:
     """
     Sets up a custom logger that writes to both file and console
 
+    Records are put on a queue by the logging thread and written to a
+    rotating log file and stdout by a listener thread, so callers never
+    wait on disk or terminal I/O.
+
     Args:
         log_file (str): Path to the log file
 
@@ -19,12 +67,14 @@ def setup_logger(log_file: str) -> logging.Logger:
 
     # Create logger
     logger = logging.getLogger(log_file)  # Use log_file as logger name
-    logger.setLevel(logging.DEBUG)  # Capture all levels
+    logger.setLevel(LOG_LEVEL)
 
     # Prevent adding handlers multiple times
     if not logger.handlers:
-        # File handler - DEBUG and up
-        file_handler = logging.FileHandler(log_dir / log_file)
+        # File handler - DEBUG and up, rotated by size
+        file_handler = RotatingFileHandler(
+            log_dir / log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT
+        )
         file_handler.setLevel(logging.DEBUG)
         file_formatter = logging.Formatter(
             "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
@@ -38,8 +88,27 @@ def setup_logger(log_file: str) -> logging.Logger:
         console_formatter = logging.Formatter("%(message)s")
         console_handler.setFormatter(console_formatter)
 
-        # Add handlers to logger
-        logger.addHandler(file_handler)
-        logger.addHandler(console_handler)
+        # the logger only enqueues, the listener thread does the writing
+        records = queue.SimpleQueue()
+        listener = QueueListener(
+            records, file_handler, console_handler, respect_handler_level=True
+        )
+        listener.start()
+        LISTENERS[log_file] = listener
+        logger.addHandler(QueueHandler(records))
 
     return logger
+
+
+# write out what's queued for one log file and stop its listener thread
+def stop_logger(log_file: str):
+    listener = LISTENERS.pop(log_file, None)
+    if listener is not None:
+        listener.stop()
+
+
+# flush whatever is still queued when the process exits
+@atexit.register
+def stop_listeners():
+    for log_file in list(LISTENERS):
+        stop_logger(log_file)
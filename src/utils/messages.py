@@ -1,11 +1,20 @@
 import json
 import os
+import random
 import socket
-from jsonschema import validate, ValidationError
-from typing import Dict, Any
+import struct
+from jsonschema import validators, ValidationError
+from typing import Dict, Any, List, Optional, Union
+
+from src.utils.logger import log_payload
 
 SCHEMAS_DIR = "src/utils/message_schemas"
 
+# every message on the wire is a 4 byte big-endian length followed by the payload
+FRAME_HEADER = struct.Struct("!I")
+MAX_FRAME_SIZE = 4 * 1024 * 1024
+RECV_SIZE = 65536
+
 
 # preload SCHEMAS
 def load_schemas():
@@ -24,59 +33,408 @@ def load_schemas():
 SCHEMAS = load_schemas()
 
 
-# handle messages based on schema
-def receive_message(logger, message: str, sock=None):
+# build a validator per schema once instead of on every message
+def compile_validators(schemas):
+    compiled = {}
+    for message_type, schema in schemas.items():
+        validator_class = validators.validator_for(schema)
+        validator_class.check_schema(schema)
+        compiled[message_type] = validator_class(schema)
+    return compiled
+
+
+VALIDATORS = compile_validators(SCHEMAS)
+
+
+class ValidationMode:
+    """
+    Decides which messages get schema validated.
+      full          every message, sent and received, for debugging what we build
+      inbound-only  only received messages, what we build ourselves is trusted (default)
+      sampled       a random sample_percent of messages in both directions
+    """
+
+    MODES = ("full", "inbound-only", "sampled")
+
+    def __init__(self, mode: str = "inbound-only", sample_percent: float = 10.0):
+        if mode not in self.MODES:
+            raise ValueError(f"unknown validation mode {mode}, expected one of {', '.join(self.MODES)}")
+        self.mode = mode
+        self.sample_percent = sample_percent
+
+    def should_validate(self, inbound: bool) -> bool:
+        if self.mode == "full":
+            return True
+        if self.mode == "inbound-only":
+            return inbound
+        return random.random() * 100 < self.sample_percent
+
+
+VALIDATION = ValidationMode(
+    os.environ.get("MESSAGE_VALIDATION", "inbound-only"),
+    float(os.environ.get("MESSAGE_VALIDATION_SAMPLE_PERCENT", "10")),
+)
+
+
+def set_validation_mode(mode: str, sample_percent: float = 10.0):
+    global VALIDATION
+    VALIDATION = ValidationMode(mode, sample_percent)
+
+
+class JsonCodec:
+    """the original wire format, UTF-8 JSON text"""
+
+    name = "json"
+
+    def encode(self, message: Dict[str, Any]) -> bytes:
+        return json.dumps(message).encode("utf-8")
+
+    def decode(self, payload: Union[str, bytes]) -> Any:
+        return json.loads(payload)
+
+
+class MsgpackCodec:
+    """
+    Compact binary encoding using the MessagePack format. the msgpack
+    package is used when installed, otherwise the pure python packer below
+    handles the types our messages use (None, bool, int, float, str, bytes,
+    list and dict) and produces the same bytes.
+    """
+
+    name = "msgpack"
+
+    def __init__(self):
+        try:
+            import msgpack
+            self.packb = msgpack.packb
+            self.unpackb = lambda payload: msgpack.unpackb(payload, raw=False, strict_map_key=False)
+            self.native = True
+        except ImportError:
+            self.packb = self.pack
+            self.unpackb = self.unpack
+            self.native = False
+
+    def encode(self, message: Dict[str, Any]) -> bytes:
+        return self.packb(message)
+
+    def decode(self, payload: bytes) -> Any:
+        return self.unpackb(payload)
+
+    @classmethod
+    def pack(cls, obj: Any) -> bytes:
+        out = bytearray()
+        cls.pack_into(obj, out)
+        return bytes(out)
+
+    @classmethod
+    def pack_into(cls, obj: Any, out: bytearray):
+        if obj is None:
+            out.append(0xC0)
+        elif obj is True:
+            out.append(0xC3)
+        elif obj is False:
+            out.append(0xC2)
+        elif isinstance(obj, int):
+            if 0 <= obj < 0x80:
+                out.append(obj)
+            elif -0x20 <= obj < 0:
+                out.append(obj & 0xFF)
+            elif 0 <= obj <= 0xFF:
+                out += struct.pack(">BB", 0xCC, obj)
+            elif 0 <= obj <= 0xFFFF:
+                out += struct.pack(">BH", 0xCD, obj)
+            elif 0 <= obj <= 0xFFFFFFFF:
+                out += struct.pack(">BI", 0xCE, obj)
+            elif 0 <= obj:
+                out += struct.pack(">BQ", 0xCF, obj)
+            elif -0x80 <= obj:
+                out += struct.pack(">Bb", 0xD0, obj)
+            elif -0x8000 <= obj:
+                out += struct.pack(">Bh", 0xD1, obj)
+            elif -0x80000000 <= obj:
+                out += struct.pack(">Bi", 0xD2, obj)
+            else:
+                out += struct.pack(">Bq", 0xD3, obj)
+        elif isinstance(obj, float):
+            out += struct.pack(">Bd", 0xCB, obj)
+        elif isinstance(obj, str):
+            data = obj.encode("utf-8")
+            cls.pack_header(out, len(data), 0xA0, 32, 0xD9, 0xDA, 0xDB)
+            out += data
+        elif isinstance(obj, (bytes, bytearray)):
+            cls.pack_header(out, len(obj), None, 0, 0xC4, 0xC5, 0xC6)
+            out += obj
+        elif isinstance(obj, (list, tuple)):
+            cls.pack_header(out, len(obj), 0x90, 16, None, 0xDC, 0xDD)
+            for item in obj:
+                cls.pack_into(item, out)
+        elif isinstance(obj, dict):
+            cls.pack_header(out, len(obj), 0x80, 16, None, 0xDE, 0xDF)
+            for key, value in obj.items():
+                cls.pack_into(key, out)
+                cls.pack_into(value, out)
+        else:
+            raise TypeError(f"can't encode {type(obj).__name__} as msgpack")
+
+    # length header, using the fix* form when the length fits in it
+    @staticmethod
+    def pack_header(out: bytearray, length: int, fix, fix_limit, code8, code16, code32):
+        if fix is not None and length < fix_limit:
+            out.append(fix | length)
+        elif code8 is not None and length <= 0xFF:
+            out += struct.pack(">BB", code8, length)
+        elif length <= 0xFFFF:
+            out += struct.pack(">BH", code16, length)
+        else:
+            out += struct.pack(">BI", code32, length)
+
+    @classmethod
+    def unpack(cls, payload: bytes) -> Any:
+        obj, offset = cls.unpack_from(memoryview(payload), 0)
+        if offset != len(payload):
+            raise ValueError("extra bytes after msgpack object")
+        return obj
+
+    @classmethod
+    def unpack_from(cls, data: memoryview, offset: int):
+        code = data[offset]
+        offset += 1
+        if code < 0x80:
+            return code, offset
+        if code >= 0xE0:
+            return code - 0x100, offset
+        if 0xA0 <= code <= 0xBF:
+            return cls.unpack_str(data, offset, code & 0x1F)
+        if 0x90 <= code <= 0x9F:
+            return cls.unpack_array(data, offset, code & 0x0F)
+        if 0x80 <= code <= 0x8F:
+            return cls.unpack_map(data, offset, code & 0x0F)
+        if code == 0xC0:
+            return None, offset
+        if code == 0xC2:
+            return False, offset
+        if code == 0xC3:
+            return True, offset
+        if code in cls.FIXED_WIDTH:
+            fmt = cls.FIXED_WIDTH[code]
+            return struct.unpack_from(fmt, data, offset)[0], offset + struct.calcsize(fmt)
+        if code in cls.LENGTH_PREFIXED:
+            kind, fmt = cls.LENGTH_PREFIXED[code]
+            (length,) = struct.unpack_from(fmt, data, offset)
+            offset += struct.calcsize(fmt)
+            if kind == "str":
+                return cls.unpack_str(data, offset, length)
+            if kind == "bin":
+                return bytes(data[offset : offset + length]), offset + length
+            if kind == "array":
+                return cls.unpack_array(data, offset, length)
+            return cls.unpack_map(data, offset, length)
+        raise ValueError(f"unsupported msgpack type 0x{code:02x}")
+
+    @staticmethod
+    def unpack_str(data: memoryview, offset: int, length: int):
+        return str(data[offset : offset + length], "utf-8"), offset + length
+
+    @classmethod
+    def unpack_array(cls, data: memoryview, offset: int, length: int):
+        items = []
+        for _ in range(length):
+            item, offset = cls.unpack_from(data, offset)
+            items.append(item)
+        return items, offset
+
+    @classmethod
+    def unpack_map(cls, data: memoryview, offset: int, length: int):
+        obj = {}
+        for _ in range(length):
+            key, offset = cls.unpack_from(data, offset)
+            value, offset = cls.unpack_from(data, offset)
+            obj[key] = value
+        return obj, offset
+
+    FIXED_WIDTH = {
+        0xCA: ">f", 0xCB: ">d",
+        0xCC: ">B", 0xCD: ">H", 0xCE: ">I", 0xCF: ">Q",
+        0xD0: ">b", 0xD1: ">h", 0xD2: ">i", 0xD3: ">q",
+    }
+    LENGTH_PREFIXED = {
+        0xD9: ("str", ">B"), 0xDA: ("str", ">H"), 0xDB: ("str", ">I"),
+        0xC4: ("bin", ">B"), 0xC5: ("bin", ">H"), 0xC6: ("bin", ">I"),
+        0xDC: ("array", ">H"), 0xDD: ("array", ">I"),
+        0xDE: ("map", ">H"), 0xDF: ("map", ">I"),
+    }
 
-    # parse into object
+
+JSON_CODEC = JsonCodec()
+MSGPACK_CODEC = MsgpackCodec()
+CODECS = {codec.name: codec for codec in (MSGPACK_CODEC, JSON_CODEC)}
+# codecs this side asks for during the handshake, most preferred first. the pure
+# python packer is smaller on the wire but slower than the json module, so
+# msgpack is only preferred by default when the msgpack package is installed
+PREFERRED_CODECS = [
+    name.strip()
+    for name in os.environ.get(
+        "MESSAGE_CODECS", "msgpack,json" if MSGPACK_CODEC.native else "json,msgpack"
+    ).split(",")
+    if name.strip() in CODECS
+]
+
+
+def choose_codec(offered: List[str]):
+    for name in PREFERRED_CODECS:
+        if name in offered:
+            return CODECS[name]
+    return JSON_CODEC
+
+
+# every message is a JSON object or a msgpack map, so the first byte tells them apart
+def decode_payload(payload: Union[str, bytes]) -> Any:
+    if isinstance(payload, str) or payload[:1] == b"{":
+        return JSON_CODEC.decode(payload)
+    return CODECS["msgpack"].decode(payload)
+
+
+# prefix a payload with its length so the reader knows where it ends
+def encode_frame(payload: bytes) -> bytes:
+    if len(payload) > MAX_FRAME_SIZE:
+        raise ValueError(f"frame of {len(payload)} bytes exceeds {MAX_FRAME_SIZE}")
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+def encode_message(message: Dict[str, Any], codec=JSON_CODEC) -> bytes:
+    return encode_frame(codec.encode(message))
+
+
+class MessageBuffer:
+    """
+    Reassembles length-prefixed frames from a TCP byte stream. one recv may
+    hold several coalesced messages or only part of one, so each socket gets
+    its own buffer that keeps the leftover bytes between reads.
+    """
+
+    def __init__(self, max_frame_size: int = MAX_FRAME_SIZE):
+        self.buffer = bytearray()
+        self.max_frame_size = max_frame_size
+
+    def feed(self, data: bytes) -> List[bytes]:
+        self.buffer.extend(data)
+        messages = []
+        offset = 0
+        while len(self.buffer) - offset >= FRAME_HEADER.size:
+            (length,) = FRAME_HEADER.unpack_from(self.buffer, offset)
+            if length > self.max_frame_size:
+                raise ValueError(f"frame of {length} bytes exceeds {self.max_frame_size}")
+            end = offset + FRAME_HEADER.size + length
+            if end > len(self.buffer):
+                break
+            messages.append(bytes(self.buffer[offset + FRAME_HEADER.size : end]))
+            offset = end
+        # drop consumed frames in one go rather than once per message
+        if offset:
+            del self.buffer[:offset]
+        return messages
+
+    def pending(self) -> int:
+        return len(self.buffer)
+
+
+class StreamSocket:
+    """
+    Socket-like facade over an asyncio StreamWriter, so code written against
+    sockets (send_message, Player.sock) works unchanged on the event loop.
+    writes are buffered by the transport and never block.
+    """
+
+    def __init__(self, writer):
+        self.writer = writer
+
+    def sendall(self, data: bytes):
+        if self.writer.is_closing():
+            raise ConnectionResetError("stream is closed")
+        self.writer.write(data)
+
+    def getpeername(self):
+        return self.writer.get_extra_info("peername")
+
+    def fileno(self) -> int:
+        sock = self.writer.get_extra_info("socket")
+        return sock.fileno() if sock is not None else -1
+
+    def close(self):
+        self.writer.close()
+
+
+# handle messages based on schema, returns the parsed message or None if it isn't valid JSON
+def receive_message(logger, message: Union[str, bytes], sock=None) -> Optional[Dict[str, Any]]:
+
+    # parse into object with whichever codec the sender used
     try:
-        message_obj: Dict[str, Any] = json.loads(message)
+        message_obj: Dict[str, Any] = decode_payload(message)
+        if not isinstance(message_obj, dict):
+            raise ValueError(f"expected an object, got {type(message_obj).__name__}")
     except Exception as e:
-        logger.error(f"Error parsing json message into object: {e}")
+        logger.error("Error parsing message into object: %s", e)
         if sock:
-            sock.send(json.dumps({"message_type": "error", "message": f"Invalid JSON message: {message}"}).encode("utf-8"))
-        return
+            sock.sendall(encode_message({"message_type": "error", "message": f"Invalid message: {message!r}"}))
+        return None
     message_type = message_obj.get("message_type", "unknown")
 
-    logger.debug(f"Received message of type: {message_type} {message}")
+    log_payload(logger, "Received message of type", message_type, message_obj)
 
     if message_type not in SCHEMAS:
-        logger.error(f"Unknown message type: {message_type}")
+        logger.error("Unknown message type: %s", message_type)
         if sock:
-            sock.send(
-                json.dumps({"error": f"Unknown message type {message_type}"}).encode(
-                    "utf-8"
-                )
-            )
-        return
+            sock.sendall(encode_message({"message_type": "error", "message": f"Unknown message type {message_type}"}))
+        return message_obj
 
     # validate against schema
-    try:
-        validate(instance=message_obj, schema=SCHEMAS[message_type])
-        logger.debug(f"Message of type {message_type} is valid.")
-    except ValidationError as e:
-        logger.error(f"Invalid {message_type} message: {e}")
-        if sock:
-            sock.send(json.dumps({"error": str(e)}).encode("utf-8"))
+    if VALIDATION.should_validate(inbound=True):
+        try:
+            VALIDATORS[message_type].validate(message_obj)
+            logger.debug("Message of type %s is valid.", message_type)
+        except ValidationError as e:
+            logger.error("Invalid %s message: %s", message_type, e)
+            if sock:
+                sock.sendall(encode_message({"message_type": "error", "message": str(e)}))
+    return message_obj
 
 
-def send_message(logger, message: Dict[str, Any], sock=None):
+# check an outgoing message against its schema, subject to the validation mode
+def validate_outbound(logger, message: Dict[str, Any]) -> bool:
     message_type = message.get("message_type", "unknown")
-
-    # Validate against schema
+    if not VALIDATION.should_validate(inbound=False):
+        return True
+    if message_type not in VALIDATORS:
+        logger.error("Unknown message type: %s", message_type)
+        return False
     try:
-        validate(instance=message, schema=SCHEMAS[message_type])
-        logger.debug(f"Message of type {message_type} is valid.")
+        VALIDATORS[message_type].validate(message)
+        logger.debug("Message of type %s is valid.", message_type)
     except ValidationError as e:
-        logger.error(f"Invalid {message_type} message: {e}")
+        logger.error("Invalid %s message: %s", message_type, e)
+        return False
+    return True
+
+
+# validate and encode a message into a frame that can be written to any number of sockets
+def prepare_message(logger, message: Dict[str, Any], codec=JSON_CODEC) -> Optional[bytes]:
+    if not validate_outbound(logger, message):
+        return None
+    log_payload(logger, "Sending message of type", message.get("message_type", "unknown"), message)
+    return encode_message(message, codec)
+
+
+def send_message(logger, message: Dict[str, Any], sock=None, codec=JSON_CODEC):
+    frame = prepare_message(logger, message, codec)
+    if frame is None:
         return
 
     # Send the message
     try:
-        logger.debug(f"Sending message of type: {message_type} {message}")
         if sock:
-            sock.send(json.dumps(message).encode("utf-8"))
+            sock.sendall(frame)
     except (BrokenPipeError, ConnectionResetError, OSError) as e:
-        logger.debug(f"Error sending message : {e}")
+        logger.debug("Error sending message : %s", e)
 
 
 MOCKS = {
@@ -115,28 +473,11 @@ MOCKS = {
     },
     "results": {
         "message_type": "results",
-        "players": [
+        "scoreboard": [
             {
-                "player_name": "Alice",
-                "results": [
-                    {
-                        "chapter": 1,
-                        "question": "What is the capital of France?",
-                        "answer": "Paris",
-                        "submitted_answer": "Paris",
-                        "correct_answer": "Paris",
-                        "is_correct": True,
-                    },
-                    {
-                        "chapter": 2,
-                        "question": "What is the capital of Germany?",
-                        "answer": "Berlin",
-                        "submitted_answer": "Madrid",
-                        "correct_answer": "Berlin",
-                        "is_correct": False,
-                    },
-                ],
-            }
+                "player_name": "Alice", "correct": 1, "answered": 2, "timed_out": 0,
+                "first_question": 0, "last_question": 1, "asked_bits": "3", "correct_bits": "2",
+            },
         ],
     },
 }
@@ -0,0 +1,63 @@
+import collections
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+# questions a client remembers between games, it asks the server for this many in client_hello
+QUESTION_CACHE_SIZE = int(os.environ.get("QUESTION_CACHE_SIZE", "512"))
+# most ids the server tracks for one connection, whatever the client asks for
+QUESTION_CACHE_MAX_SIZE = 1024
+
+
+# stable id for a question, the same content gets the same id on every server start and worker
+def question_id(question: Dict[str, Any]) -> str:
+    content = {key: value for key, value in question.items() if key != "question_id"}
+    encoded = json.dumps(content, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+class QuestionCache:
+    """
+    Bounded least recently used map of question ids, to the question on the
+    client and to nothing on the server. the server keeps one per connection
+    and updates it for every quiz_question it sends, the client updates its
+    own for every quiz_question it receives. both see the same ids in the
+    same order, so the server knows which questions the client still holds
+    without being told, and sends those as their id alone.
+    """
+
+    def __init__(self, capacity: int = QUESTION_CACHE_SIZE, ids: Optional[List[str]] = None):
+        self.capacity = capacity
+        self.entries = collections.OrderedDict()
+        for qid in ids or ():
+            self.add(qid)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, qid: str):
+        return qid in self.entries
+
+    def add(self, qid: str, question: Any = None):
+        self.entries[qid] = question
+        self.entries.move_to_end(qid)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    # the cached question, marked most recently used, or None when it isn't cached
+    def get(self, qid: str) -> Any:
+        if qid not in self.entries:
+            return None
+        self.entries.move_to_end(qid)
+        return self.entries[qid]
+
+    # mark the id most recently used, adding it if it's missing, and return whether it was already cached
+    def record(self, qid: str) -> bool:
+        cached = qid in self.entries
+        self.add(qid, self.entries.get(qid))
+        return cached
+
+    # oldest first, enough to rebuild the cache in the same order
+    def ids(self) -> List[str]:
+        return list(self.entries)
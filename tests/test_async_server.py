@@ -0,0 +1,128 @@
+import unittest
+from unittest.mock import Mock
+import asyncio
+import io
+import json
+from src.server.async_server import AsyncServer
+from src.server.status import ServerStatus
+from src.utils.messages import encode_message, MessageBuffer
+
+
+class TestAsyncServer(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.logger = Mock()
+        self.server = AsyncServer(self.logger, "127.0.0.1", 0)
+        # keep the status tables out of the test output
+        self.server.status = ServerStatus(self.server, out=io.StringIO())
+        self.serve_task = asyncio.create_task(self.server.serve())
+        # wait until the listener is bound
+        while self.server.stopped is None or self.server.port_num == 0:
+            await asyncio.sleep(0.01)
+
+    async def asyncTearDown(self):
+        self.server.shutdown(None, None)
+        await asyncio.wait_for(self.serve_task, 5)
+
+    async def connect(self):
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.server.port_num)
+        return reader, writer, MessageBuffer()
+
+    async def read_messages(self, reader, buffer, count):
+        messages = []
+        while len(messages) < count:
+            data = await asyncio.wait_for(reader.read(65536), 5)
+            messages.extend(json.loads(m) for m in buffer.feed(data))
+        return messages
+
+    async def test_new_connection_prompt(self):
+        """Test each connection gets a prompt and a player"""
+        reader, writer, buffer = await self.connect()
+        prompt = (await self.read_messages(reader, buffer, 1))[0]
+
+        self.assertEqual(prompt["message_type"], "new_connection_prompt")
+        self.assertEqual(len(self.server.registry.all_players()), 1)
+        writer.close()
+
+    async def test_create_game(self):
+        """Test game creation through the async dispatch layer"""
+        reader, writer, buffer = await self.connect()
+        await self.read_messages(reader, buffer, 1)
+
+        writer.write(encode_message({
+            "message_type": "create_game",
+            "player_name": "alice",
+            "game_id": "g1",
+            "chapters": ["1"],
+            "num_questions": 1,
+            "is_private": False,
+        }))
+        # the creator left the lobby, so only its game's game_created, player_connect, question and progress arrive
+        messages = await self.read_messages(reader, buffer, 4)
+
+        self.assertIn("quiz_question", [m["message_type"] for m in messages])
+        self.assertEqual(self.server.registry.get_game("g1").game_id, "g1")
+        writer.close()
+
+    async def test_error_reaches_client_before_close(self):
+        """Test the error explaining a disconnect is sent before the socket closes"""
+        reader, writer, buffer = await self.connect()
+        writer.write(encode_message({"message_type": "bogus"}))
+
+        data = b""
+        while chunk := await asyncio.wait_for(reader.read(65536), 5):
+            data += chunk
+        messages = [json.loads(m) for m in buffer.feed(data)]
+        self.assertEqual([m["message_type"] for m in messages][:2], ["new_connection_prompt", "error"])
+        writer.close()
+
+    async def test_shutdown_waits_for_connections(self):
+        """Test serve returns only once every connection has closed its player"""
+        clients = [await self.connect() for _ in range(3)]
+        for reader, writer, buffer in clients:
+            await self.read_messages(reader, buffer, 1)
+        connections = set(self.server.connections)
+        self.assertEqual(len(connections), 3)
+
+        self.server.shutdown(None, None)
+        await asyncio.wait_for(self.serve_task, 5)
+        self.assertTrue(all(task.done() and not task.cancelled() for task in connections))
+        self.assertEqual(self.server.registry.all_players(), [])
+        for reader, writer, buffer in clients:
+            writer.close()
+
+    async def test_disconnect_removes_player(self):
+        """Test a closed connection is cleaned up"""
+        reader, writer, buffer = await self.connect()
+        await self.read_messages(reader, buffer, 1)
+        writer.close()
+        await writer.wait_closed()
+
+        for _ in range(100):
+            if not self.server.registry.all_players():
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual(self.server.registry.all_players(), [])
+
+    async def test_question_time_limit(self):
+        """Test unanswered questions time out and end the game"""
+        reader, writer, buffer = await self.connect()
+        await self.read_messages(reader, buffer, 1)
+
+        writer.write(encode_message({
+            "message_type": "create_game",
+            "player_name": "alice",
+            "game_id": "g1",
+            "chapters": ["1"],
+            "num_questions": 2,
+            "is_private": False,
+            "time_limit": 0.05,
+        }))
+        messages = []
+        while not any(m.get("subtype") == "game_end" for m in messages):
+            messages.extend(await self.read_messages(reader, buffer, 1))
+
+        self.assertEqual([m["message_type"] for m in messages].count("quiz_question"), 2)
+        scoreboard = next(m for m in messages if m["message_type"] == "results")["scoreboard"]
+        self.assertEqual(scoreboard[0]["timed_out"], 2)
+        self.assertEqual(self.server.metrics.scheduler_lag.count, 2)
+        writer.close()
@@ -0,0 +1,73 @@
+import unittest
+from unittest.mock import Mock
+import asyncio
+import io
+import random
+from src.server.async_server import AsyncServer
+from src.server.status import ServerStatus
+from src.client.bot import LoadStats, latency_distribution, percentile, run_load
+
+
+class TestBotHelpers(unittest.TestCase):
+    def test_latency_distribution(self):
+        """Test latency specs parse into samplers within their bounds"""
+        rng = random.Random(1)
+        self.assertEqual(latency_distribution("const:0.25", rng)(), 0.25)
+        uniform = latency_distribution("uniform:0.1:0.2", rng)
+        self.assertTrue(all(0.1 <= uniform() <= 0.2 for _ in range(100)))
+        normal = latency_distribution("normal:0:1", rng)
+        self.assertTrue(all(normal() >= 0 for _ in range(100)))
+        self.assertEqual(latency_distribution("exp:0", rng)(), 0.0)
+
+    def test_bad_latency_spec(self):
+        """Test unknown or malformed specs are rejected"""
+        with self.assertRaises(ValueError):
+            latency_distribution("uniform:1", random.Random())
+        with self.assertRaises(ValueError):
+            latency_distribution("pareto:1", random.Random())
+
+    def test_percentile(self):
+        """Test nearest-rank percentiles"""
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile(values, 100), 100)
+        self.assertEqual(percentile([], 50), 0.0)
+
+
+class TestRunLoad(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = AsyncServer(Mock(), "127.0.0.1", 0)
+        # keep the status tables out of the test output
+        self.server.status = ServerStatus(self.server, out=io.StringIO())
+        self.serve_task = asyncio.create_task(self.server.serve())
+        while self.server.stopped is None or self.server.port_num == 0:
+            await asyncio.sleep(0.01)
+
+    async def asyncTearDown(self):
+        self.server.shutdown(None, None)
+        await asyncio.wait_for(self.serve_task, 5)
+
+    async def test_games_played_to_completion(self):
+        """Test bots connect, split into games and finish every game"""
+        stats = await asyncio.wait_for(
+            run_load(Mock(), "127.0.0.1", self.server.port_num, players=6, games=2,
+                     num_questions=2, latency="const:0", seed=1),
+            30,
+        )
+
+        self.assertIsInstance(stats, LoadStats)
+        self.assertEqual(stats.connections, 6)
+        self.assertEqual(stats.games_completed, 2)
+        # every player answers every question
+        self.assertEqual(len(stats.round_trips), 12)
+        self.assertEqual(self.server.registry.all_games(), [])
+
+    async def test_more_games_than_players(self):
+        """Test impossible game splits are rejected before connecting"""
+        with self.assertRaises(ValueError):
+            await run_load(Mock(), "127.0.0.1", self.server.port_num, players=1, games=2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,15 +1,15 @@
 import unittest
-from unittest.mock import Mock, patch
-import socket
-import json
+from unittest.mock import Mock, AsyncMock, patch
+import asyncio
 from src.client.client import Client
+from src.utils.messages import encode_message, decode_payload, CODECS
 
 class TestClient(unittest.TestCase):
     def setUp(self):
         self.logger = Mock()
-        # Patch socket at class level
-        self.socket_patcher = patch('socket.socket')
-        self.mock_socket = self.socket_patcher.start()
+        # Patch the client's socket module only, asyncio needs real sockets for its event loop
+        self.socket_patcher = patch('src.client.client.socket')
+        self.mock_socket = self.socket_patcher.start().socket
         self.client = Client(self.logger, "localhost", 5000)
 
         # Mock the ui_handler to prevent display loop
@@ -18,6 +18,18 @@ class TestClient(unittest.TestCase):
     def tearDown(self):
         self.socket_patcher.stop()
 
+    # feed bytes to receive_messages as if read from the server, followed by it closing the connection
+    def receive(self, data, eof=True):
+        async def run():
+            self.client.reader = asyncio.StreamReader()
+            self.client.reader.feed_data(data)
+            if eof:
+                self.client.reader.feed_eof()
+            await asyncio.wait_for(self.client.receive_messages(), 5)
+
+        self.client.running = True
+        asyncio.run(run())
+
     def test_init(self):
         """Test client initialization"""
         self.assertEqual(self.client.host, "localhost")
@@ -42,9 +54,6 @@ class TestClient(unittest.TestCase):
 
     def test_receive_messages_game_update(self):
         """Test handling of game update messages"""
-        # Set up mock socket behavior
-        mock_socket_instance = self.mock_socket.return_value
-
         # Set up a sequence of responses
         message = {
             "message_type": "game_update",
@@ -52,22 +61,12 @@ class TestClient(unittest.TestCase):
             "game_id": "test_game"
         }
 
-        # Make recv return our message once, then raise socket.timeout
-        mock_socket_instance.recv.side_effect = [
-            json.dumps(message).encode('utf-8'),
-            socket.timeout
-        ]
-
-        self.client.running = True
-        self.client.receive_messages()
+        self.receive(encode_message(message))
 
         self.assertIn("test_game", self.client.curr_games)
 
     def test_receive_messages_new_connection(self):
         """Test handling of new connection messages"""
-        # Set up mock socket behavior
-        mock_socket_instance = self.mock_socket.return_value
-
         message = {
             "message_type": "new_connection_prompt",
             "current_players": ["player1", "player2"],
@@ -75,14 +74,7 @@ class TestClient(unittest.TestCase):
             "chapters_available": {"1": 5, "2": 3}
         }
 
-        # Make recv return our message once, then raise socket.timeout
-        mock_socket_instance.recv.side_effect = [
-            json.dumps(message).encode('utf-8'),
-            socket.timeout
-        ]
-
-        self.client.running = True
-        self.client.receive_messages()
+        self.receive(encode_message(message))
 
         self.assertEqual(self.client.curr_players, ["player1", "player2"])
         self.assertEqual(self.client.curr_games, ["game1"])
@@ -90,9 +82,6 @@ class TestClient(unittest.TestCase):
 
     def test_receive_messages_quiz_question(self):
         """Test handling of quiz questions"""
-        # Set up mock socket behavior
-        mock_socket_instance = self.mock_socket.return_value
-
         question = {
             "message_type": "quiz_question",
             "question": "Test question?",
@@ -102,43 +91,110 @@ class TestClient(unittest.TestCase):
             ]
         }
 
-        # Make recv return our message once, then raise socket.timeout
-        mock_socket_instance.recv.side_effect = [
-            json.dumps(question).encode('utf-8'),
-            socket.timeout
-        ]
-
-        self.client.running = True
-        self.client.receive_messages()
+        self.receive(encode_message(question))
 
         self.assertEqual(self.client.curr_question, question)
 
     def test_receive_messages_server_shutdown(self):
         """Test handling of server shutdown message"""
-        # Set up mock socket behavior
-        mock_socket_instance = self.mock_socket.return_value
-
         message = {
             "message_type": "server_shutdown"
         }
 
-        # Make recv return our message once, then raise socket.timeout
-        mock_socket_instance.recv.side_effect = [
-            json.dumps(message).encode('utf-8'),
-            socket.timeout
-        ]
-
-        self.client.running = True
-        self.client.receive_messages()
+        # no EOF after it, the shutdown message alone has to end the loop
+        self.receive(encode_message(message), eof=False)
 
         self.assertFalse(self.client.running)
 
-    @patch('threading.Thread')
-    def test_connect(self, mock_thread):
-        """Test client connection"""
+    @patch('asyncio.open_connection', new_callable=AsyncMock)
+    def test_connect(self, mock_open):
+        """Test client connection runs the UI with network reads on its loop and closes cleanly"""
+        writer = Mock()
+        writer.is_closing.return_value = False
+        writer.wait_closed = AsyncMock()
+        mock_open.return_value = (Mock(), writer)
         self.client.connect()
 
         self.assertTrue(self.client.is_connected)
-        self.assertTrue(self.client.running)
-        mock_thread.assert_called_once()
-        self.client.ui_handler.start.assert_called_once()
+        self.client.ui_handler.start.assert_called_once_with(self.client.receive_messages)
+        # the UI exited without disconnecting, so connect says goodbye and closes the stream
+        self.assertFalse(self.client.running)
+        writer.write.assert_called_once()
+        writer.close.assert_called()
+        writer.wait_closed.assert_awaited_once()
+
+    def test_receive_messages_coalesced(self):
+        """Test several messages arriving in a single recv"""
+        created = {
+            "message_type": "game_update",
+            "subtype": "game_created",
+            "game_id": "test_game"
+        }
+        progress = {
+            "message_type": "game_update",
+            "subtype": "response_update",
+            "message": "1/2"
+        }
+
+        self.receive(encode_message(created) + encode_message(progress))
+
+        self.assertIn("test_game", self.client.curr_games)
+        self.assertEqual(self.client.response_progress, "1/2")
+
+    @patch('src.client.client.choose_codec', return_value=CODECS["msgpack"])
+    def test_new_connection_negotiates_codec(self, mock_choose):
+        """Test the client picks an offered codec and says so"""
+        self.client.handle_message({
+            "message_type": "new_connection_prompt",
+            "current_players": [],
+            "current_games": [],
+            "chapters_available": {"1": 5},
+            "codecs": ["msgpack", "json"]
+        })
+
+        self.assertEqual(self.client.codec.name, "msgpack")
+        self.mock_socket.return_value.sendall.assert_called_once()
+
+    def test_chapters_update(self):
+        """Test reloaded chapters are merged into the available chapters"""
+        self.client.available_chapters = {"1": 5, "2": 3}
+        self.client.handle_message({
+            "message_type": "game_update",
+            "subtype": "chapters_update",
+            "chapters_available": {"2": 6, "3": 1},
+            "chapters_removed": ["1"]
+        })
+        self.assertEqual(self.client.available_chapters, {"2": 6, "3": 1})
+
+    def test_lobby_snapshot(self):
+        """Test a lobby snapshot replaces the games and players lists"""
+        self.client.curr_games = ["stale"]
+        self.client.curr_players = ["gone"]
+        self.client.handle_message({
+            "message_type": "game_update",
+            "subtype": "lobby_snapshot",
+            "current_games": ["g2"],
+            "current_players": ["bob", "carol"],
+        })
+        self.assertEqual(self.client.curr_games, ["g2"])
+        self.assertEqual(self.client.curr_players, ["bob", "carol"])
+
+
+    def test_question_by_id(self):
+        """Test a question sent by id comes from the cache, or is asked for when it isn't there"""
+        question = {
+            "message_type": "quiz_question",
+            "question_id": "q1",
+            "chapter": "1",
+            "question": "Test question?",
+            "possible_answers": [{"answer": "A", "is_correct": True}],
+        }
+        self.client.handle_message(question)
+        self.client.curr_question = {}
+        self.client.handle_message({"message_type": "quiz_question", "question_id": "q1"})
+        self.assertEqual(self.client.curr_question, question)
+
+        self.client.handle_message({"message_type": "quiz_question", "question_id": "q2"})
+        self.assertEqual(self.client.curr_question, question)
+        sent = decode_payload(self.mock_socket.return_value.sendall.call_args.args[0][4:])
+        self.assertEqual(sent, {"message_type": "question_request", "question_id": "q2"})
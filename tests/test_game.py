@@ -72,3 +72,96 @@ class TestGame(unittest.TestCase):
         self.game.generate_game_id()
         self.assertEqual(len(self.game.game_id), 3)
         self.assertTrue(self.game.game_id.isalpha())
+
+    def test_tallies_track_answers(self):
+        """Test running tallies are kept as answers come in"""
+        self.game.add_player("player1")
+        self.game.store_response("owner", 0)
+        self.game.store_response("player1", 0)
+        self.game.store_response("owner", 0)
+
+        owner = self.game.tallies["owner"]
+        self.assertEqual((owner.correct, owner.answered), (1, 2))
+        self.assertEqual((owner.first_question, owner.last_question), (0, 1))
+        player1 = self.game.tallies["player1"]
+        self.assertEqual((player1.correct, player1.answered), (1, 1))
+
+    def test_changed_answer_is_counted_once(self):
+        """Test answering the same question again replaces the earlier answer"""
+        questions = [{"question": "Q1", "possible_answers": [
+            {"answer": "A", "is_correct": True}, {"answer": "B", "is_correct": False}
+        ]}]
+        game = Game("test_game", "owner_id", "owner", questions)
+        game.add_player("player1")
+        game.store_response("player1", 0)
+        game.store_response("player1", 1)
+
+        tally = game.tallies["player1"]
+        self.assertEqual((tally.correct, tally.answered), (0, 1))
+
+    def test_scoreboard_is_ranked(self):
+        """Test the scoreboard lists the best percentage first"""
+        self.game.add_player("player1")
+        self.game.store_response("player1", 0)
+        self.game.store_response("owner", 0)
+        self.game.store_response("player1", 0)
+
+        scoreboard = self.game.scoreboard()
+        self.assertEqual([entry["player_name"] for entry in scoreboard], ["owner", "player1"])
+        self.assertEqual(scoreboard[1], {
+            "player_name": "player1", "correct": 1, "answered": 2, "timed_out": 0, "first_question": 0, "last_question": 1,
+            "asked_bits": "3", "correct_bits": "1",
+        })
+
+    def test_progress_counts_follow_membership(self):
+        """Test progress stays right as answered players leave and slots are reused"""
+        self.game.add_player("player1")
+        self.game.add_player("player2")
+        self.game.store_response("player1", 0)
+        self.assertEqual(self.game.get_response_progress(), (1, 3))
+
+        self.game.remove_player("player1")
+        self.assertEqual(self.game.get_response_progress(), (0, 2))
+
+        # the new player takes player1's slot without inheriting its answer
+        self.game.add_player("player3")
+        self.assertEqual(self.game.get_response_progress(), (0, 3))
+        self.assertIsNone(self.game.player_responses["player3"])
+        self.assertEqual(list(self.game.player_responses), ["owner", "player2", "player3"])
+
+    def test_all_players_responded(self):
+        """Test the round is complete once every member answered"""
+        self.game.add_player("player1")
+        self.assertFalse(self.game.store_response("owner", 0))
+        self.assertTrue(self.game.store_response("player1", 0))
+        self.assertEqual(self.game.get_response_progress(), (0, 2))
+
+    def test_answer_out_of_range(self):
+        """Test answers that aren't one of the choices are rejected"""
+        with self.assertRaises(ValueError):
+            self.game.store_response("owner", 5)
+        self.assertEqual(self.game.get_response_progress(), (0, 1))
+
+    def test_no_instance_dict(self):
+        """Test games don't carry a per-instance __dict__"""
+        self.assertFalse(hasattr(self.game, "__dict__"))
+
+    def test_progress_str(self):
+        """Test progress reads answered out of members"""
+        self.game.add_player("player1")
+        self.game.store_response("player1", 0)
+        self.assertEqual(self.game.get_response_progress_str(), "1/2")
+        self.assertEqual(str(self.game), "id: test_game owner: owner curr q: 1/2 all qs: 0/2")
+
+    def test_progress_in_large_game(self):
+        """Test counts stay exact through a full round of a 500 player game"""
+        for i in range(1, 500):
+            self.game.add_player(f"player{i}")
+        names = ["owner"] + [f"player{i}" for i in range(1, 500)]
+        for answered, name in enumerate(names[:-1], 1):
+            self.assertFalse(self.game.store_response(name, 0))
+            self.assertEqual(self.game.get_response_progress(), (answered, 500))
+        self.game.remove_player("player7")
+        self.assertEqual(self.game.get_response_progress(), (498, 499))
+        self.assertTrue(self.game.store_response(names[-1], 0))
+        self.assertEqual(self.game.get_response_progress_str(), "0/499")
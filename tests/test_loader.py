@@ -0,0 +1,117 @@
+import unittest
+from unittest.mock import Mock, patch
+import json
+import os
+import tempfile
+from src.server.data.loader import QuizDataLoader
+
+
+def chapter(number, questions=1):
+    return {
+        "chapter": number,
+        "questions": [
+            {"question": f"Q{i}", "possible_answers": [{"answer": "A", "is_correct": True}]}
+            for i in range(questions)
+        ],
+    }
+
+
+class TestQuizDataLoader(unittest.TestCase):
+    def setUp(self):
+        self.logger = Mock()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.directory = self.tmp.name
+        self.cache_file = os.path.join(self.directory, "cache.pickle")
+        self.write("ch1.json", chapter("1", 2))
+        self.write("ch2.json", chapter("2", 3))
+
+    def write(self, filename, data, mtime_ns=None):
+        path = os.path.join(self.directory, filename)
+        with open(path, "w") as file:
+            json.dump(data, file)
+        if mtime_ns is not None:
+            os.utime(path, ns=(mtime_ns, mtime_ns))
+
+    def load(self):
+        return QuizDataLoader(self.logger, self.directory, self.cache_file)
+
+    def test_loads_chapters(self):
+        """Test every valid chapter file is loaded"""
+        loader = self.load()
+        self.assertEqual({ch: len(qs) for ch, qs in loader.quiz_data.items()}, {"1": 2, "2": 3})
+        self.assertTrue(os.path.exists(self.cache_file))
+
+    def test_unchanged_files_skip_validation(self):
+        """Test a warm start doesn't parse or validate anything"""
+        first = self.load()
+        with patch.object(QuizDataLoader, "validate_quiz_format") as mock_validate:
+            second = self.load()
+        mock_validate.assert_not_called()
+        self.assertEqual(second.quiz_data, first.quiz_data)
+
+    def test_questions_get_content_ids(self):
+        """Test each question gets an id from its content that survives a warm start"""
+        first = self.load()
+        ids = [q["question_id"] for q in first.quiz_data["2"]]
+        self.assertEqual(len(set(ids)), 3)
+        self.assertEqual([q["question_id"] for q in self.load().quiz_data["2"]], ids)
+
+    def test_changed_file_is_reloaded(self):
+        """Test editing a chapter invalidates only that chapter"""
+        self.load()
+        self.write("ch2.json", chapter("2", 5), mtime_ns=1)
+        with patch.object(QuizDataLoader, "validate_quiz_format", return_value=True) as mock_validate:
+            loader = self.load()
+        mock_validate.assert_called_once()
+        self.assertEqual(len(loader.quiz_data["2"]), 5)
+
+    def test_removed_file_is_dropped(self):
+        """Test deleted chapters disappear from the cache"""
+        self.load()
+        os.remove(os.path.join(self.directory, "ch1.json"))
+        loader = self.load()
+        self.assertNotIn("1", loader.quiz_data)
+        self.assertEqual(list(loader.cache["files"]), ["ch2.json"])
+
+    def test_corrupt_cache_is_ignored(self):
+        """Test an unreadable cache falls back to a full load"""
+        with open(self.cache_file, "wb") as file:
+            file.write(b"not a pickle")
+        loader = self.load()
+        self.assertEqual(len(loader.quiz_data), 2)
+
+    def test_refresh_swaps_changed_chapters(self):
+        """Test a reload replaces quiz_data and reports what changed"""
+        loader = self.load()
+        old_data = loader.quiz_data
+        old_ch1 = old_data["1"]
+        self.write("ch2.json", chapter("2", 4), mtime_ns=1)
+        self.write("ch3.json", chapter("3", 1))
+        os.remove(os.path.join(self.directory, "ch1.json"))
+
+        changed, removed = loader.refresh()
+
+        self.assertEqual(sorted(changed), ["2", "3"])
+        self.assertEqual(removed, ["1"])
+        self.assertIsNot(loader.quiz_data, old_data)
+        # the old snapshot is untouched
+        self.assertIs(old_data["1"], old_ch1)
+        self.assertEqual(len(old_data["2"]), 3)
+
+    def test_broken_edit_keeps_last_good_chapter(self):
+        """Test an invalid edit doesn't remove the chapter"""
+        loader = self.load()
+        path = os.path.join(self.directory, "ch1.json")
+        with open(path, "w") as file:
+            file.write("{ half written")
+
+        self.assertEqual(loader.refresh(), ([], []))
+        self.assertEqual(len(loader.quiz_data["1"]), 2)
+
+    def test_refresh_without_changes(self):
+        """Test an idle reload keeps the same chapter lists"""
+        loader = self.load()
+        old_data = loader.quiz_data
+        self.assertEqual(loader.refresh(), ([], []))
+        self.assertIs(loader.quiz_data["1"], old_data["1"])
@@ -0,0 +1,70 @@
+import unittest
+from unittest.mock import Mock, patch
+import logging
+import os
+import tempfile
+from logging.handlers import QueueHandler
+from src.utils import logger as logger_module
+from src.utils.logger import PayloadSampler, log_payload, setup_logger, stop_logger
+
+
+class TestPayloadSampler(unittest.TestCase):
+    def test_sample_per_type(self):
+        """Test the first message of each type is logged, then one in every N"""
+        sampler = PayloadSampler(every=3)
+        answers = [sampler.sample("quiz_answer") for _ in range(7)]
+        self.assertEqual(answers, [True, False, False, True, False, False, True])
+        self.assertTrue(sampler.sample("create_game"))
+
+    def test_sample_disabled(self):
+        """Test every=0 never logs a payload"""
+        sampler = PayloadSampler(every=0)
+        self.assertFalse(sampler.sample("quiz_answer"))
+
+    def test_log_payload_skips_when_debug_off(self):
+        """Test nothing is logged or counted when DEBUG is disabled"""
+        logger = Mock()
+        logger.isEnabledFor.return_value = False
+        with patch.object(logger_module, "PAYLOAD_SAMPLER", PayloadSampler(every=1)) as sampler:
+            log_payload(logger, "Sending message of type", "quiz_answer", {"a": 1})
+        logger.debug.assert_not_called()
+        self.assertEqual(sampler.counts, {})
+
+
+class TestSetupLogger(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+
+    def tearDown(self):
+        listener = logger_module.LISTENERS.pop("queued.log", None)
+        if listener:
+            listener.stop()
+        logging.getLogger("queued.log").handlers.clear()
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_debug_off_by_default(self):
+        """Test per-message DEBUG lines aren't recorded unless LOG_LEVEL asks for them"""
+        logger = setup_logger("queued.log")
+        if "LOG_LEVEL" not in os.environ:
+            self.assertFalse(logger.isEnabledFor(logging.DEBUG))
+            self.assertTrue(logger.isEnabledFor(logging.INFO))
+
+    def test_records_written_through_queue(self):
+        """Test the logger only enqueues and the listener writes the file"""
+        logger = setup_logger("queued.log")
+        self.assertEqual(len(logger.handlers), 1)
+        self.assertIsInstance(logger.handlers[0], QueueHandler)
+
+        logger.info("hello %s", "queue")
+        stop_logger("queued.log")
+        self.assertNotIn("queued.log", logger_module.LISTENERS)
+
+        with open(os.path.join("logs", "queued.log")) as file:
+            self.assertIn("hello queue", file.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
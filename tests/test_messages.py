@@ -1,12 +1,28 @@
 import unittest
 from unittest.mock import Mock
 import json
-from src.utils.messages import send_message, receive_message
+from src.utils.messages import (
+    send_message,
+    receive_message,
+    encode_message,
+    set_validation_mode,
+    MessageBuffer,
+    ValidationMode,
+    SCHEMAS,
+    VALIDATORS,
+    CODECS,
+    MsgpackCodec,
+    choose_codec,
+    decode_payload,
+)
 
 class TestMessages(unittest.TestCase):
     def setUp(self):
         self.logger = Mock()
 
+    def tearDown(self):
+        set_validation_mode("inbound-only")
+
     def test_validate_create_game_message(self):
         """Test create game message validation"""
         valid_msg = {
@@ -31,4 +47,103 @@ class TestMessages(unittest.TestCase):
         }
 
         send_message(self.logger, msg, mock_socket)
-        mock_socket.send.assert_called_once()
+        mock_socket.sendall.assert_called_once()
+
+    def test_message_buffer_coalesced(self):
+        """Test several frames in one chunk are all returned"""
+        first = {"message_type": "game_update", "subtype": "response_update", "message": "1/2"}
+        second = {"message_type": "quiz_question", "chapter": "1", "question": "Q", "possible_answers": []}
+        buffer = MessageBuffer()
+
+        messages = buffer.feed(encode_message(first) + encode_message(second))
+
+        self.assertEqual([json.loads(m) for m in messages], [first, second])
+        self.assertEqual(buffer.pending(), 0)
+
+    def test_message_buffer_split(self):
+        """Test a frame split across reads is reassembled"""
+        msg = {"message_type": "error", "message": "x" * 5000}
+        data = encode_message(msg)
+        buffer = MessageBuffer()
+
+        self.assertEqual(buffer.feed(data[:3]), [])
+        self.assertEqual(buffer.feed(data[3:2048]), [])
+        messages = buffer.feed(data[2048:])
+
+        self.assertEqual(len(messages), 1)
+        self.assertEqual(json.loads(messages[0]), msg)
+
+    def test_message_buffer_oversized(self):
+        """Test a frame over the size limit is rejected"""
+        buffer = MessageBuffer(max_frame_size=10)
+        with self.assertRaises(ValueError):
+            buffer.feed(encode_message({"message_type": "error", "message": "too long"}))
+
+    def test_validators_compiled_for_every_schema(self):
+        """Test each schema has a prebuilt validator"""
+        self.assertEqual(set(VALIDATORS), set(SCHEMAS))
+
+    def test_invalid_outbound_dropped_in_full_mode(self):
+        """Test invalid messages aren't sent when validating everything"""
+        set_validation_mode("full")
+        mock_socket = Mock()
+        send_message(self.logger, {"message_type": "error"}, mock_socket)
+        mock_socket.sendall.assert_not_called()
+
+    def test_outbound_skips_validation_in_inbound_only_mode(self):
+        """Test outbound messages are trusted in inbound-only mode"""
+        set_validation_mode("inbound-only")
+        mock_socket = Mock()
+        send_message(self.logger, {"message_type": "error"}, mock_socket)
+        mock_socket.sendall.assert_called_once()
+
+        # inbound is still checked
+        receive_message(self.logger, json.dumps({"message_type": "error"}), mock_socket)
+        self.assertEqual(mock_socket.sendall.call_count, 2)
+
+    def test_default_mode_trusts_outbound(self):
+        """Test messages we build ourselves aren't validated unless full mode is asked for"""
+        self.assertFalse(ValidationMode().should_validate(False))
+        self.assertTrue(ValidationMode().should_validate(True))
+
+    def test_sampled_mode(self):
+        """Test sampling at the edges validates all or nothing"""
+        self.assertTrue(all(ValidationMode("sampled", 100).should_validate(False) for _ in range(50)))
+        self.assertFalse(any(ValidationMode("sampled", 0).should_validate(True) for _ in range(50)))
+        with self.assertRaises(ValueError):
+            ValidationMode("sometimes")
+
+    def test_msgpack_round_trip(self):
+        """Test the binary codec encodes and decodes every message shape"""
+        codec = CODECS["msgpack"]
+        msg = {
+            "message_type": "quiz_question",
+            "chapter": "1",
+            "question": "é" * 300,
+            "possible_answers": [{"answer": "A", "is_correct": True}, {"answer": "B", "is_correct": False}],
+            "numbers": [0, 127, 128, -1, -33, 70000, -70000, 2 ** 40, 1.5, None],
+        }
+        payload = codec.encode(msg)
+
+        self.assertEqual(codec.decode(payload), msg)
+        self.assertEqual(MsgpackCodec.unpack(MsgpackCodec.pack(msg)), msg)
+        self.assertLess(len(payload), len(json.dumps(msg).encode("utf-8")))
+
+    def test_decode_payload_detects_codec(self):
+        """Test receivers decode either codec without being told which"""
+        msg = {"message_type": "game_update", "subtype": "response_update", "message": "1/2"}
+        for codec in CODECS.values():
+            self.assertEqual(decode_payload(codec.encode(msg)), msg)
+
+    def test_receive_binary_message(self):
+        """Test a msgpack frame goes through receive_message"""
+        msg = {"message_type": "join_game", "player_name": "a", "game_id": "g"}
+        payload = MessageBuffer().feed(encode_message(msg, CODECS["msgpack"]))[0]
+
+        self.assertEqual(receive_message(self.logger, payload), msg)
+
+    def test_choose_codec(self):
+        """Test negotiation picks an offered codec and falls back to JSON"""
+        self.assertIn(choose_codec(["msgpack", "json"]).name, CODECS)
+        self.assertEqual(choose_codec(["msgpack"]).name, "msgpack")
+        self.assertEqual(choose_codec(["cbor"]).name, "json")
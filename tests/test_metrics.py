@@ -0,0 +1,99 @@
+import unittest
+from unittest.mock import Mock
+import urllib.request
+import urllib.error
+from src.server.server import Server
+from src.server.game_class import Game
+from src.server.player_class import Player
+from src.server.metrics import Counter, Histogram, format_labels
+
+
+class TestMetricTypes(unittest.TestCase):
+    def test_counter_by_label(self):
+        """Test labelled counters keep one value per label"""
+        counter = Counter("messages_total", "help", "message_type")
+        counter.inc(1, "quiz_answer")
+        counter.inc(2, "quiz_answer")
+        counter.inc(1, "join_game")
+        self.assertEqual(counter.value("quiz_answer"), 3)
+        self.assertIn(("messages_total", {"message_type": "join_game"}, 1), list(counter.samples()))
+
+    def test_histogram_buckets(self):
+        """Test observations land in fixed buckets reported cumulatively"""
+        histogram = Histogram("round_seconds", "help", (1, 5))
+        for value in (0.5, 1, 3, 10):
+            histogram.observe(value)
+        samples = {(name, labels.get("le")): value for name, labels, value in histogram.samples()}
+        self.assertEqual(samples[("round_seconds_bucket", "1.0")], 2)
+        self.assertEqual(samples[("round_seconds_bucket", "5.0")], 3)
+        self.assertEqual(samples[("round_seconds_bucket", "+Inf")], 4)
+        self.assertEqual(samples[("round_seconds_count", None)], 4)
+        self.assertEqual(samples[("round_seconds_sum", None)], 14.5)
+
+    def test_label_escaping(self):
+        """Test label values are escaped for the text format"""
+        self.assertEqual(format_labels({"t": 'a"b\\c\n'}), '{t="a\\"b\\\\c\\n"}')
+
+
+class TestServerMetrics(unittest.TestCase):
+    def setUp(self):
+        self.server = Server(Mock(), "localhost", 5000)
+        self.metrics = self.server.metrics
+
+    def tearDown(self):
+        self.metrics.stop_http()
+        self.server.server_socket.close()
+
+    def add_player(self, name):
+        player = Player(Mock(), Mock())
+        self.server.registry.add_player(player)
+        self.server.registry.rename_player(player, name)
+        return player
+
+    def test_broadcast_counts_every_recipient(self):
+        """Test a broadcast counts one sent message and its bytes per recipient"""
+        players = [self.add_player(f"p{i}") for i in range(3)]
+        self.server.broadcast({"message_type": "server_shutdown"})
+
+        frame = players[0].outbox.put.call_args.args[0]
+        self.assertEqual(self.metrics.messages_sent.value("server_shutdown"), 3)
+        self.assertEqual(self.metrics.bytes_sent.value(), 3 * len(frame))
+        self.assertEqual(self.metrics.broadcast_seconds.count, 1)
+        self.assertEqual(self.metrics.broadcast_recipients.sum, 3)
+
+    def test_question_round_observed(self):
+        """Test a round is timed from sending the question to the last answer"""
+        owner = self.add_player("alice")
+        question = {"question": "q", "possible_answers": [{"answer": "a", "is_correct": True}]}
+        game = Game("g1", owner.id, "alice", [question, question])
+        self.server.registry.add_game(game)
+        self.server.registry.join_game(owner, "g1")
+        self.server.send_current_question(game)
+
+        self.server.handle_message(
+            {"message_type": "quiz_answer", "player_name": "alice", "game_id": "g1", "answer": 0},
+            owner.sock, None,
+        )
+
+        self.assertEqual(self.metrics.messages_received.value("quiz_answer"), 1)
+        self.assertEqual(self.metrics.question_rounds.count, 1)
+        # the next question started a new round
+        self.assertEqual(self.server.question_rounds["g1"][0], 1)
+
+    def test_http_endpoint(self):
+        """Test /metrics serves the Prometheus text format"""
+        self.add_player("alice")
+        port = self.metrics.start_http("127.0.0.1", 0)
+
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            body = response.read().decode("utf-8")
+            self.assertTrue(response.headers["Content-Type"].startswith("text/plain; version=0.0.4"))
+        self.assertIn("# TYPE quiz_question_round_seconds histogram", body)
+        self.assertIn("quiz_active_players 1", body)
+
+        with self.assertRaises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/other", timeout=5)
+
+
+if __name__ == "__main__":
+    unittest.main()
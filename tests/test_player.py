@@ -40,3 +40,9 @@ class TestPlayer(unittest.TestCase):
 
         def test_player_equality_with_id(self):
             self.assertEqual(self.player, self.player.id)
+
+    def test_no_instance_dict(self):
+        """Test players don't carry a per-instance __dict__"""
+        self.assertFalse(hasattr(self.player, "__dict__"))
+        with self.assertRaises(AttributeError):
+            self.player.nickname = "bob"
@@ -0,0 +1,46 @@
+import unittest
+from src.utils.question_cache import QuestionCache, question_id
+
+
+class TestQuestionId(unittest.TestCase):
+    def test_stable_content_hash(self):
+        """Test equal questions get equal ids and any edit changes the id"""
+        question = {"question": "q", "possible_answers": [{"answer": "a", "is_correct": True}]}
+        same = {"possible_answers": [{"is_correct": True, "answer": "a"}], "question": "q"}
+        edited = {"question": "q?", "possible_answers": [{"answer": "a", "is_correct": True}]}
+        self.assertEqual(question_id(question), question_id(same))
+        self.assertNotEqual(question_id(question), question_id(edited))
+        self.assertEqual(question_id({**question, "question_id": "old"}), question_id(question))
+
+
+class TestQuestionCache(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        """Test the oldest unused question is dropped once the cache is full"""
+        cache = QuestionCache(2)
+        cache.add("a", {"question": "A"})
+        cache.add("b", {"question": "B"})
+        self.assertEqual(cache.get("a"), {"question": "A"})
+        cache.add("c", {"question": "C"})
+        self.assertNotIn("b", cache)
+        self.assertEqual(cache.ids(), ["a", "c"])
+
+    def test_record(self):
+        """Test record reports hits and keeps the same order as the client's cache"""
+        client = QuestionCache(2)
+        server = QuestionCache(2)
+        for qid in ["a", "b", "a", "c", "b", "a"]:
+            hit = server.record(qid)
+            self.assertEqual(hit, client.get(qid) is not None)
+            if not hit:
+                client.add(qid, {"question": qid})
+        self.assertEqual(server.ids(), client.ids())
+
+    def test_rebuilt_from_ids(self):
+        """Test a cache rebuilt from its ids keeps their order"""
+        cache = QuestionCache(3, ["a", "b", "c"])
+        cache.record("a")
+        self.assertEqual(QuestionCache(3, cache.ids()).ids(), ["b", "c", "a"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+from src.server.question_sampler import QuestionSampler
+
+
+class TestQuestionSampler(unittest.TestCase):
+    def setUp(self):
+        self.quiz_data = {
+            "1": [{"question": f"1-{i}"} for i in range(10)],
+            "2": [{"question": f"2-{i}"} for i in range(30)],
+            "3": [{"question": f"3-{i}"} for i in range(3)],
+        }
+        self.sampler = QuestionSampler(self.quiz_data)
+
+    def test_draws_exact_count(self):
+        """Test exactly num_questions distinct questions are drawn"""
+        questions = self.sampler.sample(["1", "2", "3"], 17)
+        self.assertEqual(len(questions), 17)
+        self.assertEqual(len({q["question"] for q in questions}), 17)
+
+    def test_proportional_allocation(self):
+        """Test counts follow chapter size and always add up"""
+        self.assertEqual(self.sampler.allocate(["1", "2"], 8), [2, 6])
+        self.assertEqual(sum(self.sampler.allocate(["1", "2", "3"], 7)), 7)
+        # capped at what the chapters hold
+        self.assertEqual(self.sampler.allocate(["1", "3"], 50), [10, 3])
+
+    def test_questions_grouped_by_chapter(self):
+        """Test questions come from the chapters in the order chosen"""
+        questions = self.sampler.sample(["3", "1"], 13)
+        chapters = [q["question"].split("-")[0] for q in questions]
+        self.assertEqual(chapters, ["3"] * 3 + ["1"] * 10)
+
+    def test_seeded_draws_are_reproducible(self):
+        """Test the same seed gives the same questions"""
+        first = self.sampler.sample(["1", "2"], 12, seed=42)
+        second = QuestionSampler(self.quiz_data).sample(["1", "2"], 12, seed=42)
+        self.assertEqual(first, second)
+
+    def test_bank_is_not_mutated(self):
+        """Test sampling never reorders the shared question bank"""
+        before = {ch: list(qs) for ch, qs in self.quiz_data.items()}
+        for _ in range(20):
+            self.sampler.sample(["1", "2", "3"], 9)
+        self.assertEqual(self.quiz_data, before)
+
+    def test_duplicate_chapters(self):
+        """Test a chapter listed twice isn't drawn from twice"""
+        questions = self.sampler.sample(["3", "3"], 3)
+        self.assertEqual(len({q["question"] for q in questions}), 3)
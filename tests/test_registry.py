@@ -0,0 +1,95 @@
+import unittest
+from unittest.mock import Mock
+from src.server.registry import Registry, LOBBY, game_topic
+from src.server.player_class import Player
+from src.server.game_class import Game
+
+
+class TestRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = Registry()
+        self.player = Player(Mock())
+        self.registry.add_player(self.player)
+        self.game = Game("g1", self.player.id, "alice", [{"question": "Q1"}])
+
+    def test_player_lookups(self):
+        """Test players are found by socket, id and name"""
+        self.registry.rename_player(self.player, "alice")
+
+        self.assertIs(self.registry.get_player_by_sock(self.player.sock), self.player)
+        self.assertIs(self.registry.get_player_by_id(self.player.id), self.player)
+        self.assertIs(self.registry.get_player_by_name("alice"), self.player)
+        self.assertIn(self.player, self.registry)
+
+    def test_rename_updates_name_index(self):
+        """Test renaming drops the old name and never indexes no_name"""
+        self.registry.rename_player(self.player, "alice")
+        self.registry.rename_player(self.player, "no_name")
+
+        self.assertIsNone(self.registry.get_player_by_name("alice"))
+        self.assertIsNone(self.registry.get_player_by_name("no_name"))
+        self.assertEqual(self.player.name, "no_name")
+
+    def test_game_membership(self):
+        """Test joining and leaving keeps the member index consistent"""
+        other = Player(Mock())
+        self.registry.add_player(other)
+        self.registry.add_game(self.game)
+        self.registry.join_game(self.player, "g1")
+        self.registry.join_game(other, "g1")
+
+        self.assertEqual(len(self.registry.members("g1")), 2)
+        self.assertIs(self.registry.game_of(other), self.game)
+
+        self.registry.leave_game(other)
+        self.assertEqual(self.registry.members("g1"), [self.player])
+        self.assertIsNone(self.registry.game_of(other))
+
+    def test_remove_player_leaves_game(self):
+        """Test disconnecting removes the player from every index"""
+        self.registry.rename_player(self.player, "alice")
+        self.registry.add_game(self.game)
+        self.registry.join_game(self.player, "g1")
+
+        self.registry.remove_player(self.player)
+
+        self.assertNotIn(self.player, self.registry)
+        self.assertIsNone(self.registry.get_player_by_sock(self.player.sock))
+        self.assertIsNone(self.registry.get_player_by_name("alice"))
+        self.assertEqual(self.registry.members("g1"), [])
+
+    def test_remove_game_clears_members(self):
+        """Test removing a game releases its members"""
+        self.registry.add_game(self.game)
+        self.registry.join_game(self.player, "g1")
+
+        self.assertIs(self.registry.remove_game("g1"), self.game)
+        self.assertIsNone(self.registry.get_game("g1"))
+        self.assertIsNone(self.registry.game_of(self.player))
+        self.assertEqual(self.registry.members("g1"), [])
+
+    def test_topics_follow_membership(self):
+        """Test players move between the lobby and game topics as they join and leave"""
+        other = Player(Mock())
+        self.registry.add_player(other)
+        self.registry.add_game(self.game)
+        self.assertEqual(len(self.registry.subscribers(LOBBY)), 2)
+
+        self.registry.join_game(self.player, "g1")
+        self.assertEqual(self.registry.subscribers(LOBBY), [other])
+        self.assertEqual(self.registry.subscribers(game_topic("g1")), [self.player])
+        self.assertEqual(len(self.registry.subscribers(LOBBY, game_topic("g1"))), 2)
+
+        self.registry.leave_game(self.player)
+        self.assertEqual(self.registry.subscribers(game_topic("g1")), [])
+        self.assertIn(self.player, self.registry.subscribers(LOBBY))
+
+    def test_removed_game_members_return_to_lobby(self):
+        """Test a game's players are back in the lobby once it's removed"""
+        self.registry.add_game(self.game)
+        self.registry.join_game(self.player, "g1")
+        self.registry.remove_game("g1")
+        self.assertEqual(self.registry.subscribers(LOBBY), [self.player])
+
+        self.registry.remove_player(self.player)
+        self.assertEqual(self.registry.subscribers(LOBBY), [])
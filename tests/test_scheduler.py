@@ -0,0 +1,94 @@
+import unittest
+from unittest.mock import Mock
+import threading
+from src.server.scheduler import Scheduler, COMPACT_MIN_CANCELLED
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.lags = []
+        self.scheduler = Scheduler(lambda callback, *args: callback(*args), self.lags.append, self.clock)
+
+    def test_timers_come_due_in_deadline_order(self):
+        """Test only due timers are popped, earliest first"""
+        fired = []
+        for delay in (3, 1, 2):
+            self.scheduler.call_later(delay, fired.append, delay)
+
+        self.clock.now += 2
+        for timer in self.scheduler.pop_due(self.clock()):
+            self.scheduler.fire(timer)
+        self.assertEqual(fired, [1, 2])
+        self.assertEqual(len(self.scheduler), 1)
+
+    def test_cancelled_timer_does_not_fire(self):
+        """Test cancelling a timer before its deadline"""
+        callback = Mock()
+        timer = self.scheduler.call_later(1, callback)
+        self.scheduler.cancel(timer)
+        self.assertEqual(len(self.scheduler), 0)
+
+        self.clock.now += 5
+        self.assertEqual(self.scheduler.pop_due(self.clock()), [])
+        callback.assert_not_called()
+
+    def test_cancel_after_dispatch(self):
+        """Test a timer cancelled after it was popped but before it ran is skipped"""
+        callback = Mock()
+        timer = self.scheduler.call_later(1, callback)
+        self.clock.now += 1
+        due = self.scheduler.pop_due(self.clock())
+        self.scheduler.cancel(timer)
+        self.scheduler.fire(due[0])
+        callback.assert_not_called()
+        self.assertEqual(self.scheduler.cancelled, 0)
+
+    def test_lag_reported(self):
+        """Test the delay between a deadline and its callback is reported"""
+        timer = self.scheduler.call_later(1, Mock())
+        self.clock.now += 1.25
+        self.scheduler.fire(self.scheduler.pop_due(self.clock())[0])
+        self.assertEqual(self.lags, [0.25])
+        self.assertIs(timer.cancelled, True)
+
+    def test_compaction(self):
+        """Test cancelled timers are dropped from the heap once they pile up"""
+        timers = [self.scheduler.call_later(60, Mock()) for _ in range(COMPACT_MIN_CANCELLED * 2)]
+        for timer in timers[:COMPACT_MIN_CANCELLED]:
+            self.scheduler.cancel(timer)
+        self.assertEqual(len(self.scheduler.heap), COMPACT_MIN_CANCELLED)
+        self.assertEqual(len(self.scheduler), COMPACT_MIN_CANCELLED)
+
+    def test_thread_dispatches_due_timers(self):
+        """Test the scheduler thread hands due callbacks to dispatch"""
+        fired = threading.Event()
+        dispatched = []
+
+        def dispatch(callback, *args):
+            dispatched.append(callback)
+            callback(*args)
+
+        scheduler = Scheduler(dispatch)
+        scheduler.start()
+        try:
+            scheduler.call_later(60, Mock())
+            # an earlier timer wakes the thread up from waiting on the later one
+            scheduler.call_later(0.01, fired.set)
+            self.assertTrue(fired.wait(5))
+            self.assertEqual(dispatched, [scheduler.fire])
+        finally:
+            scheduler.stop()
+        self.assertIsNone(scheduler.thread)
+
+
+if __name__ == "__main__":
+    unittest.main()
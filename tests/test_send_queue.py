@@ -0,0 +1,150 @@
+import unittest
+from unittest.mock import Mock, AsyncMock
+import asyncio
+import socket
+import threading
+from src.server.send_queue import SendQueue, AsyncSendQueue
+
+
+class TestSendQueue(unittest.TestCase):
+    def setUp(self):
+        self.logger = Mock()
+        self.sock = Mock()
+
+    def test_put_is_sent_by_writer(self):
+        """Test queued frames are written to the socket in order"""
+        outbox = SendQueue(self.sock, self.logger)
+        outbox.put(b"one")
+        outbox.sendall(b"two")
+        outbox.close()
+        outbox.join(1)
+
+        self.assertEqual(
+            [c.args[0] for c in self.sock.sendall.call_args_list], [b"one", b"two"]
+        )
+
+    def test_slow_consumer_is_disconnected(self):
+        """Test overflowing the high-water mark marks the player slow"""
+        release = threading.Event()
+        self.sock.sendall.side_effect = lambda data: release.wait(1)
+        outbox = SendQueue(self.sock, self.logger, high_water=2)
+
+        results = [outbox.put(b"frame") for _ in range(5)]
+        release.set()
+
+        self.assertFalse(all(results))
+        self.assertTrue(outbox.slow)
+        self.sock.shutdown.assert_called_once_with(socket.SHUT_RDWR)
+        self.assertFalse(outbox.put(b"after"))
+
+    def test_closed_queue_rejects(self):
+        """Test nothing is queued once closed"""
+        outbox = SendQueue(self.sock, self.logger)
+        outbox.close()
+        self.assertFalse(outbox.put(b"frame"))
+        self.assertIsNone(outbox.thread)
+
+    def test_close_full_queue_stops_writer(self):
+        """Test closing a queue too full for the sentinel still ends the writer once it's flushed"""
+        release = threading.Event()
+        self.sock.sendall.side_effect = lambda data: release.wait(1)
+        outbox = SendQueue(self.sock, self.logger, high_water=2)
+        outbox.put(b"one")
+        while not self.sock.sendall.called:
+            pass
+        outbox.put(b"two")
+        outbox.put(b"three")
+        outbox.close()
+        release.set()
+        outbox.join(1)
+
+        self.assertFalse(outbox.thread.is_alive())
+        self.assertEqual(
+            [c.args[0] for c in self.sock.sendall.call_args_list], [b"one", b"two", b"three"]
+        )
+
+    def test_send_error_shuts_socket_down(self):
+        """Test a failed send shuts the socket down so the reader disconnects the player"""
+        self.sock.sendall.side_effect = BrokenPipeError
+        outbox = SendQueue(self.sock, self.logger)
+        outbox.put(b"frame")
+        outbox.join(1)
+
+        self.sock.shutdown.assert_called_once_with(socket.SHUT_RDWR)
+        self.assertFalse(outbox.put(b"after"))
+
+    def test_stalled_client_times_out(self):
+        """Test the writer outlasts the reader's socket timeout but not its own"""
+        left, right = socket.socketpair()
+        self.addCleanup(left.close)
+        self.addCleanup(right.close)
+        left.settimeout(0.05)
+        outbox = SendQueue(left, self.logger, send_timeout=0.3)
+        # right never reads, so the buffers fill and sendmsg keeps timing out
+        for _ in range(8):
+            outbox.put(b"x" * 1000000)
+        outbox.join(0.1)
+        self.assertTrue(outbox.thread.is_alive())
+        outbox.join(2)
+
+        self.assertFalse(outbox.thread.is_alive())
+        self.assertTrue(outbox.closed)
+        right.settimeout(2)
+        # the shutdown reaches the peer as EOF once the buffered bytes are read
+        while right.recv(1 << 20):
+            pass
+
+    def test_burst_over_real_socket(self):
+        """Test a burst of shared frames arrives intact through sendmsg"""
+        left, right = socket.socketpair()
+        self.addCleanup(left.close)
+        self.addCleanup(right.close)
+        frame = b"x" * 100000
+        outbox = SendQueue(left, self.logger)
+        for _ in range(3):
+            outbox.put(frame)
+        outbox.close()
+
+        received = bytearray()
+        right.settimeout(2)
+        while len(received) < 3 * len(frame):
+            received.extend(right.recv(65536))
+        outbox.join(1)
+
+        self.assertEqual(bytes(received), frame * 3)
+
+
+class TestAsyncSendQueue(unittest.IsolatedAsyncioTestCase):
+    async def test_put_and_overflow(self):
+        """Test frames are written and overflow aborts the transport"""
+        writer = Mock()
+        blocked = asyncio.Event()
+        writer.drain = AsyncMock(side_effect=blocked.wait)
+        outbox = AsyncSendQueue(writer, Mock(), high_water=1)
+
+        self.assertTrue(outbox.put(b"one"))
+        await asyncio.sleep(0)
+        self.assertTrue(outbox.put(b"two"))
+        self.assertFalse(outbox.put(b"three"))
+
+        writer.write.assert_called_once_with(b"one")
+        self.assertTrue(outbox.slow)
+        writer.transport.abort.assert_called_once()
+        blocked.set()
+        await outbox.join(1)
+
+    async def test_close_full_queue_stops_writer(self):
+        """Test closing a queue too full for the sentinel still ends the writer task"""
+        writer = Mock()
+        blocked = asyncio.Event()
+        writer.drain = AsyncMock(side_effect=blocked.wait)
+        outbox = AsyncSendQueue(writer, Mock(), high_water=1)
+        outbox.put(b"one")
+        await asyncio.sleep(0)
+        outbox.put(b"two")
+        outbox.close()
+        blocked.set()
+        await outbox.join(1)
+
+        self.assertTrue(outbox.task.done())
+        self.assertEqual([c.args[0] for c in writer.write.call_args_list], [b"one", b"two"])
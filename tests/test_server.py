@@ -2,9 +2,11 @@ import unittest
 from unittest.mock import Mock, patch
 import socket
 import json
+import threading
 from src.server.server import Server
 from src.server.game_class import Game
 from src.server.player_class import Player
+from src.utils.messages import CODECS, MessageBuffer, decode_payload
 
 class TestServer(unittest.TestCase):
     def setUp(self):
@@ -16,8 +18,8 @@ class TestServer(unittest.TestCase):
         self.assertEqual(self.server.host, "localhost")
         self.assertEqual(self.server.port_num, 5000)
         self.assertFalse(self.server.running)
-        self.assertIsInstance(self.server.players, list)
-        self.assertIsInstance(self.server.curr_games, list)
+        self.assertEqual(self.server.registry.all_players(), [])
+        self.assertEqual(self.server.registry.all_games(), [])
 
     def test_populate_chapters_available(self):
         """Test chapters are correctly populated"""
@@ -40,14 +42,317 @@ class TestServer(unittest.TestCase):
         self.server.handle_create_game(msg, player)
 
         # Verify game was created
-        self.assertEqual(len(self.server.curr_games), 1)
-        self.assertEqual(self.server.curr_games[0].game_id, "test_game")
+        self.assertEqual(len(self.server.registry.all_games()), 1)
+        self.assertEqual(self.server.registry.all_games()[0].game_id, "test_game")
+        # games without a time_limit wait for everyone unless QUESTION_TIME_LIMIT is set
+        self.assertEqual(self.server.registry.all_games()[0].time_limit, 0)
+        self.assertNotIn("test_game", self.server.round_timers)
+
+    def test_create_game_time_limit_checked(self):
+        """Test create_game's time_limit is clamped, and a non-number is refused before the game exists"""
+        player = Player(Mock(), Mock())
+        player.name = "test_player"
+        for game_id, requested, expected in (("long", 99999, 3600.0), ("negative", -5, 0.0), ("set", 2, 2.0)):
+            self.server.handle_create_game({"game_id": game_id, "chapters": ["1"], "time_limit": requested}, player)
+            self.assertEqual(self.server.registry.get_game(game_id).time_limit, expected)
+
+        self.server.handle_create_game({"game_id": "text", "chapters": ["1"], "time_limit": "soon"}, player)
+        self.assertIsNone(self.server.registry.get_game("text"))
+        error = decode_payload(player.outbox.put.call_args.args[0][4:])
+        self.assertEqual(error["message_type"], "error")
+        self.assertIn("time_limit", error["message"])
 
     def test_check_game_end(self):
         """Test game end conditions"""
         game = Game("test_game", "owner_id", "owner", [{"question": "test"}])
         game.curr_qi = 0
-        self.server.curr_games.append(game)
+        self.server.registry.add_game(game)
 
         # Game should not end when not all players responded
         self.assertFalse(self.server.check_game_end("test_game"))
+
+    @patch('socket.socket')
+    def test_broadcast_to_game_members(self, mock_socket):
+        """Test a game broadcast only reaches that game's players"""
+        owner = Player(Mock())
+        lobby = Player(Mock())
+        owner.outbox = Mock()
+        lobby.outbox = Mock()
+        self.server.registry.add_player(owner)
+        self.server.registry.add_player(lobby)
+        self.server.registry.rename_player(owner, "owner")
+
+        game = Game("test_game", owner.id, "owner", [{"question": "test"}])
+        self.server.registry.add_game(game)
+        self.server.registry.join_game(owner, "test_game")
+
+        self.server.broadcast({"message_type": "game_update", "subtype": "response_update", "message": "0/1"}, game)
+
+        owner.outbox.put.assert_called_once()
+        lobby.outbox.put.assert_not_called()
+
+    def test_broadcast_encodes_once(self):
+        """Test every recipient gets the same frame and the savings are counted"""
+        players = [Player(Mock()) for _ in range(3)]
+        for player in players:
+            player.outbox = Mock()
+            self.server.registry.add_player(player)
+
+        self.server.broadcast({"message_type": "game_update", "subtype": "game_end", "game_id": "g"})
+
+        frames = [p.outbox.put.call_args.args[0] for p in players]
+        self.assertTrue(all(frame is frames[0] for frame in frames))
+        self.assertEqual(self.server.broadcast_bytes_saved, 2 * len(frames[0]))
+
+    def test_client_hello_sets_codec(self):
+        """Test the handshake switches the player's codec"""
+        sock = Mock()
+        player = Player(sock)
+        self.server.registry.add_player(player)
+
+        self.server.handle_message({"message_type": "client_hello", "codec": "msgpack"}, sock, None)
+
+        self.assertIs(player.codec, CODECS["msgpack"])
+
+    def test_broadcast_encodes_once_per_codec(self):
+        """Test mixed codec recipients each get a frame they can decode"""
+        players = [Player(Mock()) for _ in range(4)]
+        for i, player in enumerate(players):
+            player.outbox = Mock()
+            player.codec = CODECS["msgpack"] if i % 2 else CODECS["json"]
+            self.server.registry.add_player(player)
+        msg = {"message_type": "game_update", "subtype": "game_end", "game_id": "g"}
+
+        self.server.broadcast(msg)
+
+        frames = [p.outbox.put.call_args.args[0] for p in players]
+        self.assertIs(frames[0], frames[2])
+        self.assertIs(frames[1], frames[3])
+        self.assertEqual(decode_payload(frames[1][4:]), msg)
+        self.assertEqual(self.server.broadcast_bytes_saved, len(frames[0]) + len(frames[1]))
+
+    def test_apply_quiz_data(self):
+        """Test a reload updates chapters and notifies only lobby players"""
+        in_game = Player(Mock())
+        in_lobby = Player(Mock())
+        for player in (in_game, in_lobby):
+            player.outbox = Mock()
+            self.server.registry.add_player(player)
+        questions = [{"question": "test"}]
+        game = Game("test_game", in_game.id, "owner", questions)
+        self.server.registry.add_game(game)
+        self.server.registry.join_game(in_game, "test_game")
+
+        new_data = {"1": [{"question": "new"}] * 4, "8": [{"question": "new"}]}
+        self.server.apply_quiz_data(new_data, ["1", "8"], ["2"])
+
+        self.assertIs(self.server.quiz_data, new_data)
+        self.assertEqual(self.server.chapters_available, {"1": 4, "8": 1})
+        self.assertIs(game.questions, questions)
+        in_game.outbox.put.assert_not_called()
+        update = decode_payload(in_lobby.outbox.put.call_args.args[0][4:])
+        self.assertEqual(update["subtype"], "chapters_update")
+        self.assertEqual(update["chapters_available"], {"1": 4, "8": 1})
+        self.assertEqual(update["chapters_removed"], ["2"])
+
+    def start_timed_game(self, time_limit, questions=2):
+        question = {"chapter": "1", "question": "q", "possible_answers": [{"answer": "a", "is_correct": True}]}
+        owner = Player(Mock(), Mock())
+        other = Player(Mock(), Mock())
+        for player, name in ((owner, "alice"), (other, "bob")):
+            self.server.registry.add_player(player)
+            self.server.registry.rename_player(player, name)
+        game = Game("g1", owner.id, "alice", [question] * questions, time_limit)
+        game.add_player("bob")
+        self.server.registry.add_game(game)
+        self.server.registry.join_game(owner, "g1")
+        self.server.registry.join_game(other, "g1")
+        self.server.send_current_question(game)
+        return game
+
+    def test_question_timer_started(self):
+        """Test each new question round sets one timer for the game"""
+        game = self.start_timed_game(30)
+        timer = self.server.round_timers["g1"]
+        self.assertEqual(timer.args, ("g1", 0))
+
+        game.store_response("alice", 0)
+        game.store_response("bob", 0)
+        self.server.send_current_question(game)
+        self.assertTrue(timer.cancelled)
+        self.assertEqual(self.server.round_timers["g1"].args, ("g1", 1))
+        self.assertEqual(len(self.server.scheduler), 1)
+
+    def test_expired_question_advances(self):
+        """Test a question whose time ran out moves on and records the timeout"""
+        game = self.start_timed_game(30)
+        game.store_response("alice", 0)
+        self.server.expire_question("g1", 0)
+
+        self.assertEqual(game.curr_qi, 1)
+        self.assertEqual(game.get_response_progress(), (0, 2))
+        self.assertEqual(game.tallies["bob"].timed_out, 1)
+        self.assertEqual(game.tallies["alice"].timed_out, 0)
+        self.assertEqual(self.server.status.snapshot()[0]["questions_timed_out"], 1)
+        self.assertEqual(self.server.round_timers["g1"].args, ("g1", 1))
+
+    def test_stale_expiry_ignored(self):
+        """Test a timer for a question that already finished does nothing"""
+        game = self.start_timed_game(30)
+        game.store_response("alice", 0)
+        game.store_response("bob", 0)
+        self.server.expire_question("g1", 0)
+        self.assertEqual(game.curr_qi, 1)
+        self.assertEqual(game.tallies["bob"].timed_out, 0)
+
+    def test_expiry_waits_for_handler(self):
+        """Test a timer firing while a handler changes the game waits for it, then sees the round finished"""
+        game = self.start_timed_game(30)
+        with self.server.game_lock("g1"):
+            expiry = threading.Thread(target=self.server.expire_question, args=("g1", 0))
+            expiry.start()
+            expiry.join(0.2)
+            self.assertTrue(expiry.is_alive())
+            game.store_response("alice", 0)
+            game.store_response("bob", 0)
+            game.advance_question()
+        expiry.join(5)
+        self.assertFalse(expiry.is_alive())
+        self.assertEqual(game.curr_qi, 1)
+        self.assertEqual(game.tallies["bob"].timed_out, 0)
+
+    def test_expired_last_question_ends_game(self):
+        """Test running out of time on the last question ends the game"""
+        self.start_timed_game(30, questions=1)
+        self.server.expire_question("g1", 0)
+        self.assertIsNone(self.server.registry.get_game("g1"))
+        self.assertNotIn("g1", self.server.round_timers)
+
+    def test_no_time_limit(self):
+        """Test games without a time limit never set a timer"""
+        self.start_timed_game(0)
+        self.assertNotIn("g1", self.server.round_timers)
+
+    def test_lobby_chatter_skips_other_games(self):
+        """Test joins and new games only reach the lobby and the game involved"""
+        question = {"question": "q", "possible_answers": [{"answer": "a", "is_correct": True}]}
+        in_other_game = Player(Mock(), Mock())
+        in_lobby = Player(Mock(), Mock())
+        creator = Player(Mock(), Mock())
+        for player, name in ((in_other_game, "alice"), (in_lobby, "bob"), (creator, "carol")):
+            self.server.registry.add_player(player)
+            self.server.registry.rename_player(player, name)
+        self.server.registry.add_game(Game("g1", in_other_game.id, "alice", [question]))
+        self.server.registry.join_game(in_other_game, "g1")
+
+        self.server.handle_create_game({"game_id": "g2", "chapters": ["1"], "num_questions": 1}, creator)
+
+        in_other_game.outbox.put.assert_not_called()
+        lobby_updates = [decode_payload(call.args[0][4:]) for call in in_lobby.outbox.put.call_args_list]
+        self.assertEqual([m["subtype"] for m in lobby_updates], ["game_created", "player_disconnect", "player_connect"])
+        creator_updates = [decode_payload(call.args[0][4:]) for call in creator.outbox.put.call_args_list]
+        # the creator is out of the lobby by now but still hears about its own game
+        self.assertIn("game_created", [m.get("subtype") for m in creator_updates])
+        self.assertIn("quiz_question", [m["message_type"] for m in creator_updates])
+
+    def test_leaving_game_sends_lobby_snapshot(self):
+        """Test a player leaving a game is caught up on the lobby"""
+        self.start_timed_game(0)
+        self.server.registry.add_game(Game("g2", "x", "dave", [{"question": "q"}]))
+        bob = self.server.registry.get_player_by_name("bob")
+
+        self.server.handle_message(
+            {"message_type": "game_update", "subtype": "player_leave", "player_name": "bob"}, bob.sock, None
+        )
+        snapshot = decode_payload(bob.outbox.put.call_args.args[0][4:])
+        self.assertEqual(snapshot["subtype"], "lobby_snapshot")
+        self.assertEqual(sorted(snapshot["current_games"]), ["g1", "g2"])
+        self.assertIn(bob, self.server.registry.lobby_players())
+
+
+    def test_response_updates_coalesced(self):
+        """Test answers close together share one response_update"""
+        game = self.start_timed_game(0, questions=2)
+        game.add_player("carol")
+        bob = self.server.registry.get_player_by_name("bob")
+        bob.outbox.reset_mock()
+        for name in ("alice", "bob"):
+            self.server.handle_message(
+                {"message_type": "quiz_answer", "player_name": name, "game_id": "g1", "answer": 0}, Mock(), None
+            )
+        bob.outbox.put.assert_not_called()
+        self.assertEqual(len(self.server.scheduler), 1)
+
+        self.server.flush_response_progress("g1")
+        update = decode_payload(bob.outbox.put.call_args.args[0][4:])
+        self.assertEqual(update["message"], "2/3")
+        self.assertEqual(bob.outbox.put.call_count, 1)
+        self.assertNotIn("g1", self.server.progress_timers)
+
+    def test_last_answer_sends_progress_now(self):
+        """Test the answer completing a round sends the next question and its progress straight away"""
+        self.start_timed_game(0, questions=2)
+        bob = self.server.registry.get_player_by_name("bob")
+        self.server.handle_message(
+            {"message_type": "quiz_answer", "player_name": "alice", "game_id": "g1", "answer": 0}, Mock(), None
+        )
+        bob.outbox.reset_mock()
+        self.server.handle_message(
+            {"message_type": "quiz_answer", "player_name": "bob", "game_id": "g1", "answer": 0}, Mock(), None
+        )
+        sent = [decode_payload(call.args[0][4:]) for call in bob.outbox.put.call_args_list]
+        self.assertEqual([m["message_type"] for m in sent], ["quiz_question", "game_update"])
+        self.assertEqual(sent[1]["message"], "0/2")
+        # the pending update from alice's answer would only repeat it
+        self.assertNotIn("g1", self.server.progress_timers)
+        self.assertEqual(len(self.server.scheduler), 0)
+
+    def test_cached_questions_sent_by_id(self):
+        """Test a question the client already has goes out as its id alone"""
+        game = self.start_timed_game(0)
+        bob = self.server.registry.get_player_by_name("bob")
+        self.server.handle_message({"message_type": "client_hello", "codec": "json", "question_cache": 8}, bob.sock, None)
+        game.questions = [{**q, "question_id": "q1"} for q in game.questions]
+
+        # the first send is whole, a resend (like another player joining) is just the id
+        self.server.send_current_question(game)
+        self.server.send_current_question(game)
+        sent = [decode_payload(call.args[0][4:]) for call in bob.outbox.put.call_args_list[-2:]]
+        self.assertEqual(sent[0]["question"], "q")
+        self.assertEqual(sent[1], {"message_type": "quiz_question", "question_id": "q1"})
+        # players without a cache still get the whole question
+        alice = self.server.registry.get_player_by_name("alice")
+        self.assertEqual(decode_payload(alice.outbox.put.call_args.args[0][4:])["question"], "q")
+
+        self.server.handle_message({"message_type": "question_request", "question_id": "q1"}, bob.sock, None)
+        self.assertEqual(decode_payload(bob.outbox.put.call_args.args[0][4:])["question"], "q")
+        self.assertEqual(self.server.status.snapshot()[0]["question_cache_misses"], 1)
+
+    def test_creator_gets_game_created(self):
+        """Test the creator hears about its own game before the first question"""
+        creator = Player(Mock(), Mock())
+        self.server.registry.add_player(creator)
+        self.server.registry.rename_player(creator, "carol")
+
+        self.server.handle_create_game({"game_id": "g2", "chapters": ["1"], "num_questions": 1}, creator)
+
+        sent = [decode_payload(call.args[0][4:]) for call in creator.outbox.put.call_args_list]
+        kinds = [m.get("subtype", m["message_type"]) for m in sent]
+        self.assertLess(kinds.index("game_created"), kinds.index("quiz_question"))
+        self.assertEqual(sent[kinds.index("game_created")]["game_id"], "g2")
+
+    def test_disconnect_flushes_queued_messages(self):
+        """Test messages queued for a disconnecting player are sent before its socket closes"""
+        left, right = socket.socketpair()
+        self.addCleanup(right.close)
+        player = Player(left)
+        self.server.registry.add_player(player)
+        self.server.send_to(player, {"message_type": "error", "message": "bye"})
+
+        self.server.handle_player_disconnect(player)
+
+        right.settimeout(2)
+        data = b""
+        while chunk := right.recv(65536):
+            data += chunk
+        self.assertEqual(decode_payload(MessageBuffer().feed(data)[0])["message"], "bye")
@@ -0,0 +1,201 @@
+import unittest
+from unittest.mock import Mock
+import asyncio
+import collections
+import io
+import json
+import os
+import socket
+from src.server.shard import HashRing, ShardWorker
+from src.server.status import ServerStatus
+from src.utils.messages import encode_message, MessageBuffer
+
+
+class TestHashRing(unittest.TestCase):
+    def test_owner_is_stable(self):
+        """Test every worker agrees on the owner of a game"""
+        first = HashRing([0, 1, 2, 3])
+        second = HashRing([3, 2, 1, 0])
+        for i in range(100):
+            self.assertEqual(first.owner(f"game{i}"), second.owner(f"game{i}"))
+
+    def test_spreads_games(self):
+        """Test games are spread over every worker"""
+        ring = HashRing([0, 1, 2, 3])
+        owners = collections.Counter(ring.owner(f"game{i}") for i in range(4000))
+        self.assertEqual(set(owners), {0, 1, 2, 3})
+        self.assertGreater(min(owners.values()), 500)
+
+    def test_adding_a_worker_only_moves_its_games(self):
+        """Test a new worker only takes games, never moves them between old workers"""
+        before = HashRing([0, 1, 2])
+        after = HashRing([0, 1, 2, 3])
+        for i in range(1000):
+            owner = after.owner(f"game{i}")
+            if owner != 3:
+                self.assertEqual(owner, before.owner(f"game{i}"))
+
+
+class TestShardWorker(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        left, right = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        # separate ports so the test decides which worker a client lands on
+        self.workers = [
+            ShardWorker(Mock(), "127.0.0.1", 0, 0, {1: left}),
+            ShardWorker(Mock(), "127.0.0.1", 0, 1, {0: right}),
+        ]
+        for worker in self.workers:
+            # keep the status tables out of the test output
+            worker.status = ServerStatus(worker, out=io.StringIO())
+        self.tasks = [asyncio.create_task(worker.serve()) for worker in self.workers]
+        while any(worker.stopped is None or worker.port_num == 0 for worker in self.workers):
+            await asyncio.sleep(0.01)
+
+    async def asyncTearDown(self):
+        for worker in self.workers:
+            worker.shutdown(None, None)
+        await asyncio.wait_for(asyncio.gather(*self.tasks), 5)
+        for worker in self.workers:
+            for channel in worker.peers.values():
+                channel.sock.close()
+
+    async def connect(self, worker):
+        reader, writer = await asyncio.open_connection("127.0.0.1", worker.port_num)
+        return reader, writer, MessageBuffer()
+
+    async def read_until(self, reader, buffer, predicate):
+        messages = []
+        while not any(predicate(m) for m in messages):
+            data = await asyncio.wait_for(reader.read(65536), 5)
+            self.assertTrue(data, "connection closed")
+            messages.extend(json.loads(m) for m in buffer.feed(data))
+        return messages
+
+    def game_owned_by(self, index):
+        return next(f"g{i}" for i in range(1000) if self.workers[0].ring.owner(f"g{i}") == index)
+
+    async def test_create_game_moves_connection_to_owner(self):
+        """Test a game owned by another worker is created there and the client keeps playing"""
+        game_id = self.game_owned_by(1)
+        reader, writer, buffer = await self.connect(self.workers[0])
+        await self.read_until(reader, buffer, lambda m: m["message_type"] == "new_connection_prompt")
+
+        writer.write(encode_message({
+            "message_type": "create_game",
+            "player_name": "alice",
+            "game_id": game_id,
+            "chapters": ["1"],
+            "num_questions": 1,
+            "is_private": False,
+        }))
+        await self.read_until(reader, buffer, lambda m: m["message_type"] == "quiz_question")
+
+        self.assertIsNotNone(self.workers[1].registry.get_game(game_id))
+        self.assertIsNone(self.workers[0].registry.get_game(game_id))
+        self.assertIsNotNone(self.workers[1].registry.get_player_by_name("alice"))
+        self.assertEqual(self.workers[0].registry.all_players(), [])
+
+        # answers sent over the same TCP connection now reach worker 1
+        writer.write(encode_message({
+            "message_type": "quiz_answer",
+            "player_name": "alice",
+            "game_id": game_id,
+            "answer": 0,
+        }))
+        await self.read_until(reader, buffer, lambda m: m.get("subtype") == "game_end")
+        writer.close()
+
+    async def test_unread_messages_move_with_connection(self):
+        """Test messages sent right behind the one that moves a connection reach the new worker"""
+        game_id = self.game_owned_by(1)
+        reader, writer, buffer = await self.connect(self.workers[0])
+        await self.read_until(reader, buffer, lambda m: m["message_type"] == "new_connection_prompt")
+
+        create = encode_message({
+            "message_type": "create_game",
+            "player_name": "alice",
+            "game_id": game_id,
+            "chapters": ["1"],
+            "num_questions": 1,
+            "is_private": False,
+        })
+        answer = encode_message({
+            "message_type": "quiz_answer",
+            "player_name": "alice",
+            "game_id": game_id,
+            "answer": 0,
+        })
+        # the answer's first bytes arrive with create_game, the rest once the connection has moved
+        writer.write(create + answer[:6])
+        await asyncio.sleep(0.1)
+        writer.write(answer[6:])
+        await self.read_until(reader, buffer, lambda m: m.get("subtype") == "game_end")
+        writer.close()
+
+    async def test_failed_hand_off_reports_error(self):
+        """Test a connection the owning worker can't be sent gets an error and is disconnected"""
+        game_id = self.game_owned_by(1)
+        channel = self.workers[0].peers[1]
+        send = channel.send
+
+        def refuse_adopt(message, fds=()):
+            if message["type"] != "adopt":
+                return send(message, fds)
+            for fd in fds:
+                os.close(fd)
+            raise ValueError("peer message too large")
+
+        channel.send = refuse_adopt
+        reader, writer, buffer = await self.connect(self.workers[0])
+        await self.read_until(reader, buffer, lambda m: m["message_type"] == "new_connection_prompt")
+
+        writer.write(encode_message({
+            "message_type": "create_game",
+            "player_name": "alice",
+            "game_id": game_id,
+            "chapters": ["1"],
+            "num_questions": 1,
+            "is_private": False,
+        }))
+        messages = await self.read_until(reader, buffer, lambda m: m["message_type"] == "error")
+        self.assertIn("peer message too large", messages[-1]["message"])
+        self.assertEqual(await asyncio.wait_for(reader.read(65536), 5), b"")
+        self.assertEqual(self.workers[0].registry.all_players(), [])
+        self.assertIsNone(self.workers[1].registry.get_game(game_id))
+        writer.close()
+
+    async def test_lobby_updates_reach_other_workers(self):
+        """Test players on one worker hear about games created on another"""
+        game_id = self.game_owned_by(1)
+        lobby_reader, lobby_writer, lobby_buffer = await self.connect(self.workers[0])
+        await self.read_until(lobby_reader, lobby_buffer, lambda m: m["message_type"] == "new_connection_prompt")
+
+        reader, writer, buffer = await self.connect(self.workers[1])
+        await self.read_until(reader, buffer, lambda m: m["message_type"] == "new_connection_prompt")
+        writer.write(encode_message({
+            "message_type": "create_game",
+            "player_name": "bob",
+            "game_id": game_id,
+            "chapters": ["1"],
+            "num_questions": 1,
+            "is_private": False,
+        }))
+
+        messages = await self.read_until(lobby_reader, lobby_buffer, lambda m: m.get("subtype") == "game_created")
+        self.assertEqual([m["game_id"] for m in messages if m.get("subtype") == "game_created"], [game_id])
+        self.assertEqual(self.workers[0].remote_games, {game_id: 1})
+
+        # new connections on worker 0 see the game in their prompt
+        late_reader, late_writer, late_buffer = await self.connect(self.workers[0])
+        prompt = (await self.read_until(
+            late_reader, late_buffer, lambda m: m["message_type"] == "new_connection_prompt"
+        ))[0]
+        self.assertIn(game_id, prompt["current_games"])
+        self.assertIn("bob", prompt["current_players"])
+
+        for w in (lobby_writer, writer, late_writer):
+            w.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
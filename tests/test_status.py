@@ -0,0 +1,79 @@
+import unittest
+from unittest.mock import Mock
+import io
+import threading
+from src.server.server import Server
+from src.server.game_class import Game
+from src.server.player_class import Player
+from src.server.status import ServerStatus
+
+
+class TestServerStatus(unittest.TestCase):
+    def setUp(self):
+        self.logger = Mock()
+        self.server = Server(self.logger, "localhost", 5000)
+        self.out = io.StringIO()
+        self.status = ServerStatus(self.server, interval=0, out=self.out)
+
+    def tearDown(self):
+        self.status.stop()
+        self.server.server_socket.close()
+
+    def test_incr(self):
+        """Test counters are incremented and bump the version"""
+        self.status.incr("messages_handled")
+        self.status.incr("messages_handled", 2)
+        counters, version = self.status.snapshot()
+        self.assertEqual(counters["messages_handled"], 3)
+        self.assertEqual(version, 2)
+
+    def test_render_uses_cached_addr(self):
+        """Test rendering lists players and games without calling getpeername"""
+        sock = Mock()
+        sock.fileno.return_value = 7
+        player = Player(sock, Mock(), ("10.0.0.1", 4242))
+        player.name = "alice"
+        self.server.registry.add_player(player)
+        self.server.registry.add_game(Game("g1", player.id, "alice", [{}, {}]))
+
+        text = self.status.render()
+
+        self.assertIn("alice", text)
+        self.assertIn("10.0.0.1", text)
+        self.assertIn("4242", text)
+        self.assertIn("g1", text)
+        self.assertIn("1/2", text)
+        sock.getpeername.assert_not_called()
+
+    def test_message_handling_does_not_render(self):
+        """Test handling a message only counts it"""
+        player = Player(Mock(), Mock())
+        self.server.registry.add_player(player)
+        self.server.status.render = Mock()
+        self.server.handle_message(
+            {"message_type": "client_hello", "codec": "json"}, player.sock, None
+        )
+        self.server.status.render.assert_not_called()
+        self.assertEqual(self.server.status.snapshot()[0]["messages_handled"], 1)
+
+    def test_request_renders_on_demand(self):
+        """Test request() makes the reporter print a snapshot right away"""
+        printed = threading.Event()
+        original = self.status.print
+        self.status.print = lambda: (original(), printed.set())
+        self.status.start()
+        self.status.request()
+        self.assertTrue(printed.wait(2))
+        self.assertIn("=== server info ===", self.out.getvalue())
+
+    def test_reporter_skips_unchanged_snapshots(self):
+        """Test the periodic reporter only prints when counters changed"""
+        self.status.interval = 0.01
+        self.status.print = Mock(side_effect=lambda: setattr(self.status, "rendered_version", self.status.version))
+        self.status.start()
+        threading.Event().wait(0.1)
+        self.assertEqual(self.status.print.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
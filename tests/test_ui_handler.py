@@ -37,3 +37,62 @@ class TestUIHandler(unittest.TestCase):
         self.ui_handler.input_box.set_edit_text('1')
         self.ui_handler.handle_input('enter')
         self.assertEqual(self.ui_handler.curr_screen, "create_game_1")
+
+    def test_print_quiz_results(self):
+        """Test players are scored on the viewer's questions only, and players who missed one of them are left out"""
+        self.client.player_name = "alice"
+        self.client.scoreboard = [
+            # bob played all four questions and got the first three right, both of the viewer's included
+            {"player_name": "bob", "correct": 3, "answered": 4, "timed_out": 0, "first_question": 0,
+             "last_question": 3, "asked_bits": "f", "correct_bits": "7"},
+            {"player_name": "alice", "correct": 1, "answered": 1, "timed_out": 1, "first_question": 1,
+             "last_question": 2, "asked_bits": "6", "correct_bits": "4"},
+            # dave left during question 2 and came back, so their questions span alice's range with a gap
+            {"player_name": "dave", "correct": 2, "answered": 2, "timed_out": 0, "first_question": 1,
+             "last_question": 3, "asked_bits": "a", "correct_bits": "a"},
+            {"player_name": "carol", "correct": 0, "answered": 1, "timed_out": 0, "first_question": 2,
+             "last_question": 2, "asked_bits": "4", "correct_bits": "0"},
+        ]
+        table = self.ui_handler.print_quiz_results()
+
+        self.assertLess(table.index("bob"), table.index("alice"))
+        self.assertIn("2/2", table)
+        self.assertIn("1/2", table)
+        self.assertNotIn("dave", table)
+        self.assertNotIn("carol", table)
+
+    def test_print_quiz_results_without_answers(self):
+        """Test a player who never answered gets a message instead of a table"""
+        self.client.player_name = "alice"
+        self.client.scoreboard = [
+            {"player_name": "bob", "correct": 3, "answered": 3, "timed_out": 0, "first_question": 0,
+             "last_question": 2, "asked_bits": "7", "correct_bits": "7"},
+        ]
+        self.assertIn("didn't answer", self.ui_handler.print_quiz_results())
+
+    def test_notify_shares_one_redraw(self):
+        """Test messages read together switch the screen and share one redraw"""
+        self.ui_handler.running = True
+        self.ui_handler.loop = Mock()
+        self.client.curr_games = []
+        self.ui_handler.notify({"message_type": "game_update", "subtype": "game_created"})
+        self.ui_handler.notify({"message_type": "new_connection_prompt"})
+        self.assertEqual(self.ui_handler.curr_screen, "main_menu")
+        self.ui_handler.loop.set_alarm_in.assert_called_once_with(0, self.ui_handler.handle_redraw)
+
+        self.ui_handler.handle_redraw(self.ui_handler.loop, None)
+        self.assertEqual(self.ui_handler.txt_title.text, "=== main menu ===")
+        self.ui_handler.notify({"message_type": "quiz_question"})
+        self.assertEqual(self.ui_handler.loop.set_alarm_in.call_count, 2)
+
+    def test_update_display_skips_unchanged_text(self):
+        """Test redrawing a screen whose inputs didn't change leaves the widgets alone"""
+        self.ui_handler.curr_screen = "main_menu"
+        self.client.curr_games = []
+        self.ui_handler.update_display()
+        with patch.object(self.ui_handler.txt_instructions, "set_text") as set_text:
+            self.ui_handler.update_display()
+            set_text.assert_not_called()
+            self.client.curr_games = ["g1"]
+            self.ui_handler.update_display()
+            set_text.assert_called_once()